@@ -2,117 +2,3999 @@ import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Boolean
-from sqlalchemy.orm import sessionmaker, relationship, declarative_base
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Boolean, UniqueConstraint, Index, func, or_, and_, event, select, literal, literal_column, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert, dialect as sqlite_dialect
+from sqlalchemy.schema import CreateTable, CreateIndex
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, declarative_base, object_session, Session as OrmSession
 from datetime import datetime, timedelta
+from collections import OrderedDict, namedtuple, deque
 import barcode
 from barcode.writer import ImageWriter
-from openpyxl import Workbook
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-import pandas as pd
 import os
 import requests
 import keyboard
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import i18n
-import schedule
 import time
 import threading
-import shutil
+import queue
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+import tempfile
 import json
+import csv
+import gzip
+import zlib
+from contextlib import contextmanager
+import sys
+import argparse
 from PIL import Image, ImageTk
 import hashlib
 import sqlite3
+import random
+import uuid
 from matplotlib.figure import Figure
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # optional, nur für den Analyse-Export (Arrow)
+    pa = None
+
 # Datenbank-Setup
+# Speicherprofile: PRAGMAs je Verbindung. journal_mode gilt für die ganze
+# Datei und wird nur beim Öffnen gesetzt, alle Profile nutzen WAL.
+STORAGE_PROFILES = {
+    # Kasse/Oberfläche: kurze Transaktionen, Leser blockieren den Schreiber nicht
+    "register": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,  # KiB
+        "temp_store": "memory",
+        "busy_timeout": 5000,  # ms
+    },
+    # Import: große Transaktionen, kein fsync pro Commit
+    "bulk-import": {
+        "journal_mode": "wal",
+        "synchronous": "off",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -131072,
+        "temp_store": "memory",
+        "busy_timeout": 30000,
+    },
+    # Berichte und Exporte: lange Lesevorgänge über den ganzen Katalog
+    "reporting": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "mmap_size": 1024 * 1024 * 1024,
+        "cache_size": -65536,
+        "temp_store": "memory",
+        "busy_timeout": 15000,
+    },
+}
+
+def apply_storage_profile(dbapi_connection, name, journal_mode=True):
+    """Sets the PRAGMAs of a storage profile on a sqlite3 connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in STORAGE_PROFILES[name].items():
+            if pragma == "journal_mode" and not journal_mode:
+                continue
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+    finally:
+        cursor.close()
+
+def is_lock_error(error):
+    """True for SQLite's "database is locked" / "database table is locked" errors"""
+    return isinstance(error, (OperationalError, sqlite3.OperationalError)) and "locked" in str(error)
+
+def retry_on_lock(func, *args, attempts=5, delay=0.05, on_retry=None, **kwargs):
+    """Calls func and retries with exponential backoff while the database is locked.
+
+    busy_timeout already waits inside SQLite; this covers the cases it does
+    not (a lock upgrade inside a deferred transaction fails immediately).
+    """
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except (OperationalError, sqlite3.OperationalError) as e:
+            if not is_lock_error(e) or attempt == attempts - 1:
+                raise
+            if on_retry:
+                on_retry()
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+class Database:
+    """Single access point to a SQLite file: one engine, one bounded pool.
+
+    Session creates independent sessions (background jobs, list views),
+    scoped holds one session per thread, unit_of_work() wraps it in a
+    transaction and connect() lends a raw sqlite3 connection from the same
+    pool. Every connection gets the storage profile of the thread that
+    checks it out (see profile()). Pool usage and lock errors are counted
+    in stats().
+    """
+
+    def __init__(self, url="sqlite:///asia_store.db", profile="register", pool_size=5, max_overflow=5,
+                 pool_timeout=30):
+        self.engine = create_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout
+        )
+        self.default_profile = profile
+        self.local = threading.local()
+        self.Session = sessionmaker(bind=self.engine)
+        self.scoped = scoped_session(self.Session)
+        self.lock = threading.Lock()
+        self.counters = {
+            "connections": 0, "checkouts": 0, "in_use": 0, "peak_in_use": 0,
+            "lock_errors": 0, "lock_retries": 0, "profile_switches": 0
+        }
+        event.listen(self.engine, "connect", self.on_connect)
+        event.listen(self.engine, "checkout", self.on_checkout)
+        event.listen(self.engine, "checkin", self.on_checkin)
+        event.listen(self.engine, "handle_error", self.on_error)
+
+    def current_profile(self):
+        return getattr(self.local, "profile", None) or self.default_profile
+
+    @contextmanager
+    def profile(self, name):
+        """Uses another storage profile for connections checked out by this thread"""
+        if name not in STORAGE_PROFILES:
+            raise ValueError(f"Unbekanntes Speicherprofil: {name}")
+        previous = getattr(self.local, "profile", None)
+        self.local.profile = name
+        try:
+            yield self
+        finally:
+            self.local.profile = previous
+
+    def on_connect(self, dbapi_connection, connection_record):
+        profile = self.current_profile()
+        apply_storage_profile(dbapi_connection, profile)
+        connection_record.info["profile"] = profile
+        with self.lock:
+            self.counters["connections"] += 1
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        profile = self.current_profile()
+        if connection_record.info.get("profile") != profile:
+            apply_storage_profile(dbapi_connection, profile, journal_mode=False)
+            connection_record.info["profile"] = profile
+            with self.lock:
+                self.counters["profile_switches"] += 1
+        with self.lock:
+            self.counters["checkouts"] += 1
+            self.counters["in_use"] += 1
+            self.counters["peak_in_use"] = max(self.counters["peak_in_use"], self.counters["in_use"])
+
+    def on_checkin(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.counters["in_use"] -= 1
+
+    def on_error(self, context):
+        if is_lock_error(context.original_exception):
+            with self.lock:
+                self.counters["lock_errors"] += 1
+
+    @contextmanager
+    def unit_of_work(self):
+        """Transaction on the thread's session: commit at the end, rollback on error.
+
+        Nested units join the outermost one.
+        """
+        session = self.scoped()
+        depth = session.info.get("unit_of_work", 0)
+        session.info["unit_of_work"] = depth + 1
+        try:
+            yield session
+            if not depth:
+                session.commit()
+        except Exception:
+            if not depth:
+                session.rollback()
+            raise
+        finally:
+            session.info["unit_of_work"] = depth
+            if not depth:
+                self.scoped.remove()
+
+    def run(self, work, attempts=5, delay=0.05):
+        """Runs work(session) in a unit of work, retried while the database is locked"""
+        if self.scoped().info.get("unit_of_work"):
+            with self.unit_of_work() as session:  # innerhalb einer Einheit: kein eigener Neuversuch
+                return work(session)
+                
+        def attempt():
+            with self.unit_of_work() as session:
+                return work(session)
+        return retry_on_lock(attempt, attempts=attempts, delay=delay, on_retry=self.count_retry)
+
+    def count_retry(self):
+        with self.lock:
+            self.counters["lock_retries"] += 1
+
+    @contextmanager
+    def connect(self):
+        """Borrows a raw sqlite3 connection from the pool"""
+        connection = self.engine.raw_connection()
+        try:
+            yield connection.driver_connection
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["pool_size"] = self.engine.pool.size()
+        stats["pooled"] = self.engine.pool.checkedin()
+        stats["overflow"] = max(self.engine.pool.overflow(), 0)
+        stats["profile"] = self.default_profile
+        return stats
+
+    def dispose(self):
+        self.scoped.remove()
+        self.engine.dispose()
+
 Base = declarative_base()
-engine = create_engine('sqlite:///asia_store.db')
-Session = sessionmaker(bind=engine)
+db = Database("sqlite:///asia_store.db")
+engine = db.engine
+Session = db.Session
+
+# UPCitemdb Demo API Key (Sie können später Ihren eigenen eintragen)
+UPCITEMDB_API_KEY = "DEMO_KEY"
+UPCITEMDB_ENDPOINT = "https://api.upcitemdb.com/prod/trial/lookup?upc={barcode}"
+OPENFOODFACTS_ENDPOINT = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
+
+class Category(Base):
+    __tablename__ = 'categories'
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True)
+    description = Column(String(200))
+    min_stock = Column(Integer, default=5)  # Minimaler Bestand für Warnung
+    products = relationship("Product", back_populates="category")
+
+class Product(Base):
+    __tablename__ = 'products'
+    __table_args__ = (
+        Index("ix_products_category_id", "category_id", "barcode"),
+    )
+    
+    barcode = Column(String(50), primary_key=True)
+    name = Column(String(100))
+    description = Column(String(200))
+    price = Column(Float)
+    stock = Column(Integer)
+    category_id = Column(Integer, ForeignKey('categories.id'))
+    category = relationship("Category", back_populates="products")
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    image_path = Column(String)
+    # Optimistisches Sperren: jedes ORM-UPDATE prüft und erhöht die Version.
+    # Bestandsänderungen laufen über adjust_stock() und lassen sie unverändert.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    stock_history = relationship("StockHistory", back_populates="product", cascade="all, delete-orphan")
+    
+    __mapper_args__ = {"version_id_col": version}
+
+# Sortierschlüssel der Produktliste (siehe VirtualProductList.sort_expression); das ''
+# muss als Literal im SQL stehen, sonst passt der Ausdruck nicht zum Index
+PRODUCT_NAME_KEY = func.coalesce(Product.name, literal_column("''"))
+Index("ix_products_name", PRODUCT_NAME_KEY, Product.barcode)
+
+class StockHistory(Base):
+    __tablename__ = 'stock_history'
+    __table_args__ = (
+        Index("ix_stock_history_product_timestamp", "product_barcode", "timestamp"),
+        # Ids werden nie wiederverwendet: Analyse-Export und Wiederherstellung
+        # nutzen MAX(id) als Wasserzeichen, auch wenn die neuesten Zeilen gelöscht werden
+        {"sqlite_autoincrement": True},
+    )
+    
+    id = Column(Integer, primary_key=True)
+    product_barcode = Column(String(50), ForeignKey('products.barcode'))
+    product = relationship("Product", back_populates="stock_history")
+    stock_level = Column(Integer)
+    timestamp = Column(DateTime, default=datetime.now)
+    change_type = Column(String(20))  # 'manual', 'sale', 'restock', etc.
+    notes = Column(String(200))
+
+class BarcodeLookup(Base):
+    __tablename__ = "lookup_cache"
+    
+    barcode = Column(String(50), primary_key=True)
+    found = Column(Boolean, default=True)  # False = "nicht gefunden" (Negativ-Cache)
+    name = Column(String(200))
+    description = Column(String(500))
+    price = Column(String(20))
+    source = Column(String(20))  # 'upcitemdb', 'openfoodfacts'
+    fetched_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime)
+
+class ProductChangeLog(Base):
+    __tablename__ = "product_changes"
+    
+    id = Column(Integer, primary_key=True)
+    barcode = Column(String(50), index=True)
+    action = Column(String(10))  # 'insert', 'update', 'delete'
+    changed_at = Column(DateTime, default=datetime.now, index=True)
+    # Zustand des Produkts nach der Änderung (leer bei 'delete')
+    name = Column(String(100))
+    description = Column(String(200))
+    price = Column(Float)
+    stock = Column(Integer)
+    category_id = Column(Integer)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    image_path = Column(String)
+
+class SyncReceipt(Base):
+    __tablename__ = "sync_receipts"
+    
+    key = Column(String(36), primary_key=True)  # Idempotenzschlüssel aus der Offline-Outbox
+    applied_at = Column(DateTime, default=datetime.now)
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+    __table_args__ = (UniqueConstraint("job", "scheduled_for"),)  # ein Lauf pro Termin
+    
+    id = Column(Integer, primary_key=True)
+    job = Column(String(50), index=True)
+    scheduled_for = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration = Column(Float)
+    status = Column(String(20))  # 'running', 'ok', 'failed', 'skipped'
+    message = Column(String(500))
+
+class User(Base):
+    __tablename__ = "users"
+    
+    username = Column(String, primary_key=True)
+    password_hash = Column(String)
+    role = Column(String)  # admin, manager, user
+    last_login = Column(DateTime)
+    is_active = Column(Boolean, default=True)
+    
+    def __repr__(self):
+        return f"<User(username='{self.username}', role='{self.role}')>"
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+    
+    version = Column(Integer, primary_key=True)
+    name = Column(String(100))
+    applied_at = Column(DateTime, default=datetime.now)
+    seconds = Column(Float)
+
+# Schema-Migrationen
+Migration = namedtuple("Migration", ["version", "name", "statements"])
+
+# Nur anhängen, nie ändern: bestehende Läden haben ältere Versionen bereits
+# eingetragen. Neue Tabellen legt create_all an; Migrationen ergänzen, was
+# create_all bei vorhandenen Tabellen nicht nachzieht (Indizes, Spalten).
+MIGRATIONS = [
+    Migration(1, "Index stock_history (product_barcode, timestamp)", [
+        "CREATE INDEX IF NOT EXISTS ix_stock_history_product_timestamp "
+        "ON stock_history (product_barcode, timestamp)",
+    ]),
+    Migration(2, "Index products (category_id, barcode)", [
+        "CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id, barcode)",
+    ]),
+    Migration(3, "Index products.name (Sortierschlüssel der Liste)", [
+        "CREATE INDEX IF NOT EXISTS ix_products_name ON products (coalesce(name, ''), barcode)",
+    ]),
+    Migration(4, "products.version (optimistisches Sperren)", [
+        lambda conn: add_column(conn, "products", "version", "INTEGER NOT NULL DEFAULT 1"),
+    ]),
+    Migration(5, "stock_history.id AUTOINCREMENT (keine wiederverwendeten Ids)", [
+        lambda conn: add_autoincrement(conn, "stock_history"),
+    ]),
+]
+
+def add_column(connection, table, column, ddl):
+    """ALTER TABLE ... ADD COLUMN, unless create_all already created the column.
+
+    SQLite only changes the table definition here; existing rows get the
+    default without being rewritten.
+    """
+    if column not in {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}:
+        connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+def add_autoincrement(connection, table):
+    """Rebuilds a table whose model declares sqlite_autoincrement, keeping its ids.
+
+    SQLite cannot add AUTOINCREMENT with ALTER TABLE, so the old table is
+    renamed, the new one created from the model, the rows copied and the
+    indexes recreated once the old table is gone. No other table may refer
+    to this one. sqlite_sequence starts at the highest copied id. Skipped if
+    the table already has AUTOINCREMENT.
+    """
+    stored = connection.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()[0]
+    if "AUTOINCREMENT" in stored.upper():
+        return
+    model = Base.metadata.tables[table]
+    existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+    columns = ", ".join(column for column in model.columns.keys() if column in existing)
+    connection.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    connection.execute(str(CreateTable(model).compile(dialect=sqlite_dialect())))
+    connection.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table}_old")
+    connection.execute(f"DROP TABLE {table}_old")
+    for index in model.indexes:
+        connection.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=sqlite_dialect())))
+
+def sqlite_timestamp(moment):
+    """Formats a datetime the way SQLAlchemy stores DateTime in SQLite"""
+    return moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def applied_migrations(connection):
+    """Returns {version: (name, applied_at, seconds)} from schema_version"""
+    return {
+        version: (name, applied_at, seconds)
+        for version, name, applied_at, seconds in connection.execute(
+            "SELECT version, name, applied_at, seconds FROM schema_version"
+        )
+    }
+
+def migrate(database=db, migrations=MIGRATIONS):
+    """Brings the schema up to date; returns [(migration, seconds)] of those applied now.
+
+    Each pending migration runs in its own write transaction together with
+    its schema_version row, so a failed or interrupted migration leaves the
+    database at the previous version. Data is only copied where SQLite has
+    no ALTER for the change (add_autoincrement); index builds hold the write
+    lock only for their own duration.
+    """
+    Base.metadata.create_all(database.engine)
+    applied = []
+    with database.connect() as conn:
+        done = applied_migrations(conn)
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version in done:
+                continue
+                
+            def apply():
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Eine andere Instanz kann dieselbe Migration gerade erledigt haben
+                    if conn.execute(
+                        "SELECT 1 FROM schema_version WHERE version = ?", (migration.version,)
+                    ).fetchone():
+                        conn.execute("ROLLBACK")
+                        return
+                    started = time.perf_counter()
+                    for statement in migration.statements:
+                        if callable(statement):
+                            statement(conn)
+                        else:
+                            conn.execute(statement)
+                    seconds = time.perf_counter() - started
+                    conn.execute(
+                        "INSERT INTO schema_version (version, name, applied_at, seconds) VALUES (?, ?, ?, ?)",
+                        (migration.version, migration.name, sqlite_timestamp(datetime.now()), seconds)
+                    )
+                    conn.execute("COMMIT")
+                    applied.append((migration, seconds))
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                    
+            retry_on_lock(apply)
+    return applied
+
+# Standard-Kategorien erstellen, falls keine existieren
+def create_default_categories(session_factory=Session):
+    session = session_factory()
+    if not session.query(Category).first():
+        default_categories = [
+            ("Nudeln", "Verschiedene Nudelsorten", 10),
+            ("Saucen", "Asiatische Saucen und Gewürze", 5),
+            ("Snacks", "Asiatische Snacks und Chips", 8),
+            ("Getränke", "Asiatische Getränke", 6),
+            ("Tiefkühl", "Tiefkühlprodukte", 4),
+            ("Reis", "Verschiedene Reissorten", 7),
+            ("Gemüse", "Frisches und konserviertes Gemüse", 5),
+            ("Fisch & Fleisch", "Fisch- und Fleischprodukte", 3)
+        ]
+        for name, desc, min_stock in default_categories:
+            category = Category(name=name, description=desc, min_stock=min_stock)
+            session.add(category)
+        session.commit()
+    session.close()
+
+def setup_store_database(database=db):
+    """Creates and migrates the store database and adds the default categories.
+
+    Only called from __main__: spawned export workers import this module as
+    well and must read nothing but their snapshot. Returns the migrations
+    applied now (see migrate()).
+    """
+    applied = migrate(database)
+    create_default_categories(database.Session)
+    return applied
+
+# Lesezugriff auf den Katalog
+# Spaltenname -> SQL-Ausdruck; Kategorie-Spalten werden per JOIN geladen
+CATALOG_COLUMNS = OrderedDict([
+    ("barcode", Product.barcode),
+    ("name", Product.name),
+    ("description", Product.description),
+    ("category", Category.name),
+    ("price", Product.price),
+    ("stock", Product.stock),
+    ("min_stock", Category.min_stock),
+    ("created_at", Product.created_at),
+    ("updated_at", Product.updated_at),
+])
+CATEGORY_COLUMNS = {"category", "min_stock"}
+
+# Spalten der Produktliste
+DISPLAY_COLUMNS = ("barcode", "name", "description", "category", "price", "stock")
+
+# Spalten im Export-Dialog -> Katalogspalten
+EXPORT_COLUMNS = OrderedDict([
+    ("Barcode", "barcode"),
+    ("Produktname", "name"),
+    ("Kategorie", "category"),
+    ("Beschreibung", "description"),
+    ("Preis", "price"),
+    ("Lagerbestand", "stock"),
+    ("Mindestbestand", "min_stock"),
+])
+
+def catalog_query(session, columns=DISPLAY_COLUMNS, *extra, join_category=False):
+    """Returns a query of flat catalog rows with only the given columns.
+
+    The category is joined in SQL, so reading the catalog costs one query
+    regardless of its size. Extra column expressions are appended as-is;
+    pass join_category=True if they refer to Category.
+    """
+    query = session.query(*[CATALOG_COLUMNS[c].label(c) for c in columns], *extra)
+    query = query.select_from(Product)
+    if join_category or CATEGORY_COLUMNS.intersection(columns):
+        query = query.outerjoin(Category, Product.category_id == Category.id)
+    return query
+
+def iter_catalog(session, columns=DISPLAY_COLUMNS, chunk_size=1000):
+    """Yields catalog rows in primary key order, fetched chunk_size at a time"""
+    query = catalog_query(session, columns).order_by(Product.barcode)
+    return query.yield_per(chunk_size)
+
+# Änderungsbenachrichtigungen für Produkte
+ProductChange = namedtuple("ProductChange", ["action", "barcode", "values"])
+ProductChange.__doc__ = """A committed product change.
+
+action is "insert", "update", "delete" or "reload" (many rows changed at
+once, e.g. after an import). values holds the display row
+(barcode, name, description, category, price, stock) or None.
+"""
+
+class ProductEvents:
+    """In-process publish/subscribe hub for committed product changes.
+
+    Changes are collected per session while flushing and published once the
+    transaction commits, so subscribers never see rolled back data.
+    """
+
+    def __init__(self):
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Registers callback(changes) and returns it"""
+        with self.lock:
+            self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def publish(self, changes):
+        """Delivers a list of ProductChange objects to all subscribers"""
+        if not changes:
+            return
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(changes)
+            except Exception as e:
+                print(f"Error in product change subscriber: {str(e)}")
+
+product_events = ProductEvents()
+
+def product_values(product):
+    """Returns the display row of a Product instance"""
+    category = product.category
+    if category is None and product.category_id is not None:
+        # Nur die Fremdschlüssel-Spalte gesetzt (z.B. Import)
+        session = object_session(product)
+        category = session.get(Category, product.category_id) if session else None
+    return (
+        product.barcode,
+        product.name,
+        product.description,
+        category.name if category else None,
+        product.price,
+        product.stock
+    )
+
+def queue_product_change(session, action, barcode, values=None):
+    """Queues a change to be published when the session commits.
+
+    Needed for writes that bypass the ORM unit of work (bulk statements).
+    """
+    session.info.setdefault("product_changes", []).append(
+        ProductChange(action, barcode, values)
+    )
+
+LOGGED_PRODUCT_COLUMNS = (
+    "name", "description", "price", "stock", "category_id", "created_at", "updated_at", "image_path"
+)
+
+def log_product_changes(connection, action, barcodes):
+    """Appends the current rows of barcodes to the product_changes log.
+
+    Runs in the caller's transaction and copies the rows with INSERT ...
+    SELECT, so the log holds exactly what was written, defaults included.
+    Every write to products has to call this (the ORM does it in
+    after_flush), otherwise point-in-time restore misses the change.
+    """
+    log = ProductChangeLog.__table__
+    now = datetime.now()
+    for i in range(0, len(barcodes), 500):
+        chunk = barcodes[i:i + 500]
+        if action == "delete":
+            connection.execute(
+                log.insert(),
+                [{"barcode": barcode, "action": action, "changed_at": now} for barcode in chunk]
+            )
+            continue
+        rows = select(
+            Product.barcode,
+            literal(action, String),
+            literal(now, DateTime),
+            *[Product.__table__.c[column] for column in LOGGED_PRODUCT_COLUMNS]
+        ).where(Product.barcode.in_(chunk))
+        connection.execute(
+            log.insert().from_select(["barcode", "action", "changed_at", *LOGGED_PRODUCT_COLUMNS], rows)
+        )
+
+def coalesce_product_changes(changes):
+    """Merges several changes of the same barcode into one"""
+    merged = OrderedDict()
+    for change in changes:
+        if change.action == "reload":
+            merged.clear()
+            merged[None] = change
+            continue
+        previous = merged.get(change.barcode)
+        if previous is not None and previous.action == "insert":
+            if change.action == "delete":
+                del merged[change.barcode]
+                continue
+            change = ProductChange("insert", change.barcode, change.values)
+        merged[change.barcode] = change
+    return list(merged.values())
+
+@event.listens_for(OrmSession, "after_flush")
+def collect_product_changes(session, flush_context):
+    logged = {"insert": [], "update": [], "delete": []}
+    for obj in session.new:
+        if isinstance(obj, Product):
+            queue_product_change(session, "insert", obj.barcode, product_values(obj))
+            logged["insert"].append(obj.barcode)
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj):
+            queue_product_change(session, "update", obj.barcode, product_values(obj))
+            logged["update"].append(obj.barcode)
+    for obj in session.deleted:
+        if isinstance(obj, Product):
+            queue_product_change(session, "delete", obj.barcode, product_values(obj))
+            logged["delete"].append(obj.barcode)
+    for action, barcodes in logged.items():
+        if barcodes:
+            log_product_changes(session.connection(), action, barcodes)
+
+@event.listens_for(OrmSession, "after_commit")
+def publish_product_changes(session):
+    if session.in_nested_transaction():
+        return  # RELEASE SAVEPOINT: erst nach dem äußeren Commit veröffentlichen
+    changes = session.info.pop("product_changes", None)
+    if changes:
+        product_events.publish(coalesce_product_changes(changes))
+
+@event.listens_for(OrmSession, "after_rollback")
+def discard_product_changes(session):
+    if session.in_nested_transaction():
+        return  # ROLLBACK TO SAVEPOINT: wer den Savepoint setzt, verwirft seine Änderungen selbst
+    session.info.pop("product_changes", None)
+
+# Barcode-Index für Scanner-Abfragen
+class ProductRecord:
+    """Compact read-only snapshot of a product for scan lookups"""
+    __slots__ = ("barcode", "name", "description", "category", "price", "stock")
+
+    def __init__(self, barcode, name, description, category, price, stock):
+        self.barcode = barcode
+        self.name = name
+        self.description = description
+        self.category = category
+        self.price = price
+        self.stock = stock
+
+    def __repr__(self):
+        return f"<ProductRecord(barcode='{self.barcode}', name='{self.name}')>"
+
+class BarcodeIndex:
+    """Process-wide barcode -> ProductRecord cache.
+
+    Records are loaded on first lookup (unknown barcodes are remembered as
+    None) and kept consistent by applying product_events. At most
+    max_entries barcodes are held; the least recently used are evicted.
+    """
+
+    def __init__(self, session_factory, max_entries=50000):
+        self.Session = session_factory
+        self.max_entries = max_entries
+        self.records = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, barcode):
+        """Returns the ProductRecord for barcode or None if it does not exist"""
+        with self.lock:
+            if barcode in self.records:
+                self.records.move_to_end(barcode)
+                self.hits += 1
+                return self.records[barcode]
+            self.misses += 1
+            generation = self.generation
+
+        session = self.Session()
+        try:
+            row = catalog_query(session).filter(Product.barcode == barcode).first()
+        finally:
+            session.close()
+        record = ProductRecord(*row) if row else None
+
+        with self.lock:
+            # Nicht speichern, wenn inzwischen Änderungen eingetroffen sind
+            if generation == self.generation:
+                self.store(barcode, record)
+        return record
+
+    def store(self, barcode, record):
+        self.records[barcode] = record
+        self.records.move_to_end(barcode)
+        while len(self.records) > self.max_entries:
+            self.records.popitem(last=False)
+            self.evictions += 1
+
+    def apply_changes(self, changes):
+        """Write-through update from committed product changes"""
+        with self.lock:
+            self.generation += 1
+            for change in changes:
+                if change.action == "reload":
+                    self.records.clear()
+                elif change.action == "delete":
+                    self.records.pop(change.barcode, None)
+                elif change.values is not None:
+                    self.store(change.barcode, ProductRecord(*change.values))
+                else:
+                    self.records.pop(change.barcode, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.records.clear()
+
+    def stats(self):
+        """Returns hit/miss counters and the current size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.records),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+barcode_index = BarcodeIndex(Session)
+product_events.subscribe(barcode_index.apply_changes)
+
+# Online-Barcode-Suche
+LOOKUP_TIMEOUT = (3.05, 5)  # Verbindungs- und Lese-Timeout in Sekunden
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (seconds)"""
+
+    BOUNDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, float("inf"))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * len(self.BOUNDS)
+        self.total = 0
+        self.sum = 0.0
+
+    def record(self, seconds):
+        with self.lock:
+            for index, bound in enumerate(self.BOUNDS):
+                if seconds <= bound:
+                    self.counts[index] += 1
+                    break
+            self.total += 1
+            self.sum += seconds
+
+    def percentile(self, p):
+        """Returns the upper bucket bound below which p percent of samples fall"""
+        with self.lock:
+            if not self.total:
+                return None
+            threshold = self.total * p / 100.0
+            seen = 0
+            for bound, count in zip(self.BOUNDS, self.counts):
+                seen += count
+                if seen >= threshold:
+                    return bound
+            return self.BOUNDS[-1]
+
+    def summary(self):
+        with self.lock:
+            buckets = {f"<={bound:g}s": count for bound, count in zip(self.BOUNDS, self.counts)}
+            mean = self.sum / self.total if self.total else 0.0
+        return {"count": self.total, "mean": mean, "p50": self.percentile(50),
+                "p95": self.percentile(95), "buckets": buckets}
+
+class ProviderUnavailableError(Exception):
+    """Raised when every barcode provider is skipped by its circuit breaker"""
+
+class ProviderHealth:
+    """Circuit breaker and adaptive timeout for one barcode provider.
+
+    After failure_threshold consecutive failures the breaker opens and the
+    provider is skipped for a cool-off window (doubling up to max_cooldown
+    on repeated trips). Then a single probe request is let through
+    (half-open); its outcome closes or re-opens the breaker. The read
+    timeout follows the p95 of recent successful calls. clock returns the
+    current time in seconds (time.monotonic unless replaced, e.g. in tests).
+    """
+
+    def __init__(self, failure_threshold=3, cooldown=30.0, max_cooldown=600.0,
+                 min_timeout=1.0, timeout_factor=2.0, clock=time.monotonic):
+        self.clock = clock
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.min_timeout = min_timeout
+        self.timeout_factor = timeout_factor
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.probe_running = False
+        self.samples = deque(maxlen=50)
+
+    def allow(self):
+        """Returns True if a request may be sent now"""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and self.clock() - self.opened_at >= self.cooldown:
+                self.state = "half-open"
+            if self.state == "half-open" and not self.probe_running:
+                self.probe_running = True
+                return True
+            return False
+
+    def record_success(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.failures = 0
+            self.probe_running = False
+            if self.state != "closed":
+                self.state = "closed"
+                self.cooldown = self.base_cooldown
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == "half-open":
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.trip()
+            elif self.state == "closed" and self.failures >= self.failure_threshold:
+                self.trip()
+            self.probe_running = False
+
+    def release(self):
+        """Frees the half-open probe slot of a request that never ran"""
+        with self.lock:
+            self.probe_running = False
+
+    def trip(self):
+        self.state = "open"
+        self.opened_at = self.clock()
+        self.trips += 1
+
+    def timeout(self):
+        """Returns (connect, read) timeouts adapted to recent latency"""
+        connect, read = LOOKUP_TIMEOUT
+        with self.lock:
+            samples = sorted(self.samples)
+        if len(samples) >= 10:
+            p95 = samples[int(len(samples) * 0.95) - 1]
+            read = min(read, max(self.min_timeout, p95 * self.timeout_factor))
+        return (connect, read)
+
+    def stats(self):
+        with self.lock:
+            state, failures, trips, cooldown = self.state, self.failures, self.trips, self.cooldown
+            remaining = 0.0
+            if state == "open":
+                remaining = max(0.0, cooldown - (self.clock() - self.opened_at))
+        return {"state": state, "consecutive_failures": failures, "trips": trips,
+                "cooldown": cooldown, "open_remaining": remaining, "timeout": self.timeout()}
+
+class BarcodeProvider:
+    """Base class for barcode APIs, with a keep-alive connection pool"""
+
+    name = None
+
+    def __init__(self, pool_size=8):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.latency = LatencyHistogram()
+        self.health = ProviderHealth()
+        self.found = 0
+        self.not_found = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def request(self, barcode):
+        """Returns (url, headers) for a barcode"""
+        raise NotImplementedError
+
+    def parse(self, data):
+        """Returns the normalized result dict or None"""
+        raise NotImplementedError
+
+    def lookup(self, barcode, timeout, cancelled):
+        """Queries the API; returns None early if cancelled is set.
+
+        Rate limiting (429) and server errors count as failures for the
+        circuit breaker and are raised.
+        """
+        url, headers = self.request(barcode)
+        started = time.perf_counter()
+        try:
+            response = self.session.get(
+                url,
+                headers=headers,
+                timeout=timeout or self.health.timeout(),
+                stream=True
+            )
+            try:
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.HTTPError(
+                        f"{self.name}: HTTP {response.status_code}", response=response
+                    )
+                if cancelled.is_set():
+                    # Verlierer: Antwort nicht mehr lesen
+                    self.cancelled += 1
+                    self.health.record_success(time.perf_counter() - started)
+                    return None
+                result = self.parse(response.json()) if response.status_code == 200 else None
+            finally:
+                response.close()
+        except Exception:
+            self.errors += 1
+            self.health.record_failure()
+            raise
+        finally:
+            self.latency.record(time.perf_counter() - started)
+        self.health.record_success(time.perf_counter() - started)
+        if result:
+            self.found += 1
+        else:
+            self.not_found += 1
+        return result
+
+    def stats(self):
+        return {"found": self.found, "not_found": self.not_found, "errors": self.errors,
+                "cancelled": self.cancelled, "latency": self.latency.summary(),
+                "health": self.health.stats()}
+
+class UPCitemdbProvider(BarcodeProvider):
+    name = "upcitemdb"
+
+    def request(self, barcode):
+        return UPCITEMDB_ENDPOINT.format(barcode=barcode), {"Authorization": UPCITEMDB_API_KEY}
+
+    def parse(self, data):
+        if data.get("items"):
+            item = data["items"][0]
+            return {
+                "name": item.get("title", ""),
+                "description": item.get("description", ""),
+                "price": item.get("price", ""),
+                "source": self.name
+            }
+        return None
+
+class OpenFoodFactsProvider(BarcodeProvider):
+    name = "openfoodfacts"
+
+    def request(self, barcode):
+        return OPENFOODFACTS_ENDPOINT.format(barcode=barcode), {}
+
+    def parse(self, data):
+        if data.get("status") == 1:
+            product = data.get("product", {})
+            return {
+                "name": product.get("product_name", ""),
+                "description": product.get("generic_name", ""),
+                "price": "",  # OpenFoodFacts doesn't provide prices
+                "source": self.name
+            }
+        return None
+
+class BarcodeLookupEngine:
+    """Queries all providers concurrently and takes the first usable answer.
+
+    The remaining requests are cancelled: not yet started ones are dropped,
+    running ones discard their response instead of reading it.
+    """
+
+    def __init__(self, providers, max_workers=8):
+        self.providers = providers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="barcode-provider")
+
+    def resolve(self, barcode, timeout=None):
+        """Returns (result, complete) for a barcode.
+
+        result is the first usable answer or None. complete is False if a
+        provider was skipped by its circuit breaker or failed, i.e. a None
+        result is not a definitive "not found". Raises if no provider
+        answered at all. timeout=None uses each provider's adaptive timeout.
+        """
+        providers = [provider for provider in self.providers if provider.health.allow()]
+        if not providers:
+            raise ProviderUnavailableError("All barcode providers are temporarily disabled")
+            
+        cancelled = threading.Event()
+        futures = {
+            self.executor.submit(provider.lookup, barcode, timeout, cancelled): provider
+            for provider in providers
+        }
+        pending = set(futures)
+        errors = []
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        continue
+                    if result:
+                        return result, True
+        finally:
+            cancelled.set()
+            for future in pending:
+                if future.cancel():
+                    futures[future].health.release()
+        if errors and len(errors) == len(providers):
+            raise errors[0]
+        return None, len(providers) == len(self.providers) and not errors
+
+    def lookup(self, barcode, timeout=None):
+        """Returns the first result, None if no provider knows the barcode"""
+        return self.resolve(barcode, timeout)[0]
+
+    def stats(self):
+        return {provider.name: provider.stats() for provider in self.providers}
+
+lookup_engine = BarcodeLookupEngine([UPCitemdbProvider(), OpenFoodFactsProvider()])
+
+def lookup_barcode_online(barcode, timeout=None):
+    """Looks up a barcode at UPCitemdb and OpenFoodFacts in parallel.
+
+    Returns a dict with name, description, price and source, or None if
+    neither API knows the barcode. Safe to call from worker threads.
+    """
+    return lookup_engine.lookup(barcode, timeout)
+
+# Offline-Barcode-Index aus einem OpenFoodFacts-Datenexport
+OPENFOODFACTS_DUMP_DB = "openfoodfacts.db"
+
+def open_openfoodfacts_db(db_path=OPENFOODFACTS_DUMP_DB):
+    """Opens the offline barcode database and creates the table if needed"""
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    # WITHOUT ROWID: die Tabelle ist nach code geclustert, jede Abfrage ein B-Baum-Zugriff
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS off_products (
+            code TEXT PRIMARY KEY,
+            product_name TEXT,
+            generic_name TEXT
+        ) WITHOUT ROWID
+    """)
+    return connection
+
+def iter_openfoodfacts_dump(path):
+    """Streams (code, product_name, generic_name) from an OpenFoodFacts export.
+
+    Supports the tab-separated CSV export and the JSONL export, optionally
+    gzip-compressed. Rows are read one at a time, so memory stays constant.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8", errors="replace", newline="") as f:
+        if ".json" in path:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    product = json.loads(line)
+                except ValueError:
+                    continue
+                yield (
+                    str(product.get("code") or ""),
+                    product.get("product_name") or "",
+                    product.get("generic_name") or ""
+                )
+        else:
+            csv.field_size_limit(sys.maxsize)
+            header = f.readline()
+            delimiter = "\t" if "\t" in header else ","
+            columns = next(csv.reader([header], delimiter=delimiter))
+            code_idx = columns.index("code")
+            name_idx = columns.index("product_name") if "product_name" in columns else None
+            generic_idx = columns.index("generic_name") if "generic_name" in columns else None
+            quoting = csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL
+            for row in csv.reader(f, delimiter=delimiter, quoting=quoting):
+                if len(row) <= code_idx:
+                    continue
+                yield (
+                    row[code_idx],
+                    row[name_idx] if name_idx is not None and len(row) > name_idx else "",
+                    row[generic_idx] if generic_idx is not None and len(row) > generic_idx else ""
+                )
+
+def import_openfoodfacts_dump(path, db_path=OPENFOODFACTS_DUMP_DB, batch_size=10000, progress=None):
+    """Imports an OpenFoodFacts export into the offline barcode database.
+
+    Rows without a code or any name are skipped. progress(rows, seconds) is
+    called after every batch. Returns a dict with counts and throughput.
+    """
+    connection = open_openfoodfacts_db(db_path)
+    connection.execute("PRAGMA journal_mode = MEMORY")
+    connection.execute("PRAGMA synchronous = OFF")
+    
+    started = time.perf_counter()
+    read = imported = 0
+    batch = []
+    try:
+        for code, name, generic_name in iter_openfoodfacts_dump(path):
+            read += 1
+            code = code.strip()
+            if not code or not (name or generic_name):
+                continue
+            batch.append((code, name, generic_name))
+            if len(batch) >= batch_size:
+                connection.executemany("INSERT OR REPLACE INTO off_products VALUES (?, ?, ?)", batch)
+                connection.commit()
+                imported += len(batch)
+                batch = []
+                if progress:
+                    progress(imported, time.perf_counter() - started)
+        if batch:
+            connection.executemany("INSERT OR REPLACE INTO off_products VALUES (?, ?, ?)", batch)
+            connection.commit()
+            imported += len(batch)
+    finally:
+        connection.close()
+        
+    seconds = time.perf_counter() - started
+    return {
+        "read": read,
+        "imported": imported,
+        "seconds": seconds,
+        "rows_per_second": imported / seconds if seconds else 0.0
+    }
+
+class OfflineBarcodeIndex:
+    """Read-only barcode lookups in the offline OpenFoodFacts database"""
+
+    def __init__(self, db_path=OPENFOODFACTS_DUMP_DB):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.lock = threading.Lock()  # Zähler werden von den Lookup-Threads erhöht
+        self.hits = 0
+        self.misses = 0
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            uri = "file:" + os.path.abspath(self.db_path).replace("\\", "/") + "?mode=ro"
+            connection = sqlite3.connect(uri, uri=True)
+            self.local.connection = connection
+        return connection
+
+    def get(self, barcode):
+        """Returns a normalized result dict or None"""
+        if not os.path.exists(self.db_path):
+            return None
+        try:
+            row = self.connection().execute(
+                "SELECT product_name, generic_name FROM off_products WHERE code = ?",
+                (barcode,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+        return {
+            "name": row[0] or row[1],
+            "description": row[1],
+            "price": "",
+            "source": "openfoodfacts-offline"
+        }
+
+    def stats(self):
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        return {"available": os.path.exists(self.db_path), "hits": hits, "misses": misses}
+
+offline_barcodes = OfflineBarcodeIndex()
+
+# Lokaler Cache für API-Antworten
+LOOKUP_CACHE_TTL = timedelta(days=30)
+LOOKUP_CACHE_NEGATIVE_TTL = timedelta(hours=6)
+
+class BarcodeLookupCache:
+    """SQLite-backed cache of normalized barcode API responses.
+
+    Found products are kept for LOOKUP_CACHE_TTL, "not found" answers for the
+    shorter LOOKUP_CACHE_NEGATIVE_TTL. Network errors are never cached.
+    """
+
+    def __init__(self, session_factory):
+        self.Session = session_factory
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.network_seconds = 0.0
+        self.network_calls = 0
+
+    def get(self, barcode):
+        """Returns (hit, result); result is None for a cached "not found" """
+        session = self.Session()
+        try:
+            entry = session.get(BarcodeLookup, barcode)
+            if entry is None or entry.expires_at is None or entry.expires_at < datetime.now():
+                with self.lock:
+                    self.misses += 1
+                return False, None
+            with self.lock:
+                if entry.found:
+                    self.hits += 1
+                else:
+                    self.negative_hits += 1
+            if not entry.found:
+                return True, None
+            return True, {
+                "name": entry.name or "",
+                "description": entry.description or "",
+                "price": entry.price or "",
+                "source": entry.source
+            }
+        finally:
+            session.close()
+
+    def put(self, barcode, result, elapsed=None):
+        """Stores a lookup result (None = not found)"""
+        now = datetime.now()
+        if elapsed is not None:
+            with self.lock:
+                self.network_calls += 1
+                self.network_seconds += elapsed
+        session = self.Session()
+        try:
+            entry = session.get(BarcodeLookup, barcode) or BarcodeLookup(barcode=barcode)
+            entry.found = result is not None
+            entry.name = result["name"] if result else None
+            entry.description = result["description"] if result else None
+            entry.price = str(result["price"]) if result else None
+            entry.source = result["source"] if result else None
+            entry.fetched_at = now
+            entry.expires_at = now + (LOOKUP_CACHE_TTL if result else LOOKUP_CACHE_NEGATIVE_TTL)
+            session.add(entry)
+            session.commit()
+        finally:
+            session.close()
+
+    def purge_expired(self):
+        """Deletes expired entries and returns their number"""
+        session = self.Session()
+        try:
+            count = session.query(BarcodeLookup).filter(
+                BarcodeLookup.expires_at < datetime.now()
+            ).delete(synchronize_session=False)
+            session.commit()
+            return count
+        finally:
+            session.close()
+
+    def stats(self):
+        """Returns hit counters and the network time saved by the cache"""
+        with self.lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            average = self.network_seconds / self.network_calls if self.network_calls else 0.0
+            return {
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+                "avg_network_seconds": average,
+                "saved_seconds": (self.hits + self.negative_hits) * average,
+            }
+
+lookup_cache = BarcodeLookupCache(Session)
+
+def resolve_barcode(barcode):
+    """Resolves a scanned barcode: local products, lookup cache, offline
+    OpenFoodFacts index, network.
+
+    Returns a dict with name, description, price and source ("local" results
+    also carry category and stock), or None if the barcode is unknown.
+    """
+    product = barcode_index.get(barcode)
+    if product:
+        return {
+            "name": product.name,
+            "description": product.description or "",
+            "price": product.price,
+            "category": product.category or "",
+            "stock": product.stock,
+            "source": "local"
+        }
+        
+    hit, result = lookup_cache.get(barcode)
+    if hit and result is not None:
+        return result
+        
+    offline = offline_barcodes.get(barcode)
+    if offline:
+        return offline
+    if hit:
+        return None
+        
+    started = time.perf_counter()
+    result, complete = lookup_engine.resolve(barcode)
+    if result is not None or complete:
+        # "Nicht gefunden" nur cachen, wenn alle Anbieter geantwortet haben
+        lookup_cache.put(barcode, result, time.perf_counter() - started)
+    return result
+
+# Massenimport von Produkten (CSV/XLSX)
+# Spaltenüberschrift (klein geschrieben) -> Produktfeld
+IMPORT_HEADERS = {
+    "barcode": "barcode",
+    "ean": "barcode",
+    "name": "name",
+    "produktname": "name",
+    "description": "description",
+    "beschreibung": "description",
+    "category": "category",
+    "kategorie": "category",
+    "price": "price",
+    "preis": "price",
+    "stock": "stock",
+    "bestand": "stock",
+    "lagerbestand": "stock",
+}
+
+def iter_import_rows(path):
+    """Streams rows of a CSV or XLSX file as dicts keyed by product field"""
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(h or "").strip().lower() for h in next(rows, [])]
+            fields = [IMPORT_HEADERS.get(h) for h in header]
+            for values in rows:
+                yield {f: v for f, v in zip(fields, values) if f}
+        finally:
+            workbook.close()
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            sample = f.read(4096)
+            f.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                dialect = csv.excel
+            reader = csv.reader(f, dialect)
+            header = [h.strip().lower() for h in next(reader, [])]
+            fields = [IMPORT_HEADERS.get(h) for h in header]
+            for values in reader:
+                yield {f: v for f, v in zip(fields, values) if f}
+
+def validate_import_row(row):
+    """Returns a cleaned product dict; raises ValueError for invalid rows"""
+    barcode = str(row.get("barcode") or "").strip()
+    name = str(row.get("name") or "").strip()
+    if not barcode or not name:
+        raise ValueError("Barcode and name are required")
+    price = row.get("price")
+    if isinstance(price, str):
+        price = price.strip().replace(",", ".")
+    stock = row.get("stock")
+    try:
+        price = float(price) if price not in (None, "") else 0.0
+        stock = int(float(stock)) if stock not in (None, "") else 0
+    except (TypeError, ValueError):
+        raise ValueError("Price must be a number and Stock must be an integer")
+    return {
+        "barcode": barcode,
+        "name": name,
+        "description": str(row.get("description") or "").strip(),
+        "category": str(row.get("category") or "").strip(),
+        "price": price,
+        "stock": stock,
+    }
+
+class ProductImporter:
+    """Set-based bulk import of products.
+
+    Rows are validated in batches; every batch is written in one transaction
+    with one multi-row upsert for products and one for the matching
+    StockHistory "import" rows. Categories are resolved through a cache that
+    is loaded once and extended with new categories as needed.
+    """
+
+    def __init__(self, session_factory, batch_size=5000, progress=None):
+        self.Session = session_factory
+        self.batch_size = batch_size
+        self.progress = progress
+        self.categories = None
+        self.stats = {"rows": 0, "inserted": 0, "updated": 0, "invalid": 0}
+        self.errors = []
+
+    def category_id(self, session, name):
+        if not name:
+            return None
+        if self.categories is None:
+            self.categories = dict(session.query(Category.name, Category.id).all())
+        if name not in self.categories:
+            result = session.execute(sqlite_insert(Category.__table__).values(name=name))
+            self.categories[name] = result.inserted_primary_key[0]
+        return self.categories[name]
+
+    def run(self, path):
+        """Imports a file and returns the statistics dict"""
+        started = time.perf_counter()
+        batch = OrderedDict()
+        for line, row in enumerate(iter_import_rows(path), start=2):
+            self.stats["rows"] += 1
+            try:
+                product = validate_import_row(row)
+            except ValueError as e:
+                self.stats["invalid"] += 1
+                if len(self.errors) < 100:
+                    self.errors.append((line, str(e)))
+                continue
+            batch[product["barcode"]] = product  # doppelte Barcodes: letzte Zeile gewinnt
+            if len(batch) >= self.batch_size:
+                retry_on_lock(self.write_batch, list(batch.values()))
+                batch.clear()
+                if self.progress:
+                    self.progress(self.stats["rows"], time.perf_counter() - started)
+        if batch:
+            retry_on_lock(self.write_batch, list(batch.values()))
+            
+        self.stats["seconds"] = time.perf_counter() - started
+        self.stats["rows_per_second"] = (
+            self.stats["rows"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
+        )
+        self.stats["errors"] = self.errors
+        return self.stats
+
+    def write_batch(self, products):
+        session = self.Session()
+        try:
+            # Vorhandene Bestände mit einer Abfrage je 500 Barcodes laden
+            barcodes = [p["barcode"] for p in products]
+            old_stock = {}
+            for i in range(0, len(barcodes), 500):
+                old_stock.update(
+                    session.query(Product.barcode, Product.stock)
+                    .filter(Product.barcode.in_(barcodes[i:i + 500]))
+                    .all()
+                )
+                
+            now = datetime.now()
+            rows = []
+            history = []
+            counts = {"inserted": 0, "updated": 0}
+            for p in products:
+                rows.append({
+                    "barcode": p["barcode"],
+                    "name": p["name"],
+                    "description": p["description"],
+                    "price": p["price"],
+                    "stock": p["stock"],
+                    "category_id": self.category_id(session, p["category"]),
+                    "created_at": now,
+                    "updated_at": now,
+                })
+                previous = old_stock.get(p["barcode"]) or 0
+                counts["updated" if p["barcode"] in old_stock else "inserted"] += 1
+                if previous != p["stock"]:
+                    history.append({
+                        "product_barcode": p["barcode"],
+                        "stock_level": p["stock"],
+                        "timestamp": now,
+                        "change_type": "import",
+                        "notes": f"Stock changed from {previous} to {p['stock']}",
+                    })
+                    
+            stmt = sqlite_insert(Product.__table__)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Product.barcode],
+                set_={
+                    "name": stmt.excluded.name,
+                    "description": stmt.excluded.description,
+                    "price": stmt.excluded.price,
+                    "stock": stmt.excluded.stock,
+                    "category_id": stmt.excluded.category_id,
+                    "updated_at": stmt.excluded.updated_at,
+                    "version": Product.__table__.c.version + 1,
+                }
+            )
+            session.execute(stmt, rows)
+            if history:
+                session.execute(StockHistory.__table__.insert(), history)
+            log_product_changes(session.connection(), "insert", [b for b in barcodes if b not in old_stock])
+            log_product_changes(session.connection(), "update", [b for b in barcodes if b in old_stock])
+                
+            queue_product_change(session, "reload", None)
+            session.commit()
+            for key, count in counts.items():
+                self.stats[key] += count
+        except Exception:
+            session.rollback()
+            self.categories = None  # neu angelegte Kategorien sind mit zurückgerollt
+            raise
+        finally:
+            session.close()
+
+def import_products(path, session_factory=Session, batch_size=5000, progress=None):
+    """Imports products from a CSV or XLSX file, see ProductImporter"""
+    with db.profile("bulk-import"):
+        return ProductImporter(session_factory, batch_size, progress).run(path)
+
+# Export
+def export_catalog_csv(file_path, labels, session_factory=Session, chunk_size=5000, progress=None):
+    """Streams the selected export columns of the catalog into a CSV file.
+
+    labels are keys of EXPORT_COLUMNS. Rows are fetched chunk_size at a time
+    and written immediately, so memory use does not grow with the catalog.
+    progress(rows) is called after every chunk. Returns the number of rows.
+    """
+    columns = [EXPORT_COLUMNS[label] for label in labels]
+    rows = 0
+    session = session_factory()
+    try:
+        with open(file_path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f, lineterminator=os.linesep)
+            writer.writerow(labels)
+            for row in iter_catalog(session, columns, chunk_size):
+                writer.writerow(row)
+                rows += 1
+                if progress and rows % chunk_size == 0:
+                    progress(rows)
+    finally:
+        session.close()
+    if progress:
+        progress(rows)
+    return rows
+
+def export_column_lengths(session, columns, per_category=False):
+    """Returns the maximum text length of each column in one query.
+
+    The result maps the category name ("" for none) to the list of lengths,
+    or None to the lengths over the whole catalog if per_category is False.
+    """
+    category = func.coalesce(Category.name, "")
+    lengths = [func.coalesce(func.max(func.length(CATALOG_COLUMNS[c])), 0) for c in columns]
+    query = session.query(category, *lengths).select_from(Product).outerjoin(
+        Category, Product.category_id == Category.id
+    )
+    if per_category:
+        query = query.group_by(category)
+    return {
+        (name if per_category else None): list(maxima)
+        for name, *maxima in query.all()
+    }
+
+def excel_sheet_title(name, used):
+    """Returns a valid, unique worksheet title for a category name"""
+    title = "".join("_" if c in "[]:*?/\\" else c for c in (name or "Ohne Kategorie"))[:31]
+    base, number = title, 2
+    while title.lower() in used:
+        suffix = f" ({number})"
+        title = base[:31 - len(suffix)] + suffix
+        number += 1
+    used.add(title.lower())
+    return title
+
+def export_catalog_excel(file_path, labels, session_factory=Session, sheet_per_category=False,
+                         chunk_size=5000, progress=None):
+    """Streams the selected export columns into an XLSX file.
+
+    Uses openpyxl's write-only mode, so rows go straight to disk. Column
+    widths have to be set before the first row of a sheet is written; they
+    are therefore computed up front with one MAX(LENGTH(...)) query (per
+    category if sheet_per_category is set). Returns the number of rows.
+    """
+    columns = [EXPORT_COLUMNS[label] for label in labels]
+    category = func.coalesce(Category.name, "")
+    rows = 0
+    session = session_factory()
+    try:
+        # Spaltenbreiten vorab per SQL bestimmen
+        widths = {
+            key: [min(max(m, len(label)) + 2, 80) for m, label in zip(maxima, labels)]
+            for key, maxima in export_column_lengths(session, columns, sheet_per_category).items()
+        }
+            
+        workbook = Workbook(write_only=True)
+        header_font = Font(bold=True)
+        used_titles = set()
+        
+        def new_sheet(title, sheet_widths):
+            sheet = workbook.create_sheet(excel_sheet_title(title, used_titles))
+            for idx, width in enumerate(sheet_widths, start=1):
+                sheet.column_dimensions[get_column_letter(idx)].width = width
+            header = []
+            for label in labels:
+                cell = WriteOnlyCell(sheet, value=label)
+                cell.font = header_font
+                header.append(cell)
+            sheet.append(header)
+            return sheet
+            
+        query = catalog_query(session, columns, category.label("sheet"), join_category=True)
+        if sheet_per_category:
+            query = query.order_by(category, Product.barcode)
+        else:
+            query = query.order_by(Product.barcode)
+            
+        sheet = None
+        current = None
+        for row in query.yield_per(chunk_size):
+            if sheet_per_category and (sheet is None or row[-1] != current):
+                current = row[-1]
+                sheet = new_sheet(current, widths[current])
+            elif sheet is None:
+                sheet = new_sheet("Produkte", widths[None])
+            sheet.append(row[:-1])
+            rows += 1
+            if progress and rows % chunk_size == 0:
+                progress(rows)
+                
+        if sheet is None:
+            new_sheet("Produkte", [len(label) + 2 for label in labels])
+        workbook.save(file_path)
+    finally:
+        session.close()
+    if progress:
+        progress(rows)
+    return rows
+
+class StreamingDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate that lays out flowables taken from an iterator.
+
+    build_stream() hands doc.build an ordinary list holding the next few
+    flowables; after each handle_flowable step (reportlab's hook for laying
+    out the head of the list) the list is topped up from the iterator
+    again. Only a few flowables are in memory at any time, and the list is
+    a plain, complete list of what is still pending whenever reportlab
+    looks at it.
+    """
+
+    pending = None
+
+    def build_stream(self, flowables, lookahead=4, **kwargs):
+        self.stream = iter(flowables)
+        self.lookahead = lookahead
+        self.pending = []
+        self.top_up()
+        try:
+            self.build(self.pending, **kwargs)
+        finally:
+            self.stream = self.pending = None
+
+    def top_up(self):
+        while len(self.pending) < self.lookahead:
+            try:
+                self.pending.append(next(self.stream))
+            except StopIteration:
+                break
+
+    def handle_flowable(self, flowables):
+        super().handle_flowable(flowables)
+        # Nur die Hauptliste nachfüllen, nicht reportlabs interne Listen (_hanging)
+        if flowables is self.pending:
+            self.top_up()
+
+PDF_TABLE_STYLE = [
+    ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, 0), 14),
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
+    ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
+    ("TEXTCOLOR", (0, 1), (-1, -1), colors.black),
+    ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 1), (-1, -1), 12),
+    ("GRID", (0, 0), (-1, -1), 1, colors.black)
+]
+
+PDF_TOTAL_STYLE = [
+    ("SPAN", (0, 0), (-1, 0)),
+    ("FONTNAME", (0, 0), (-1, -1), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), 12),
+    ("BACKGROUND", (0, 0), (-1, -1), colors.lightgrey),
+    ("BOX", (0, 0), (-1, -1), 1, colors.black)
+]
+
+def export_catalog_pdf(file_path, labels, session_factory=Session, group_by_category=False,
+                       rows_per_table=25, chunk_size=5000, progress=None):
+    """Streams the selected export columns into a paginated PDF.
+
+    Rows are laid out as a sequence of page-sized tables with a repeated
+    header instead of one giant table, and the flowables are generated
+    while reportlab consumes them (StreamingDocTemplate), so time and memory grow
+    linearly with the row count. With group_by_category every category gets
+    a heading and a subtotal row (products, stock, stock value).
+    Returns a dict with rows, pages, seconds and pages_per_second.
+    """
+    started = time.perf_counter()
+    columns = [EXPORT_COLUMNS[label] for label in labels]
+    pages = [0]
+    rows = [0]
+    
+    def count_page(canvas, document):
+        pages[0] += 1
+        canvas.setFont("Helvetica", 9)
+        canvas.drawRightString(document.pagesize[0] - 30, 15, f"Seite {pages[0]}")
+        
+    doc = StreamingDocTemplate(
+        file_path,
+        pagesize=landscape(A4),
+        rightMargin=30,
+        leftMargin=30,
+        topMargin=30,
+        bottomMargin=30
+    )
+    
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        "CustomTitle",
+        parent=styles["Heading1"],
+        fontSize=24,
+        spaceAfter=30
+    )
+    
+    session = session_factory()
+    try:
+        # Feste Spaltenbreiten nach der längsten Zelle, damit reportlab nicht jede Tabelle vermessen muss
+        lengths = export_column_lengths(session, columns)[None] if columns else []
+        weights = [max(min(m, 40), len(label), 4) for m, label in zip(lengths, labels)]
+        col_widths = [doc.width * w / sum(weights) for w in weights]
+        max_chars = [int(width / 6.5) for width in col_widths]
+        
+        def cell(value, limit):
+            text = "" if value is None else str(value)
+            return text if len(text) <= limit else text[:max(limit - 1, 1)] + "…"
+            
+        def table(chunk):
+            t = Table([list(labels)] + chunk, colWidths=col_widths, repeatRows=1)
+            t.setStyle(TableStyle(PDF_TABLE_STYLE))
+            return t
+            
+        def total(text):
+            t = Table([[text] + [""] * (len(labels) - 1)], colWidths=col_widths)
+            t.setStyle(TableStyle(PDF_TOTAL_STYLE))
+            return t
+            
+        category = func.coalesce(Category.name, "")
+        query = catalog_query(
+            session, columns, category, Product.price, Product.stock, join_category=True
+        )
+        if group_by_category:
+            query = query.order_by(category, Product.barcode)
+        else:
+            query = query.order_by(Product.barcode)
+            
+        def flowables():
+            yield Paragraph("Produktliste", title_style)
+            chunk = []
+            current = None
+            group = [0, 0, 0.0]   # Produkte, Bestand, Warenwert
+            overall = [0, 0, 0.0]
+            
+            def summary(name, values):
+                return (
+                    f"{name}: {values[0]} Produkte, Bestand {values[1]}, "
+                    f"Warenwert {values[2]:.2f} €"
+                )
+                
+            for row in query.yield_per(chunk_size):
+                *values, name, price, stock = row
+                if group_by_category and name != current:
+                    if chunk:
+                        yield table(chunk)
+                        chunk = []
+                    if current is not None:
+                        yield total(summary(f"Zwischensumme {current or 'Ohne Kategorie'}", group))
+                        yield Spacer(1, 12)
+                    current = name
+                    group = [0, 0, 0.0]
+                    yield Paragraph(name or "Ohne Kategorie", styles["Heading2"])
+                    
+                chunk.append([cell(v, limit) for v, limit in zip(values, max_chars)])
+                for totals in (group, overall):
+                    totals[0] += 1
+                    totals[1] += stock or 0
+                    totals[2] += (price or 0) * (stock or 0)
+                rows[0] += 1
+                if len(chunk) >= rows_per_table:
+                    yield table(chunk)
+                    chunk = []
+                if progress and rows[0] % chunk_size == 0:
+                    progress(rows[0])
+                    
+            if chunk:
+                yield table(chunk)
+            if group_by_category and current is not None:
+                yield total(summary(f"Zwischensumme {current or 'Ohne Kategorie'}", group))
+                yield Spacer(1, 12)
+            if group_by_category:
+                yield total(summary("Gesamt", overall))
+                
+        doc.build_stream(flowables(), onFirstPage=count_page, onLaterPages=count_page)
+    finally:
+        session.close()
+        
+    if progress:
+        progress(rows[0])
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows[0],
+        "pages": pages[0],
+        "seconds": seconds,
+        "pages_per_second": pages[0] / seconds if seconds else 0.0
+    }
+
+# Analyse-Export (Arrow IPC)
+ANALYTICS_TABLES = ("categories", "products", "stock_history")
+ANALYTICS_MANIFEST = "snapshot.json"
+
+def arrow_schema(table):
+    """Maps the columns of a SQLAlchemy table to an Arrow schema"""
+    types = {
+        Integer: pa.int64(),
+        Float: pa.float64(),
+        String: pa.string(),
+        DateTime: pa.timestamp("us")
+    }
+    return pa.schema([
+        pa.field(column.name, types[type(column.type)], nullable=not column.primary_key)
+        for column in table.columns
+    ])
+
+def write_arrow_file(path, cursor, schema, chunk_size=50000):
+    """Writes the rows of cursor into an Arrow IPC file, chunk_size at a time.
+
+    Timestamps arrive from SQLite as ISO strings and are cast by Arrow in
+    bulk instead of being parsed into datetime objects one by one. The file
+    is written next to path and renamed, so readers never see a partial file.
+    Returns the number of rows written.
+    """
+    rows = 0
+    temp_path = path + ".tmp"
+    with pa.ipc.new_file(temp_path, schema) as writer:
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            arrays = []
+            for field, values in zip(schema, zip(*chunk)):
+                if pa.types.is_timestamp(field.type):
+                    arrays.append(pc.cast(pa.array(values, pa.string()), field.type))
+                else:
+                    arrays.append(pa.array(values, field.type))
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            rows += len(chunk)
+    os.replace(temp_path, path)
+    return rows
+
+def export_analytics_snapshot(target_dir, db_path="asia_store.db", full=False, chunk_size=50000):
+    """Writes products, categories and stock_history as Arrow IPC files.
+
+    products.arrow and categories.arrow are rewritten on every run. Stock
+    history is append-only: each run adds stock_history/part-NNNNNN.arrow
+    with the rows whose id is above the watermark stored in snapshot.json
+    (full=True starts over). All tables are read in one transaction. The
+    files are uncompressed so they can be memory-mapped, see
+    read_analytics_table(). Returns the manifest as a dict.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow ist nicht installiert (pip install pyarrow)")
+    started = time.perf_counter()
+    history_dir = os.path.join(target_dir, "stock_history")
+    os.makedirs(history_dir, exist_ok=True)
+    manifest_path = os.path.join(target_dir, ANALYTICS_MANIFEST)
+    
+    manifest = None
+    if not full and os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    schemas = {name: arrow_schema(Base.metadata.tables[name]) for name in ANALYTICS_TABLES}
+    if manifest is not None and manifest["schemas"] != {n: str(s) for n, s in schemas.items()}:
+        manifest = None  # Schema geändert: Historie neu schreiben
+    if manifest is None:
+        for name in os.listdir(history_dir):
+            os.remove(os.path.join(history_dir, name))
+        history = {"files": [], "rows": 0, "last_id": 0}
+    else:
+        history = manifest["tables"]["stock_history"]
+        
+    tables = {}
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("BEGIN")
+        cursor = conn.cursor()
+        for name in ("categories", "products"):
+            columns = ", ".join(schemas[name].names)
+            cursor.execute(f"SELECT {columns} FROM {name} ORDER BY 1")
+            path = os.path.join(target_dir, f"{name}.arrow")
+            tables[name] = {"file": f"{name}.arrow", "rows": write_arrow_file(path, cursor, schemas[name], chunk_size)}
+            
+        last_id = cursor.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM stock_history"
+        ).fetchone()[0]
+        appended = 0
+        if last_id > history["last_id"]:
+            columns = ", ".join(schemas["stock_history"].names)
+            cursor.execute(
+                f"SELECT {columns} FROM stock_history WHERE id > ? AND id <= ? ORDER BY id",
+                (history["last_id"], last_id)
+            )
+            part = f"part-{len(history['files']) + 1:06d}.arrow"
+            appended = write_arrow_file(
+                os.path.join(history_dir, part), cursor, schemas["stock_history"], chunk_size
+            )
+            history = {
+                "files": history["files"] + [f"stock_history/{part}"],
+                "rows": history["rows"] + appended,
+                "last_id": last_id
+            }
+        tables["stock_history"] = history
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+        
+    manifest = {
+        "format": "arrow-ipc",
+        "created_at": datetime.now().isoformat(),
+        "schemas": {n: str(s) for n, s in schemas.items()},
+        "tables": tables,
+        "appended_history_rows": appended,
+        "seconds": time.perf_counter() - started
+    }
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+def read_analytics_table(target_dir, name):
+    """Memory-maps one table of an analytics snapshot as a pyarrow.Table.
+
+    Use .to_pandas() for a DataFrame; pyarrow.dataset.dataset(path,
+    format="ipc") works on the same files as well.
+    """
+    with open(os.path.join(target_dir, ANALYTICS_MANIFEST), "r", encoding="utf-8") as f:
+        entry = json.load(f)["tables"][name]
+    files = entry["files"] if "files" in entry else [entry["file"]]
+    tables = [
+        pa.ipc.open_file(pa.memory_map(os.path.join(target_dir, file))).read_all()
+        for file in files
+    ]
+    if not tables:
+        return arrow_schema(Base.metadata.tables[name]).empty_table()
+    return pa.concat_tables(tables)
+
+# Backup
+BACKUP_LOG = "backup_log.jsonl"
+
+def file_sha256(path, block_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BackupRestarted(Exception):
+    """The source database kept changing during a stepwise backup"""
+    pass
+
+def backup_database(target_path, db_path="asia_store.db", pages=256, pause=0.005,
+                    max_restarts=3, progress=None, log=True):
+    """Creates a consistent copy of the database with SQLite's online backup API.
+
+    The database is copied pages pages per step. Between steps the source
+    is unlocked and the copy sleeps for pause seconds, so writers only
+    wait for a single step instead of the whole file. SQLite restarts the
+    copy whenever another connection writes in between; after max_restarts
+    restarts the rest is copied in a single step, which holds a read lock
+    for the duration of the copy. The copy is written under a temporary name
+    and checked with PRAGMA integrity_check before it is renamed. A
+    sha256sum-compatible <target>.sha256 file is written next to it.
+    Duration and throughput are printed and appended to backup_log.jsonl
+    in the backup directory unless log is False. Returns the statistics dict.
+    """
+    started = time.perf_counter()
+    temp_path = target_path + ".tmp"
+    restarts = 0
+    last_remaining = None
+    
+    def step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts >= max_restarts:
+                raise BackupRestarted()
+        last_remaining = remaining
+        if progress:
+            progress(total - remaining, total)
+        if remaining and pause:
+            time.sleep(pause)
+            
+    source = sqlite3.connect(db_path, timeout=30)
+    target = sqlite3.connect(temp_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=step)
+        except BackupRestarted:
+            source.backup(target)
+        copied = time.perf_counter()
+        integrity = target.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+        
+    if integrity != "ok":
+        os.remove(temp_path)
+        raise RuntimeError(f"Integritätsprüfung des Backups fehlgeschlagen: {integrity}")
+    os.replace(temp_path, target_path)
+    checksum = file_sha256(target_path)
+    with open(target_path + ".sha256", "w", encoding="utf-8") as f:
+        f.write(f"{checksum}  {os.path.basename(target_path)}\n")
+        
+    size = os.path.getsize(target_path)
+    seconds = time.perf_counter() - started
+    stats = {
+        "file": target_path,
+        "created_at": datetime.now().isoformat(),
+        "bytes": size,
+        "sha256": checksum,
+        "integrity": integrity,
+        "restarts": restarts,
+        "copy_seconds": copied - started,
+        "seconds": seconds,
+        "bytes_per_second": size / seconds if seconds else 0.0
+    }
+    if log:
+        write_backup_log(os.path.dirname(target_path), stats)
+        print(
+            f"Backup erstellt: {target_path} ({size / 1024 / 1024:.1f} MB in {seconds:.2f} s, "
+            f"{stats['bytes_per_second'] / 1024 / 1024:.1f} MB/s, sha256 {checksum[:12]})"
+        )
+    return stats
+
+def write_backup_log(backup_dir, stats):
+    """Appends one JSON line to backup_log.jsonl in backup_dir"""
+    with open(os.path.join(backup_dir or ".", BACKUP_LOG), "a", encoding="utf-8") as f:
+        f.write(json.dumps(stats) + "\n")
+
+def verify_backup(path):
+    """Checks a backup against its .sha256 file and with PRAGMA integrity_check.
+
+    Returns (ok, message).
+    """
+    checksum_path = path + ".sha256"
+    if not os.path.exists(checksum_path):
+        return False, "Prüfsumme fehlt"
+    with open(checksum_path, "r", encoding="utf-8") as f:
+        expected = f.read().split()[0]
+    if file_sha256(path) != expected:
+        return False, "Prüfsumme stimmt nicht überein"
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:  # zu stark beschädigt für integrity_check
+        integrity = str(e)
+    finally:
+        conn.close()
+    if integrity != "ok":
+        return False, integrity
+    return True, "ok"
+
+@contextmanager
+def exclusive_database(path, timeout=2.0):
+    """Takes a database out of use before it is replaced.
+
+    Switching to journal_mode=DELETE folds the WAL into the main file and
+    removes -wal and -shm; SQLite only allows it while no other connection
+    has the file open, so RuntimeError is raised if another instance still
+    uses the database. Inside the block a write lock keeps other writers
+    out (readers may still open the file).
+    """
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    try:
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            mode = conn.execute("PRAGMA journal_mode = DELETE").fetchone()[0]
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            mode = None
+        if mode != "delete":
+            raise RuntimeError(f"{path} ist noch geöffnet (läuft eine andere Instanz?)")
+        conn.execute("BEGIN IMMEDIATE")
+        yield conn
+    finally:
+        conn.close()
+
+def replace_database(source_path, target_path, keep_previous=True):
+    """Puts the database file source_path in place of target_path.
+
+    The target must not be in use (see exclusive_database). With
+    keep_previous its content is first copied to <target>.vor_restore with
+    the backup API, WAL included. Leftover -wal/-shm files of the target
+    are deleted, otherwise SQLite would replay them onto the new file.
+    """
+    conn = sqlite3.connect(source_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = DELETE")  # Quelle als einzelne Datei ohne WAL
+    finally:
+        conn.close()
+    if os.path.exists(target_path):
+        with exclusive_database(target_path):
+            if keep_previous:
+                source = sqlite3.connect(target_path)
+                safety = sqlite3.connect(target_path + ".vor_restore")
+                try:
+                    source.backup(safety)
+                finally:
+                    safety.close()
+                    source.close()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(target_path + suffix):
+            os.remove(target_path + suffix)
+    os.replace(source_path, target_path)
+
+# Inkrementelle Backups
+BACKUP_RETENTION = {"hourly": 24, "daily": 7, "weekly": 4}
+
+# Zeitpläne der Hintergrundaufgaben (Cron-Syntax); None = aus backup_time
+JOB_SCHEDULES = {
+    "backup": None,
+    "maintenance": "30 3 * * 0",
+    "low_stock_report": "0 7 * * *",
+    "analytics_export": "0 2 * * *"
+}
+
+BACKUP_SETTINGS = {
+    "auto_backup": True,
+    "backup_time": "23:00",
+    "backup_dir": "backups",
+    "retention": BACKUP_RETENTION,
+    "schedules": JOB_SCHEDULES
+}
+
+def load_backup_settings(path="settings.json"):
+    """Returns BACKUP_SETTINGS updated with the values from settings.json"""
+    settings = dict(BACKUP_SETTINGS)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            settings.update(json.load(f))
+    settings["schedules"] = dict(JOB_SCHEDULES, **settings.get("schedules", {}))
+    return settings
+
+def save_settings(settings, path="settings.json"):
+    """Writes the settings back to settings.json"""
+    with open(path + ".tmp", "w") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def snapshot_watermarks(db_path):
+    """Returns the highest ids of the change logs contained in a copy"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            table: conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            for table in ("product_changes", "stock_history")
+        }
+    finally:
+        conn.close()
+
+class IncrementalBackupStore:
+    """Content-addressed, compressed snapshots of the database.
+
+    A snapshot is a consistent copy (see backup_database) cut into
+    chunk_size pieces, which is a multiple of SQLite's page size so that a
+    changed page only touches one chunk. Each chunk is stored once under
+    chunks/<sha256[:2]>/<sha256>, zlib-compressed; the snapshot itself is
+    the list of chunk hashes in snapshots/<id>.json. Manifests are written
+    after their chunks, so an interrupted backup never leaves a snapshot
+    that cannot be restored. prune() applies the retention scheme and
+    deletes the chunks no manifest refers to anymore.
+    """
+
+    def __init__(self, backup_dir="backups", chunk_size=64 * 1024):
+        self.backup_dir = backup_dir
+        self.chunk_size = chunk_size
+        self.chunk_dir = os.path.join(backup_dir, "chunks")
+        self.snapshot_dir = os.path.join(backup_dir, "snapshots")
+        self.lock = threading.Lock()
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def create(self, db_path="asia_store.db", retention=None):
+        """Takes a snapshot, applies retention and returns the statistics"""
+        with self.lock:
+            started = time.perf_counter()
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            now = datetime.now()
+            snapshot_id = now.strftime("%Y%m%d_%H%M%S")
+            suffix = 1
+            while os.path.exists(os.path.join(self.snapshot_dir, f"{snapshot_id}.json")):
+                suffix += 1
+                snapshot_id = f"{now.strftime('%Y%m%d_%H%M%S')}_{suffix}"
+                
+            temp_path = os.path.join(self.backup_dir, f".snapshot_{snapshot_id}.db")
+            copy = backup_database(temp_path, db_path, log=False)
+            watermarks = snapshot_watermarks(temp_path)
+            chunks = []
+            new_chunks = 0
+            stored_bytes = 0
+            try:
+                with open(temp_path, "rb") as f:
+                    for data in iter(lambda: f.read(self.chunk_size), b""):
+                        digest = hashlib.sha256(data).hexdigest()
+                        chunks.append(digest)
+                        path = self.chunk_path(digest)
+                        if os.path.exists(path):
+                            continue
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        compressed = zlib.compress(data, 6)
+                        with open(path + ".tmp", "wb") as out:
+                            out.write(compressed)
+                        os.replace(path + ".tmp", path)
+                        new_chunks += 1
+                        stored_bytes += len(compressed)
+            finally:
+                os.remove(temp_path)
+                os.remove(temp_path + ".sha256")
+                
+            manifest = {
+                "id": snapshot_id,
+                "created_at": now.isoformat(),
+                "size": copy["bytes"],
+                "sha256": copy["sha256"],
+                "chunk_size": self.chunk_size,
+                "watermarks": watermarks,
+                "chunks": chunks
+            }
+            manifest_path = os.path.join(self.snapshot_dir, f"{snapshot_id}.json")
+            with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(manifest_path + ".tmp", manifest_path)
+            
+            pruned = self.prune(retention or BACKUP_RETENTION, now)
+            seconds = time.perf_counter() - started
+            stats = {
+                "snapshot": snapshot_id,
+                "created_at": now.isoformat(),
+                "bytes": copy["bytes"],
+                "chunks": len(chunks),
+                "new_chunks": new_chunks,
+                "stored_bytes": stored_bytes,
+                "removed_snapshots": pruned["snapshots"],
+                "removed_chunks": pruned["chunks"],
+                "seconds": seconds,
+                "bytes_per_second": copy["bytes"] / seconds if seconds else 0.0
+            }
+            write_backup_log(self.backup_dir, stats)
+            print(
+                f"Snapshot {snapshot_id}: {copy['bytes'] / 1024 / 1024:.1f} MB, "
+                f"{new_chunks} von {len(chunks)} Blöcken neu ({stored_bytes / 1024:.0f} KB gespeichert) "
+                f"in {seconds:.2f} s, {pruned['snapshots']} Snapshots entfernt"
+            )
+            return stats
+
+    def snapshots(self):
+        """Returns the manifests of all snapshots, oldest first"""
+        if not os.path.isdir(self.snapshot_dir):
+            return []
+        manifests = []
+        for name in sorted(os.listdir(self.snapshot_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.snapshot_dir, name), "r", encoding="utf-8") as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda m: m["created_at"])
+
+    def restore(self, snapshot_id, target_path="asia_store.db"):
+        """Rebuilds snapshot_id into target_path and verifies it.
+
+        Every chunk and the whole file are checked against their SHA-256
+        before the file replaces target_path (see replace_database; fails if
+        the target is still open elsewhere); an existing target is kept as
+        <target>.vor_restore. "latest" restores the newest snapshot.
+        """
+        manifests = self.snapshots()
+        if snapshot_id == "latest" and manifests:
+            manifest = manifests[-1]
+        else:
+            manifest = next((m for m in manifests if m["id"] == snapshot_id), None)
+        if manifest is None:
+            raise ValueError(f"Snapshot nicht gefunden: {snapshot_id}")
+            
+        temp_path = target_path + ".restore"
+        digest = hashlib.sha256()
+        with open(temp_path, "wb") as out:
+            for chunk in manifest["chunks"]:
+                with open(self.chunk_path(chunk), "rb") as f:
+                    data = zlib.decompress(f.read())
+                if hashlib.sha256(data).hexdigest() != chunk:
+                    raise RuntimeError(f"Beschädigter Block {chunk}")
+                digest.update(data)
+                out.write(data)
+        if digest.hexdigest() != manifest["sha256"]:
+            os.remove(temp_path)
+            raise RuntimeError("Prüfsumme des wiederhergestellten Snapshots stimmt nicht")
+            
+        conn = sqlite3.connect(temp_path)
+        try:
+            integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            conn.close()
+        if integrity != "ok":
+            os.remove(temp_path)
+            raise RuntimeError(f"Integritätsprüfung fehlgeschlagen: {integrity}")
+            
+        try:
+            replace_database(temp_path, target_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return manifest
+
+    def prune(self, retention=BACKUP_RETENTION, now=None):
+        """Deletes snapshots outside the retention scheme and unused chunks.
+
+        retention maps "hourly", "daily" and "weekly" to the number of the
+        most recent hours, days and weeks that keep their newest snapshot.
+        The newest snapshot overall is always kept.
+        """
+        buckets = {
+            "hourly": lambda d: d.strftime("%Y%m%d%H"),
+            "daily": lambda d: d.strftime("%Y%m%d"),
+            "weekly": lambda d: d.isocalendar()[:2]
+        }
+        manifests = self.snapshots()
+        keep = {manifests[-1]["id"]} if manifests else set()
+        for kind, count in retention.items():
+            seen = []
+            for manifest in reversed(manifests):
+                bucket = buckets[kind](datetime.fromisoformat(manifest["created_at"]))
+                if bucket in seen:
+                    continue
+                if len(seen) >= count:
+                    break
+                seen.append(bucket)
+                keep.add(manifest["id"])
+                
+        removed = 0
+        referenced = set()
+        for manifest in manifests:
+            if manifest["id"] in keep:
+                referenced.update(manifest["chunks"])
+            else:
+                os.remove(os.path.join(self.snapshot_dir, f"{manifest['id']}.json"))
+                removed += 1
+                
+        # Nicht mehr referenzierte Blöcke löschen
+        removed_chunks = 0
+        if os.path.isdir(self.chunk_dir):
+            for prefix in os.listdir(self.chunk_dir):
+                directory = os.path.join(self.chunk_dir, prefix)
+                for name in os.listdir(directory):
+                    if name not in referenced:
+                        os.remove(os.path.join(directory, name))
+                        removed_chunks += 1
+        return {"snapshots": removed, "chunks": removed_chunks}
+
+# Wiederherstellung zu einem Zeitpunkt
+def restore_point_in_time(target_time, store, target_path="asia_store.db", log_db="asia_store.db",
+                          dry_run=False):
+    """Restores the database as it was at target_time.
+
+    Takes the newest snapshot of store created before target_time and
+    replays the product_changes and stock_history rows of log_db that are
+    newer than the snapshot (by the id watermarks in its manifest) and not
+    newer than target_time. Products are set to their last logged state
+    with one statement, so the replay costs time in proportion to the
+    changes, not to the size of the catalog. History rows of products that
+    were deleted after the snapshot cannot be recovered, because deleting a
+    product deletes its history.
+
+    With dry_run the result is only compared with log_db (normally the live
+    database) and the diff is returned; otherwise the restored file replaces
+    target_path (see replace_database; the old content is kept as
+    <target>.vor_restore).
+    """
+    started = time.perf_counter()
+    manifests = [
+        m for m in store.snapshots()
+        if datetime.fromisoformat(m["created_at"]) <= target_time
+    ]
+    if not manifests:
+        raise ValueError(f"Kein Snapshot vor {target_time:%Y-%m-%d %H:%M}")
+    manifest = manifests[-1]
+    watermarks = manifest.get("watermarks", {"product_changes": 0, "stock_history": 0})
+    until = sqlite_timestamp(target_time)
+    
+    temp_path = target_path + ".pitr"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    store.restore(manifest["id"], temp_path)
+    restored = time.perf_counter()
+    
+    conn = sqlite3.connect(temp_path, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS log", (log_db,))
+        conn.execute("BEGIN")
+        columns = ", ".join(LOGGED_PRODUCT_COLUMNS)
+        
+        # Letzter Zustand je Produkt bis zum Zeitpunkt
+        conn.execute(f"""
+            CREATE TEMP TABLE replay AS
+            SELECT c.barcode, c.action, {columns}
+            FROM log.product_changes c
+            JOIN (
+                SELECT MAX(id) AS id FROM log.product_changes
+                WHERE id > ? AND changed_at <= ?
+                GROUP BY barcode
+            ) last ON c.id = last.id
+        """, (watermarks["product_changes"], until))
+        replayed = conn.execute("SELECT COUNT(*) FROM replay").fetchone()[0]
+        
+        history = conn.execute("""
+            INSERT OR IGNORE INTO stock_history (id, product_barcode, stock_level, timestamp, change_type, notes)
+            SELECT id, product_barcode, stock_level, timestamp, change_type, notes
+            FROM log.stock_history WHERE id > ? AND timestamp <= ?
+        """, (watermarks["stock_history"], until)).rowcount
+        
+        if conn.execute("SELECT 1 FROM replay WHERE action = 'delete' LIMIT 1").fetchone():
+            conn.execute("""
+                DELETE FROM stock_history WHERE product_barcode IN
+                (SELECT barcode FROM replay WHERE action = 'delete')
+            """)
+            conn.execute("DELETE FROM products WHERE barcode IN (SELECT barcode FROM replay WHERE action = 'delete')")
+        updates = ", ".join(f"{c} = excluded.{c}" for c in LOGGED_PRODUCT_COLUMNS)
+        conn.execute(f"""
+            INSERT INTO products (barcode, {columns})
+            SELECT barcode, {columns} FROM replay WHERE action != 'delete'
+            ON CONFLICT(barcode) DO UPDATE SET {updates}
+        """)
+        conn.execute("COMMIT")
+        
+        diff = point_in_time_diff(conn, watermarks["product_changes"], until) if dry_run else None
+    finally:
+        conn.close()
+        
+    # Der Snapshot wurde beim Zurückspielen bereits geprüft (Prüfsummen, integrity_check)
+    if dry_run:
+        os.remove(temp_path)
+    else:
+        try:
+            replace_database(temp_path, target_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        
+    finished = time.perf_counter()
+    return {
+        "snapshot": manifest["id"],
+        "target_time": target_time.isoformat(),
+        "replayed_products": replayed,
+        "replayed_history": history,
+        "diff": diff,
+        "snapshot_seconds": restored - started,
+        "replay_seconds": finished - restored,
+        "seconds": finished - started
+    }
+
+def point_in_time_diff(conn, watermark, until):
+    """Compares the restored products (main) with the attached log database.
+
+    Only products changed after the snapshot can differ, so only those are
+    compared. Returns {"added": [...], "removed": [...], "changed": [(barcode,
+    {column: (current, restored)})], "history_dropped": n}; "added" are
+    products the restore brings back, "removed" products it drops.
+    """
+    columns = ("barcode",) + LOGGED_PRODUCT_COLUMNS
+    select_columns = ", ".join(columns)
+    barcodes = [row[0] for row in conn.execute(
+        "SELECT DISTINCT barcode FROM log.product_changes WHERE id > ?", (watermark,)
+    )]
+    diff = {"added": [], "removed": [], "changed": []}
+    for i in range(0, len(barcodes), 500):
+        chunk = barcodes[i:i + 500]
+        marks = ", ".join("?" * len(chunk))
+        restored = {row[0]: row for row in conn.execute(
+            f"SELECT {select_columns} FROM main.products WHERE barcode IN ({marks})", chunk
+        )}
+        current = {row[0]: row for row in conn.execute(
+            f"SELECT {select_columns} FROM log.products WHERE barcode IN ({marks})", chunk
+        )}
+        for barcode in chunk:
+            old, new = current.get(barcode), restored.get(barcode)
+            if old is None and new is not None:
+                diff["added"].append(barcode)
+            elif old is not None and new is None:
+                diff["removed"].append(barcode)
+            elif old != new:
+                diff["changed"].append((barcode, {
+                    column: (a, b) for column, a, b in zip(columns, old, new)
+                    if a != b and column != "updated_at"
+                }))
+    diff["history_dropped"] = conn.execute(
+        "SELECT COUNT(*) FROM log.stock_history WHERE timestamp > ?", (until,)
+    ).fetchone()[0]
+    return diff
+
+# Schreib-Warteschlange (Group Commit)
+class ProductConflict(Exception):
+    """The product was changed by someone else since it was loaded"""
+    pass
+
+def adjust_stock(session, barcode, delta, change_type="adjust", notes=None):
+    """Changes the stock of a product by delta and returns the new stock.
+
+    One UPDATE ... SET stock = stock + ? does the read-modify-write inside
+    SQLite, so concurrent adjustments from several registers add up instead
+    of overwriting each other. The version is not touched: a stock change
+    does not conflict with an edit of name or price. Runs in the caller's
+    transaction (also usable as a WriteQueue command).
+    """
+    now = datetime.now()
+    products = Product.__table__
+    row = session.execute(
+        products.update()
+        .where(products.c.barcode == barcode)
+        .values(stock=func.coalesce(products.c.stock, 0) + delta, updated_at=now)
+        .returning(products.c.stock)
+    ).first()
+    if row is None:
+        raise KeyError(f"Unbekannter Barcode: {barcode}")
+    stock = row[0]
+    session.execute(StockHistory.__table__.insert().values(
+        product_barcode=barcode,
+        stock_level=stock,
+        timestamp=now,
+        change_type=change_type,
+        notes=notes or f"Stock changed from {stock - delta} to {stock}"
+    ))
+    log_product_changes(session.connection(), "update", [barcode])
+    values = catalog_query(session).filter(Product.barcode == barcode).first()
+    queue_product_change(session, "update", barcode, tuple(values))
+    return stock
+
+def save_product_record(session, barcode, name, description, category_name, price, stock,
+                        change_type="manual", version=None, loaded_stock=None):
+    """Creates or updates a product, creating its category if needed.
+
+    Write command for WriteQueue: runs in the caller's transaction and
+    does not commit. For a product loaded into a form, pass its version
+    and the stock shown then: if name, description, category or price
+    differ from the stored ones, they are only written if nobody changed
+    the product meanwhile (ProductConflict otherwise), and the stock is
+    adjusted by the difference the user entered. A pure stock change
+    therefore never conflicts. Without them the stock is set to the
+    given value.
+    """
+    category = session.query(Category).filter_by(name=category_name).first()
+    if not category:
+        category = Category(name=category_name)
+        session.add(category)
+        
+    product = session.get(Product, barcode)
+    if product:
+        changed = (
+            (product.name, product.description, product.category, product.price)
+            != (name, description, category, price)
+        )
+        if changed and version is not None and product.version != version:
+            raise ProductConflict(f"{barcode} wurde inzwischen an einer anderen Kasse geändert")
+        product.name = name
+        product.description = description
+        product.category = category
+        product.price = price
+        try:
+            session.flush()  # UPDATE ... WHERE version = ? nur, wenn sich etwas geändert hat
+        except StaleDataError:
+            raise ProductConflict(f"{barcode} wurde inzwischen an einer anderen Kasse geändert")
+        delta = stock - (loaded_stock if loaded_stock is not None else product.stock or 0)
+        if delta:
+            adjust_stock(session, barcode, delta, change_type)
+            session.expire(product, ["stock", "updated_at"])
+        return barcode
+        
+    product = Product(
+        barcode=barcode,
+        name=name,
+        description=description,
+        category=category,
+        price=price,
+        stock=stock
+    )
+    session.add(product)
+    if stock:
+        session.add(StockHistory(
+            product=product,
+            stock_level=stock,
+            change_type=change_type,
+            notes=f"Stock changed from 0 to {stock}"
+        ))
+    session.flush()
+    return barcode
+
+def delete_product_record(session, barcode):
+    """Deletes a product with its stock history; returns False if it did not exist"""
+    product = session.get(Product, barcode)
+    if product is None:
+        return False
+    session.delete(product)
+    session.flush()
+    return True
+
+class WriteQueue:
+    """Single writer thread that applies mutations in group commits.
+
+    submit(command, *args) queues command(session, *args) and returns a
+    Future. The writer takes the first waiting command, collects more for
+    up to window seconds (at most max_batch), runs each in its own
+    savepoint and commits the batch once: one fsync for the whole batch,
+    while a failing command only rolls back its savepoint and fails its
+    own future. Futures complete after the commit, so a result means the
+    change is durable.
+    """
+
+    def __init__(self, session_factory=Session, window=0.005, max_batch=256):
+        self.Session = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        # commands: erfolgreiche Befehle, failed: fehlgeschlagene Befehle,
+        # batched: alle Befehle committeter Batches (für die mittlere Batchgröße),
+        # failed_batches: komplett zurückgerollte Batches
+        self.counters = {"commands": 0, "failed": 0, "batches": 0, "batched": 0, "failed_batches": 0,
+                         "largest_batch": 0, "commit_seconds": 0.0, "max_latency": 0.0}
+        self.thread = threading.Thread(target=self.loop, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, command, *args, **kwargs):
+        future = Future()
+        self.queue.put((command, args, kwargs, future, time.perf_counter()))
+        return future
+
+    def stop(self, timeout=5):
+        """Finishes the queued commands and stops the writer thread"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.perf_counter() + self.window
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self.write(batch)
+            if stop:
+                return
+
+    def write(self, batch):
+        session = self.Session()
+        results = []
+        failures = 0
+        try:
+            # Schreibsperre gleich zu Beginn: kein Sperr-Upgrade mitten im Batch, und
+            # das erste RELEASE SAVEPOINT beendet keine implizite Transaktion
+            retry_on_lock(session.connection().exec_driver_sql, "BEGIN IMMEDIATE")
+            for command, args, kwargs, future, queued in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                pending = len(session.info.get("product_changes", []))
+                try:
+                    with session.begin_nested():
+                        result = command(session, *args, **kwargs)
+                    results.append((future, result, queued))
+                except Exception as e:
+                    # Meldungen des zurückgerollten Befehls verwerfen
+                    del session.info.get("product_changes", [])[pending:]
+                    future.set_exception(e)
+                    failures += 1
+            started = time.perf_counter()
+            session.commit()
+            commit_seconds = time.perf_counter() - started
+        except Exception as e:
+            session.rollback()
+            failed = [item[3] for item in batch if not item[3].done()]
+            for future in failed:
+                future.set_exception(e)
+            with self.lock:
+                self.counters["failed"] += failures + len(failed)
+                self.counters["failed_batches"] += 1
+            print(f"Fehler beim Schreiben ({len(batch)} Befehle): {str(e)}")
+            return
+        finally:
+            session.close()
+            
+        now = time.perf_counter()
+        for future, result, queued in results:
+            future.set_result(result)
+        with self.lock:
+            self.counters["commands"] += len(results)
+            self.counters["failed"] += failures
+            self.counters["batches"] += 1
+            self.counters["batched"] += len(results) + failures
+            self.counters["largest_batch"] = max(self.counters["largest_batch"], len(results) + failures)
+            self.counters["commit_seconds"] += commit_seconds
+            if results:
+                self.counters["max_latency"] = max(
+                    self.counters["max_latency"], max(now - queued for _, _, queued in results)
+                )
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["pending"] = self.queue.qsize()
+        stats["mean_batch"] = stats["batched"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+# Offline-Replikat
+class OfflineReplica:
+    """Local copy of the catalog in offline.db, synchronised by deltas.
+
+    products and categories use the same schema as the main database.
+    Edits made while offline are written to the replica and, in the same
+    transaction, to the outbox table: one row per product, so repeated
+    edits of a product coalesce into one entry, whose idempotency key
+    changes with every edit. The entry also keeps the stock and version the
+    product had before its first offline edit. push() sends the outbox in
+    batches; each batch is applied to the main database in one transaction
+    that also stores the keys in sync_receipts, and is then removed from
+    the outbox. If the app stops in between, the next push skips the keys
+    already applied, so a sync can always be resumed. Stock is sent as the
+    difference to the pulled value and added with stock = stock + ?, so
+    sales made online meanwhile are kept; the other columns are only
+    written if the product's version is still the pulled one (otherwise the
+    online edit wins and the push counts a conflict). pull() applies the
+    product_changes log of the main database since the last pulled id (kept
+    in sync_state); products with pending outbox entries keep their local
+    version.
+    """
+
+    def __init__(self, path="offline.db", database=db):
+        self.path = path
+        self.database = database
+        self.Session = database.Session
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.replica = Database(f"sqlite:///{path}", pool_size=2, max_overflow=0)
+        Base.metadata.create_all(self.replica.engine, tables=[Category.__table__, Product.__table__])
+        self.ReplicaSession = self.replica.Session  # nur lesen, siehe record()
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    barcode TEXT PRIMARY KEY,
+                    action TEXT NOT NULL,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    queued_at TEXT NOT NULL,
+                    edits INTEGER NOT NULL DEFAULT 1,
+                    base_stock INTEGER,
+                    base_version INTEGER
+                )
+            """)
+            # Replikate und Outboxen aus älteren Versionen nachziehen
+            add_column(self.conn, "products", "version", "INTEGER NOT NULL DEFAULT 1")
+            add_column(self.conn, "outbox", "base_stock", "INTEGER")
+            add_column(self.conn, "outbox", "base_version", "INTEGER")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+
+    def close(self):
+        self.conn.close()
+        self.replica.dispose()
+
+    def state(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def pending(self):
+        """Number of products waiting in the outbox"""
+        return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def category_id(self, name):
+        row = self.conn.execute("SELECT id FROM categories WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def record(self, action, barcode, values=None):
+        """Applies an offline edit to the replica and queues it in the outbox.
+
+        action is "upsert" (values: dict of product columns) or "delete".
+        The ORM is not used for writing here: its flush hooks write to the
+        change log of the main database. The first edit of a product keeps
+        its pulled stock and version as the base for push().
+        """
+        now = datetime.now()
+        with self.lock, self.conn:
+            base = self.conn.execute(
+                "SELECT stock, version FROM products WHERE barcode = ?", (barcode,)
+            ).fetchone() or (None, None)
+            if action == "delete":
+                self.conn.execute("DELETE FROM products WHERE barcode = ?", (barcode,))
+            else:
+                row = dict(values, barcode=barcode, updated_at=sqlite_timestamp(now))
+                row.setdefault("created_at", sqlite_timestamp(now))
+                columns = ", ".join(row)
+                updates = ", ".join(f"{c} = excluded.{c}" for c in row if c not in ("barcode", "created_at"))
+                self.conn.execute(
+                    f"INSERT INTO products ({columns}) VALUES ({', '.join('?' * len(row))}) "
+                    f"ON CONFLICT(barcode) DO UPDATE SET {updates}",
+                    list(row.values())
+                )
+            self.conn.execute("""
+                INSERT INTO outbox (barcode, action, idempotency_key, queued_at, base_stock, base_version)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(barcode) DO UPDATE SET
+                    action = excluded.action,
+                    idempotency_key = excluded.idempotency_key,
+                    edits = edits + 1
+            """, (barcode, action, str(uuid.uuid4()), sqlite_timestamp(now), *base))
+
+    def push(self, batch_size=5000):
+        """Sends the outbox to the main database, batch_size products per transaction"""
+        started = time.perf_counter()
+        stats = {"pushed": 0, "edits": 0, "duplicates": 0, "conflicts": 0, "batches": 0}
+        products = Product.__table__
+        fields = [c for c in LOGGED_PRODUCT_COLUMNS if c not in ("stock", "created_at", "updated_at")]
+        update_fields = products.update().where(
+            products.c.barcode == bindparam("key"), products.c.version == bindparam("expected")
+        ).values(version=products.c.version + 1)
+        add_stock = products.update().where(products.c.barcode == bindparam("key")).values(
+            stock=func.coalesce(products.c.stock, 0) + bindparam("delta"), updated_at=bindparam("now")
+        )
+        while True:
+            with self.lock:
+                batch = self.conn.execute(f"""
+                    SELECT o.barcode, o.action, o.idempotency_key, o.edits, o.base_stock, o.base_version,
+                           p.barcode IS NOT NULL, {", ".join("p." + c for c in LOGGED_PRODUCT_COLUMNS)}
+                    FROM outbox o LEFT JOIN products p ON p.barcode = o.barcode
+                    ORDER BY o.queued_at, o.barcode LIMIT ?
+                """, (batch_size,)).fetchall()
+            if not batch:
+                break
+                
+            barcodes = [row[0] for row in batch]
+            keys = [row[2] for row in batch]
+            session = self.Session()
+            try:
+                applied = set()
+                current = {}
+                for i in range(0, len(keys), 500):
+                    applied.update(k for (k,) in session.query(SyncReceipt.key).filter(
+                        SyncReceipt.key.in_(keys[i:i + 500])
+                    ))
+                    current.update(
+                        (row[0], row[1:]) for row in session.query(
+                            Product.barcode, Product.version, *[products.c[c] for c in fields]
+                        ).filter(Product.barcode.in_(barcodes[i:i + 500]))
+                    )
+                    
+                now = datetime.now()
+                inserts, updates, deltas, deletes, history, receipts = [], [], [], [], [], []
+                conflicts = set()
+                sent = {}  # Barcode -> (gesendeter Bestand, Version danach), siehe unten
+                for barcode, action, key, edits, base_stock, base_version, exists, *values in batch:
+                    if key in applied:
+                        stats["duplicates"] += 1
+                        continue
+                    receipts.append({"key": key, "applied_at": now})
+                    stats["edits"] += edits
+                    if action == "delete" or not exists:
+                        deletes.append(barcode)
+                        sent[barcode] = (None, None)
+                        continue
+                    row = dict(zip(LOGGED_PRODUCT_COLUMNS, values), barcode=barcode)
+                    for column in ("created_at", "updated_at"):
+                        if row[column]:
+                            row[column] = datetime.fromisoformat(row[column])
+                    if barcode not in current:
+                        inserts.append(row)
+                        sent[barcode] = (row["stock"], 1)
+                        if row["stock"]:
+                            history.append({
+                                "product_barcode": barcode,
+                                "stock_level": row["stock"],
+                                "timestamp": now,
+                                "change_type": "offline",
+                                "notes": f"Stock changed from 0 to {row['stock']}",
+                            })
+                        continue
+                    version, *online = current[barcode]
+                    sent[barcode] = (row["stock"], version)
+                    if [row[c] for c in fields] != online:
+                        if version != base_version:
+                            conflicts.add(barcode)  # online geändert: die Online-Werte bleiben
+                            sent[barcode] = (row["stock"], base_version)
+                        else:
+                            updates.append(dict(
+                                {c: row[c] for c in fields},
+                                key=barcode, expected=version, updated_at=row["updated_at"] or now
+                            ))
+                            sent[barcode] = (row["stock"], version + 1)
+                    delta = (row["stock"] or 0) - (base_stock or 0)
+                    if delta:
+                        deltas.append({"key": barcode, "delta": delta, "now": now})
+                        
+                if inserts:
+                    session.execute(sqlite_insert(products).on_conflict_do_nothing(), inserts)
+                    log_product_changes(session.connection(), "insert", [r["barcode"] for r in inserts])
+                # Einzeln, um die Trefferzahl zu prüfen: hat eine Online-Änderung die
+                # Version seit dem Lesen erhöht, greift die Bedingung nicht -> Konflikt
+                updated = []
+                for update in updates:
+                    if session.execute(update_fields, update).rowcount:
+                        updated.append(update["key"])
+                    else:
+                        conflicts.add(update["key"])
+                        sent[update["key"]] = (sent[update["key"]][0], update["expected"])
+                if deltas:
+                    session.execute(add_stock, deltas)
+                    adjusted = [(d["key"], d["delta"]) for d in deltas]
+                    stocks = {}
+                    for i in range(0, len(adjusted), 500):
+                        stocks.update(session.query(Product.barcode, Product.stock).filter(
+                            Product.barcode.in_([barcode for barcode, _ in adjusted[i:i + 500]])
+                        ).all())
+                    history.extend({
+                        "product_barcode": barcode,
+                        "stock_level": stocks[barcode],
+                        "timestamp": now,
+                        "change_type": "offline",
+                        "notes": f"Stock changed from {stocks[barcode] - delta} to {stocks[barcode]}",
+                    } for barcode, delta in adjusted)
+                changed = sorted(set(updated) | {d["key"] for d in deltas})
+                if changed:
+                    log_product_changes(session.connection(), "update", changed)
+                if deletes:
+                    for i in range(0, len(deletes), 500):
+                        session.query(StockHistory).filter(
+                            StockHistory.product_barcode.in_(deletes[i:i + 500])
+                        ).delete(synchronize_session=False)
+                        session.query(Product).filter(
+                            Product.barcode.in_(deletes[i:i + 500])
+                        ).delete(synchronize_session=False)
+                    log_product_changes(session.connection(), "delete", deletes)
+                if history:
+                    session.execute(StockHistory.__table__.insert(), history)
+                if receipts:
+                    session.execute(SyncReceipt.__table__.insert(), receipts)
+                    queue_product_change(session, "reload", None)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+                
+            # Erst nach dem Commit aus der Outbox nehmen. Einträge, die während des
+            # Sendens erneut bearbeitet wurden, bleiben stehen; ihre Basis ist jetzt
+            # der gesendete Stand, damit die Differenz nicht doppelt gezählt wird.
+            with self.lock, self.conn:
+                self.conn.executemany("DELETE FROM outbox WHERE idempotency_key = ?", [(k,) for k in keys])
+                self.conn.executemany(
+                    "UPDATE outbox SET base_stock = ?, base_version = ? WHERE barcode = ?",
+                    [(stock, version, barcode) for barcode, (stock, version) in sent.items()]
+                )
+            stats["pushed"] += len(receipts)
+            stats["conflicts"] += len(conflicts)
+            stats["batches"] += 1
+            
+        stats["seconds"] = time.perf_counter() - started
+        return stats
+
+    def pull(self, chunk_size=5000):
+        """Applies the changes of the main database since the last pull.
+
+        The first pull copies the whole catalog; afterwards only products
+        with new entries in product_changes are transferred.
+        """
+        started = time.perf_counter()
+        watermark = self.state("pulled_change_id")
+        columns = ("barcode",) + LOGGED_PRODUCT_COLUMNS + ("version",)
+        column_list = ", ".join(columns)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns[1:])
+        
+        with self.database.connect() as main:
+            main.execute("BEGIN")  # ein konsistenter Lesestand
+            last_id = main.execute("SELECT COALESCE(MAX(id), 0) FROM product_changes").fetchone()[0]
+            categories = main.execute("SELECT id, name, description, min_stock FROM categories").fetchall()
+            if watermark is None:
+                cursor = main.execute(f"SELECT {column_list} FROM products")
+            else:
+                # Die Version steht nicht im Protokoll; der Lesestand ist derselbe, also
+                # gehört die aktuelle Version zur letzten Änderung
+                cursor = main.execute(f"""
+                    SELECT c.action, {", ".join("c." + c for c in columns[:-1])}, COALESCE(p.version, 1)
+                    FROM product_changes c
+                    JOIN (
+                        SELECT MAX(id) AS id FROM product_changes WHERE id > ? GROUP BY barcode
+                    ) last ON c.id = last.id
+                    LEFT JOIN products p ON p.barcode = c.barcode
+                """, (int(watermark),))
+                
+            with self.lock, self.conn:
+                pending = {b for (b,) in self.conn.execute("SELECT barcode FROM outbox")}
+                self.conn.execute("DELETE FROM categories")
+                self.conn.executemany(
+                    "INSERT INTO categories (id, name, description, min_stock) VALUES (?, ?, ?, ?)",
+                    categories
+                )
+                if watermark is None:
+                    self.conn.execute("DELETE FROM products WHERE barcode NOT IN (SELECT barcode FROM outbox)")
+                pulled = 0
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    if watermark is not None:
+                        deleted = [(r[1],) for r in rows if r[0] == "delete" and r[1] not in pending]
+                        rows = [r[1:] for r in rows if r[0] != "delete"]
+                        self.conn.executemany("DELETE FROM products WHERE barcode = ?", deleted)
+                        pulled += len(deleted)
+                    rows = [r for r in rows if r[0] not in pending]
+                    self.conn.executemany(
+                        f"INSERT INTO products ({column_list}) VALUES ({', '.join('?' * len(columns))}) "
+                        f"ON CONFLICT(barcode) DO UPDATE SET {updates}",
+                        rows
+                    )
+                    pulled += len(rows)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('pulled_change_id', ?)",
+                    (str(last_id),)
+                )
+            main.execute("COMMIT")
+        return {
+            "pulled": pulled,
+            "full": watermark is None,
+            "seconds": time.perf_counter() - started
+        }
 
-# UPCitemdb Demo API Key (Sie können später Ihren eigenen eintragen)
-UPCITEMDB_API_KEY = "DEMO_KEY"
-UPCITEMDB_ENDPOINT = "https://api.upcitemdb.com/prod/trial/lookup?upc={barcode}"
-OPENFOODFACTS_ENDPOINT = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
+    def sync(self):
+        """Pushes the outbox, then pulls the changes of the main database"""
+        pushed = self.push()
+        pulled = self.pull()
+        return dict(pushed, pulled=pulled["pulled"], seconds=pushed["seconds"] + pulled["seconds"])
 
-class Category(Base):
-    __tablename__ = 'categories'
-    
-    id = Column(Integer, primary_key=True)
-    name = Column(String(50), unique=True)
-    description = Column(String(200))
-    min_stock = Column(Integer, default=5)  # Minimaler Bestand für Warnung
-    products = relationship("Product", back_populates="category")
+# Export-Jobs
+EXPORT_WRITERS = {
+    ".csv": export_catalog_csv,
+    ".xlsx": export_catalog_excel,
+    ".pdf": export_catalog_pdf
+}
 
-class Product(Base):
-    __tablename__ = 'products'
-    
-    barcode = Column(String(50), primary_key=True)
-    name = Column(String(100))
-    description = Column(String(200))
-    price = Column(Float)
-    stock = Column(Integer)
-    category_id = Column(Integer, ForeignKey('categories.id'))
-    category = relationship("Category", back_populates="products")
-    created_at = Column(DateTime, default=datetime.now)
-    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
-    image_path = Column(String)
-    stock_history = relationship("StockHistory", back_populates="product", cascade="all, delete-orphan")
+class ExportCancelled(Exception):
+    """Raised inside an export worker when its job has been cancelled"""
+    pass
 
-class StockHistory(Base):
-    __tablename__ = 'stock_history'
-    
-    id = Column(Integer, primary_key=True)
-    product_barcode = Column(String(50), ForeignKey('products.barcode'))
-    product = relationship("Product", back_populates="stock_history")
-    stock_level = Column(Integer)
-    timestamp = Column(DateTime, default=datetime.now)
-    change_type = Column(String(20))  # 'manual', 'sale', 'restock', etc.
-    notes = Column(String(200))
+def create_export_snapshot(db_path="asia_store.db"):
+    """Copies the database with SQLite's backup API into a temporary file.
 
-class User(Base):
-    __tablename__ = "users"
+    All jobs of one export request read from the same copy, so XLSX, PDF and
+    CSV show the same data even if products change while they are written.
+    Returns (path, number of products).
+    """
+    fd, path = tempfile.mkstemp(prefix="asia_store_export_", suffix=".db")
+    os.close(fd)
+    source = sqlite3.connect(db_path)
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+        total = target.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    return path, total
+
+def discard_export_snapshot(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+EXPORT_CANCEL_SLOTS = 1024
+export_worker = {}
+
+def init_export_worker(progress_queue, cancel_flags):
+    """Pool initializer: keeps the shared progress queue and cancel flags"""
+    export_worker["progress"] = progress_queue
+    export_worker["cancel"] = cancel_flags
+
+def run_export_job(job_id, file_path, labels, snapshot_path, options):
+    """Runs one export in a worker process (see ExportJobQueue).
+
+    Progress is sent as (job_id, rows) through the shared queue; the writer's
+    progress callback raises ExportCancelled once the job's cancel flag is
+    set, and the half-written file is removed. Returns a plain dict so that
+    nothing defined in this module has to be unpickled by the caller.
+    """
+    started = time.perf_counter()
+    writer = EXPORT_WRITERS[os.path.splitext(file_path)[1].lower()]
+    snapshot = Database(f"sqlite:///{snapshot_path}", profile="reporting", pool_size=1)
+    slot = job_id % EXPORT_CANCEL_SLOTS
     
-    username = Column(String, primary_key=True)
-    password_hash = Column(String)
-    role = Column(String)  # admin, manager, user
-    last_login = Column(DateTime)
-    is_active = Column(Boolean, default=True)
+    def progress(rows):
+        if export_worker["cancel"][slot]:
+            raise ExportCancelled()
+        export_worker["progress"].put((job_id, rows))
+        
+    try:
+        progress(0)
+        result = writer(file_path, labels, snapshot.Session, progress=progress, **options)
+    except ExportCancelled:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        return {"cancelled": True}
+    finally:
+        snapshot.dispose()
+        
+    if not isinstance(result, dict):
+        result = {"rows": result}
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+class ExportJob:
+    """State of one queued export, updated by ExportJobQueue.poll()"""
     
-    def __repr__(self):
-        return f"<User(username='{self.username}', role='{self.role}')>"
+    STATES = {
+        "queued": "wartend",
+        "running": "läuft",
+        "done": "fertig",
+        "failed": "Fehler",
+        "cancelled": "abgebrochen"
+    }
 
-# Erstelle die Datenbank-Tabellen
-Base.metadata.create_all(engine)
+    def __init__(self, job_id, file_path, labels, options):
+        self.id = job_id
+        self.file_path = file_path
+        self.labels = labels
+        self.options = options
+        self.snapshot = None  # gesetzt, sobald der Snapshot der Anfrage fertig ist
+        self.total = 0
+        self.rows = 0
+        self.state = "queued"
+        self.result = None
+        self.error = None
+        self.future = None
 
-# Standard-Kategorien erstellen, falls keine existieren
-def create_default_categories():
-    session = Session()
-    if not session.query(Category).first():
-        default_categories = [
-            ("Nudeln", "Verschiedene Nudelsorten", 10),
-            ("Saucen", "Asiatische Saucen und Gewürze", 5),
-            ("Snacks", "Asiatische Snacks und Chips", 8),
-            ("Getränke", "Asiatische Getränke", 6),
-            ("Tiefkühl", "Tiefkühlprodukte", 4),
-            ("Reis", "Verschiedene Reissorten", 7),
-            ("Gemüse", "Frisches und konserviertes Gemüse", 5),
-            ("Fisch & Fleisch", "Fisch- und Fleischprodukte", 3)
+    @property
+    def active(self):
+        return self.state in ("queued", "running")
+
+    @property
+    def fraction(self):
+        if self.state == "done":
+            return 1.0
+        return min(self.rows / self.total, 1.0) if self.total else 0.0
+
+    def describe(self):
+        text = f"{os.path.basename(self.file_path)}: {self.STATES[self.state]}"
+        if self.state == "running":
+            text += f" ({self.rows} / {self.total} Zeilen)"
+        elif self.state == "failed":
+            text += f" ({self.error})"
+        return text
+
+class ExportJobQueue:
+    """Runs export jobs in a pool of worker processes.
+
+    Jobs beyond max_workers wait in the pool's queue. Generating an XLSX or
+    PDF file is CPU bound, so separate processes (rather than threads) let
+    several formats be written in parallel on different cores, and the Tk
+    thread never blocks on an export. The snapshot the jobs read from is
+    copied on a background thread as well; the jobs are handed to the pool
+    once it is ready. The workers are started with the first job; progress
+    and cancellation go through a queue and a shared array handed to them by
+    the pool initializer. poll() must be called regularly from the Tk
+    thread; it dispatches ready snapshots and applies progress messages and
+    finished futures.
+    """
+
+    def __init__(self, db_path="asia_store.db", max_workers=None):
+        self.db_path = db_path
+        self.max_workers = max_workers or max(1, min(3, os.cpu_count() or 1))
+        self.executor = None
+        self.snapshotter = None
+        self.progress_queue = None
+        self.cancel_flags = None
+        self.jobs = OrderedDict()
+        self.next_id = 1
+        self.pending = []  # (Future des Snapshots, Jobs der Anfrage)
+        self.snapshots = {}  # Snapshot-Pfad -> Anzahl offener Jobs
+
+    def start(self):
+        if self.executor is None:
+            # "spawn" statt fork: der Tk-Prozess läuft mit mehreren Threads
+            context = multiprocessing.get_context("spawn")
+            self.progress_queue = context.Queue()
+            self.cancel_flags = context.Array("b", EXPORT_CANCEL_SLOTS, lock=False)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=init_export_worker,
+                initargs=(self.progress_queue, self.cancel_flags)
+            )
+            self.snapshotter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="export-snapshot")
+
+    def submit(self, exports):
+        """Queues [(file_path, labels, options), ...] on one shared snapshot.
+
+        Returns the new ExportJob objects in the same order right away; the
+        snapshot is copied in the background and the jobs start from poll().
+        """
+        for file_path, labels, options in exports:
+            if os.path.splitext(file_path)[1].lower() not in EXPORT_WRITERS:
+                raise ValueError(f"Unbekanntes Exportformat: {file_path}")
+        self.start()
+        
+        jobs = []
+        for file_path, labels, options in exports:
+            job = ExportJob(self.next_id, file_path, labels, options)
+            self.next_id += 1
+            self.cancel_flags[job.id % EXPORT_CANCEL_SLOTS] = 0
+            self.jobs[job.id] = job
+            jobs.append(job)
+        self.pending.append((self.snapshotter.submit(create_export_snapshot, self.db_path), jobs))
+        return jobs
+
+    def dispatch(self, jobs, snapshot, total):
+        """Hands the jobs of one request to the pool once their snapshot exists"""
+        jobs = [job for job in jobs if job.active]
+        if not jobs:
+            discard_export_snapshot(snapshot)
+            return
+        self.snapshots[snapshot] = len(jobs)
+        for job in jobs:
+            job.snapshot = snapshot
+            job.total = total
+            job.future = self.executor.submit(
+                run_export_job, job.id, job.file_path, job.labels, snapshot, job.options
+            )
+
+    def cancel(self, job):
+        """Cancels a waiting or running job"""
+        if not job.active:
+            return
+        if job.future is None:  # Snapshot noch nicht fertig, dispatch() überspringt den Job
+            job.state = "cancelled"
+        elif job.future.cancel():
+            self.finish(job, "cancelled")
+        else:
+            self.cancel_flags[job.id % EXPORT_CANCEL_SLOTS] = 1
+
+    def cancel_all(self):
+        for job in list(self.jobs.values()):
+            self.cancel(job)
+
+    def active_jobs(self):
+        return [job for job in self.jobs.values() if job.active]
+
+    def poll(self):
+        """Applies progress and results; returns the jobs that changed"""
+        changed = OrderedDict()
+        if self.progress_queue is None:
+            return []
+        for request in list(self.pending):
+            snapshot, jobs = request
+            if not snapshot.done():
+                continue
+            self.pending.remove(request)
+            if snapshot.exception() is not None:
+                for job in jobs:
+                    if job.active:
+                        job.error = str(snapshot.exception())
+                        job.state = "failed"
+                        changed[job.id] = job
+            else:
+                self.dispatch(jobs, *snapshot.result())
+                
+        try:
+            while True:
+                job_id, rows = self.progress_queue.get_nowait()
+                job = self.jobs.get(job_id)
+                if job is not None and job.active:
+                    job.state = "running"
+                    job.rows = rows
+                    changed[job_id] = job
+        except queue.Empty:
+            pass
+            
+        for job in self.active_jobs():
+            if job.future is None or not job.future.done():
+                continue
+            if job.future.cancelled():
+                self.finish(job, "cancelled")
+            elif job.future.exception() is not None:
+                job.error = str(job.future.exception())
+                self.finish(job, "failed")
+            elif job.future.result().get("cancelled"):
+                self.finish(job, "cancelled")
+            else:
+                job.result = job.future.result()
+                job.rows = job.result["rows"]
+                self.finish(job, "done")
+            changed[job.id] = job
+        return list(changed.values())
+
+    def finish(self, job, state):
+        job.state = state
+        remaining = self.snapshots.get(job.snapshot, 1) - 1
+        if remaining > 0:
+            self.snapshots[job.snapshot] = remaining
+            return
+        self.snapshots.pop(job.snapshot, None)
+        discard_export_snapshot(job.snapshot)
+
+    def shutdown(self):
+        """Cancels all jobs and stops the worker processes"""
+        self.cancel_all()
+        
+        def discard(future):
+            if not future.cancelled() and future.exception() is None:
+                discard_export_snapshot(future.result()[0])
+                
+        for snapshot, jobs in self.pending:
+            snapshot.add_done_callback(discard)  # Snapshots, die noch entstehen
+        self.pending = []
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.snapshotter is not None:
+            self.snapshotter.shutdown(wait=False, cancel_futures=True)
+            self.snapshotter = None
+
+# Zeitplaner
+class CronSpec:
+    """Five-field cron expression: minute hour day month weekday.
+
+    Fields accept *, numbers, ranges (1-5), lists (1,15) and steps (*/15,
+    0-30/10); weekday 0 and 7 are Sunday. As in cron, a job with both day
+    and weekday restricted runs when either of them matches; a field that
+    starts with * (also */2) counts as unrestricted, so the other one has to
+    match as well.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, spec):
+        parts = spec.split()
+        if len(parts) != 5:
+            raise ValueError(f"Ungültiger Zeitplan (5 Felder erwartet): {spec}")
+        self.spec = spec
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self.parse(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)
         ]
-        for name, desc, min_stock in default_categories:
-            category = Category(name=name, description=desc, min_stock=min_stock)
-            session.add(category)
-        session.commit()
-    session.close()
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = parts[2].startswith("*")
+        self.any_weekday = parts[4].startswith("*")
+
+    @staticmethod
+    def parse(field, low, high):
+        values = set()
+        for item in field.split(","):
+            value, _, step = item.partition("/")
+            if value == "*":
+                start, end = low, high
+            elif "-" in value:
+                start, end = (int(v) for v in value.split("-", 1))
+            else:
+                start = end = int(value)
+                if step:
+                    end = high
+            if start < low or end > high or start > end:
+                raise ValueError(f"Wert außerhalb von {low}-{high}: {item}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+
+    def matches_day(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """Returns the first matching minute after moment"""
+        current = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = current + timedelta(days=4 * 366)
+        while current < limit:
+            if current.month not in self.months:
+                current = (current.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+            elif not self.matches_day(current):
+                current = current.replace(hour=0, minute=0) + timedelta(days=1)
+            elif current.hour not in self.hours:
+                current = current.replace(minute=0) + timedelta(hours=1)
+            elif current.minute not in self.minutes:
+                current += timedelta(minutes=1)
+            else:
+                return current
+        raise ValueError(f"Zeitplan trifft nie zu: {self.spec}")
+
+class ScheduledJob:
+    """A registered job and its next planned run"""
+
+    def __init__(self, name, spec, func, jitter=0, catch_up=True):
+        self.name = name
+        self.spec = CronSpec(spec)
+        self.func = func
+        self.jitter = jitter
+        self.catch_up = catch_up
+        self.scheduled_for = None  # Termin laut Zeitplan
+        self.next_run = None       # Termin plus Jitter
+        self.lock = threading.Lock()
+
+class Scheduler:
+    """Runs registered jobs on cron schedules in a background thread.
+
+    - The thread sleeps until the next due job instead of polling, and is
+      woken early when jobs are registered or changed.
+    - Catch-up: if a job missed at least one run while the app was closed
+      (according to job_runs), it runs once right after start.
+    - Jitter: each run is delayed by up to jitter seconds, so jobs sharing a
+      schedule do not all hit the database at the same moment.
+    - Single run: a job never overlaps itself (skipped runs are recorded),
+      and every run is claimed by inserting its (job, scheduled_for) row
+      into job_runs, which is unique, so a second running instance of the
+      app skips runs the first one has already started.
+    Runs, durations and errors are kept in the job_runs table.
+    """
+
+    def __init__(self, session_factory=Session, max_workers=2):
+        self.Session = session_factory
+        self.jobs = OrderedDict()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scheduler")
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = False
+
+    def register(self, name, spec, func, jitter=0, catch_up=True):
+        """Adds or replaces a job; func() may return a message for the history"""
+        job = ScheduledJob(name, spec, func, jitter, catch_up)
+        with self.lock:
+            self.jobs[name] = job
+            if self.thread is not None:
+                self.plan(job, datetime.now())
+        self.wakeup.set()
+        return job
+
+    def unregister(self, name):
+        with self.lock:
+            self.jobs.pop(name, None)
+        self.wakeup.set()
+
+    def reschedule(self, name, spec):
+        """Changes the schedule of a registered job"""
+        job = self.jobs[name]
+        with self.lock:
+            job.spec = CronSpec(spec)
+            self.plan(job, datetime.now(), catch_up=False)
+        self.wakeup.set()
+
+    def last_scheduled(self, name):
+        session = self.Session()
+        try:
+            return session.query(func.max(JobRun.scheduled_for)).filter(
+                JobRun.job == name, JobRun.status != "skipped"
+            ).scalar()
+        finally:
+            session.close()
+
+    def plan(self, job, now, catch_up=True):
+        """Sets the next run of job, catching up a missed run if needed"""
+        last = self.last_scheduled(job.name) if catch_up and job.catch_up else None
+        if last is not None and job.spec.next_after(last) <= now:
+            missed = job.spec.next_after(last)
+            while job.spec.next_after(missed) <= now:
+                missed = job.spec.next_after(missed)
+            job.scheduled_for = missed  # verpasste Läufe nur einmal nachholen
+            job.next_run = now
+        else:
+            job.scheduled_for = job.spec.next_after(now)
+            job.next_run = job.scheduled_for
+        if job.jitter:
+            job.next_run += timedelta(seconds=random.uniform(0, job.jitter))
+
+    def start(self):
+        """Plans all jobs and starts the scheduler thread"""
+        with self.lock:
+            now = datetime.now()
+            for job in self.jobs.values():
+                self.plan(job, now)
+        self.thread = threading.Thread(target=self.loop, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+        self.executor.shutdown(wait=False)
 
-create_default_categories()
+    def loop(self):
+        while not self.stopped:
+            now = datetime.now()
+            with self.lock:
+                for job in self.jobs.values():
+                    if job.next_run <= now:
+                        slot = job.scheduled_for
+                        self.executor.submit(self.run, job, slot)
+                        job.scheduled_for = job.spec.next_after(max(slot, now))
+                        job.next_run = job.scheduled_for
+                        if job.jitter:
+                            job.next_run += timedelta(seconds=random.uniform(0, job.jitter))
+                upcoming = [job.next_run for job in self.jobs.values()]
+            # Höchstens eine Minute schlafen, damit Uhrzeitänderungen auffallen
+            timeout = min([(t - datetime.now()).total_seconds() for t in upcoming] + [60])
+            self.wakeup.wait(max(timeout, 0))
+            self.wakeup.clear()
+
+    def run_now(self, name):
+        """Runs a job immediately (outside of its schedule)"""
+        return self.executor.submit(self.run, self.jobs[name], datetime.now())
+
+    def run(self, job, slot):
+        """Runs job for the given slot and records the run in job_runs"""
+        if not job.lock.acquire(blocking=False):
+            self.record(job.name, slot, "skipped", "vorheriger Lauf noch aktiv")
+            return
+        try:
+            session = self.Session()
+            try:
+                run = JobRun(job=job.name, scheduled_for=slot, started_at=datetime.now(), status="running")
+                session.add(run)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    session.rollback()  # Termin wurde bereits von einer anderen Instanz übernommen
+                    return
+                    
+                started = time.perf_counter()
+                try:
+                    result = job.func()
+                    run.status = "ok"
+                    run.message = str(result)[:500] if result is not None else None
+                except Exception as e:
+                    run.status = "failed"
+                    run.message = str(e)[:500]
+                    print(f"Fehler in Aufgabe {job.name}: {str(e)}")
+                run.finished_at = datetime.now()
+                run.duration = time.perf_counter() - started
+                session.commit()
+            finally:
+                session.close()
+        finally:
+            job.lock.release()
+
+    def record(self, name, slot, status, message):
+        session = self.Session()
+        try:
+            now = datetime.now()
+            session.add(JobRun(
+                job=name, scheduled_for=now, started_at=now, finished_at=now,
+                duration=0.0, status=status, message=f"{message} (Termin {slot:%Y-%m-%d %H:%M})"
+            ))
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+        finally:
+            session.close()
+
+    def history(self, limit=100):
+        """Returns the latest runs, newest first"""
+        session = self.Session()
+        try:
+            return session.query(JobRun).order_by(JobRun.started_at.desc()).limit(limit).all()
+        finally:
+            session.close()
+
+def write_low_stock_report(report_dir="reports", session_factory=Session):
+    """Writes the products below their category's minimum stock as CSV.
+
+    Returns a short summary for the job history.
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"low_stock_{datetime.now():%Y%m%d}.csv")
+    columns = ("barcode", "name", "category", "stock", "min_stock")
+    session = session_factory()
+    try:
+        rows = catalog_query(session, columns).filter(
+            Product.stock < Category.min_stock
+        ).order_by(Category.name, Product.barcode).all()
+    finally:
+        session.close()
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, lineterminator=os.linesep)
+        writer.writerow(["Barcode", "Produktname", "Kategorie", "Lagerbestand", "Mindestbestand"])
+        writer.writerows(rows)
+    return f"{len(rows)} Produkte unter Mindestbestand -> {path}"
+
+def run_maintenance(database=db):
+    """Weekly housekeeping: expired lookup cache entries and query planner statistics"""
+    purged = lookup_cache.purge_expired()
+    with database.connect() as conn:
+        conn.execute("PRAGMA optimize")
+    return f"{purged} abgelaufene Cache-Einträge gelöscht"
+
+# Virtuelle Produktliste
+class VirtualProductList:
+    """Windowed view of the products table for a ttk.Treeview.
+
+    Only the rows around the visible scroll window are inserted into the
+    tree. Pages are fetched with keyset pagination on the active sort column
+    (ties broken by barcode) and kept in a small LRU cache, so memory and
+    refresh time do not grow with the catalog.
+    """
+
+    COLUMNS = DISPLAY_COLUMNS
+
+    def __init__(self, tree, scrollbar, session_factory, page_size=200, max_pages=8):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.Session = session_factory
+        self.page_size = page_size
+        self.max_pages = max_pages
+
+        self.sort_column = "barcode"
+        self.descending = False
+
+        self.first = 0          # Index der obersten sichtbaren Zeile
+        self.visible = 20       # Anzahl sichtbarer Zeilen
+        self.total = None       # Anzahl Produkte (lazy)
+        self.pages = OrderedDict()  # Seitennummer -> Zeilen (mit Sortierwert am Ende)
+        self.anchors = {}       # Seitennummer -> Sortierschlüssel der Vorgängerzeile
+
+        self.scrollbar.configure(command=self.on_scrollbar)
+        self.tree.configure(yscrollcommand=lambda *args: None)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.scroll(self.visible))
+        self.tree.bind("<Up>", self.on_key_up)
+        self.tree.bind("<Down>", self.on_key_down)
+
+    def sort_expression(self, column):
+        """Returns the SQL expression used for ordering by a list column"""
+        expressions = {
+            "barcode": Product.barcode,
+            "name": PRODUCT_NAME_KEY,
+            "description": func.coalesce(Product.description, ""),
+            "category": func.coalesce(Category.name, ""),
+            "price": func.coalesce(Product.price, 0),
+            "stock": func.coalesce(Product.stock, 0),
+        }
+        return expressions[column]
+
+    def refresh(self):
+        """Drops all cached pages and redraws the current window"""
+        self.total = None
+        self.pages.clear()
+        self.anchors.clear()
+        self.render()
+
+    def sort_by(self, column):
+        """Sorts by the given column, toggling direction on repeated clicks"""
+        if column == self.sort_column:
+            self.descending = not self.descending
+        else:
+            self.sort_column = column
+            self.descending = False
+        self.first = 0
+        self.refresh()
+
+    def count(self):
+        if self.total is None:
+            session = self.Session()
+            try:
+                self.total = session.query(func.count(Product.barcode)).scalar() or 0
+            finally:
+                session.close()
+        return self.total
+
+    def fetch_page(self, page):
+        """Loads one page of display rows, preferring keyset over OFFSET"""
+        sort = self.sort_expression(self.sort_column)
+        session = self.Session()
+        try:
+            query = catalog_query(session, DISPLAY_COLUMNS, sort)
+
+            offset = 0
+            anchor = self.anchors.get(page)
+            if page > 0 and anchor is not None:
+                key, barcode = anchor
+                # Die einfache Schranke vorne lässt SQLite im Index einsteigen (ix_products_name)
+                if self.descending:
+                    query = query.filter(sort <= key, or_(sort < key, and_(sort == key, Product.barcode < barcode)))
+                else:
+                    query = query.filter(sort >= key, or_(sort > key, and_(sort == key, Product.barcode > barcode)))
+            elif page > 0:
+                offset = page * self.page_size
+
+            if self.descending:
+                query = query.order_by(sort.desc(), Product.barcode.desc())
+            else:
+                query = query.order_by(sort, Product.barcode)
+
+            rows = query.offset(offset).limit(self.page_size).all()
+        finally:
+            session.close()
+
+        if len(rows) == self.page_size:
+            last = rows[-1]
+            self.anchors[page + 1] = (last[-1], last[0])
+        return [tuple(row) for row in rows]
+
+    def get_page(self, page):
+        if page in self.pages:
+            self.pages.move_to_end(page)
+            return self.pages[page]
+        rows = self.fetch_page(page)
+        self.pages[page] = rows
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+        return rows
+
+    def window_rows(self):
+        """Returns the rows for the current scroll window"""
+        rows = []
+        index = self.first
+        end = min(self.first + self.visible, self.count())
+        while index < end:
+            page, offset = divmod(index, self.page_size)
+            page_rows = self.get_page(page)
+            chunk = page_rows[offset:offset + (end - index)]
+            if not chunk:
+                break
+            rows.extend(row[:-1] for row in chunk)
+            index += len(chunk)
+        return rows
+
+    def render(self):
+        """Replaces the tree items with the rows of the current window"""
+        total = self.count()
+        self.first = max(0, min(self.first, total - self.visible))
+        selection = set(self.tree.selection())
+
+        self.tree.delete(*self.tree.get_children())
+        for barcode, name, description, category, price, stock in self.window_rows():
+            self.tree.insert("", "end", iid=barcode, values=(
+                barcode,
+                name,
+                description or "",
+                category or "",
+                f"{price:.2f}" if price is not None else "",
+                stock
+            ))
+
+        keep = [iid for iid in selection if self.tree.exists(iid)]
+        if keep:
+            self.tree.selection_set(keep)
+
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + self.visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def row_key(self, values):
+        """Returns the (sort value, barcode) key of a display row"""
+        value = values[self.COLUMNS.index(self.sort_column)]
+        if value is None:
+            value = 0 if self.sort_column in ("price", "stock") else ""
+        return (value, values[0])
+
+    def precedes(self, a, b):
+        return a > b if self.descending else a < b
+
+    def find_cached(self, barcode):
+        for page, rows in self.pages.items():
+            for index, row in enumerate(rows):
+                if row[0] == barcode:
+                    return page, index
+        return None
+
+    def invalidate_from(self, key):
+        """Drops cached pages and anchors at or after the given sort key"""
+        for page, rows in list(self.pages.items()):
+            if len(rows) < self.page_size or not self.precedes((rows[-1][-1], rows[-1][0]), key):
+                del self.pages[page]
+        for page, anchor in list(self.anchors.items()):
+            if not self.precedes(anchor, key):
+                del self.anchors[page]
+
+    def apply_changes(self, changes):
+        """Patches the cached window with committed product changes.
+
+        Updates that keep the sort key are patched in place; inserts, deletes
+        and moves only drop the pages behind the affected position.
+        """
+        for change in changes:
+            if change.action == "reload" or change.values is None:
+                self.refresh()
+                return
+
+            old_key = None
+            cached = self.find_cached(change.barcode)
+            if cached is not None:
+                page, index = cached
+                row = self.pages[page][index]
+                old_key = (row[-1], row[0])
+            elif self.sort_column == "barcode":
+                old_key = (change.barcode, change.barcode)
+
+            new_key = self.row_key(change.values)
+            if change.action == "update" and old_key == new_key:
+                if cached is not None:
+                    self.pages[page][index] = tuple(change.values) + (new_key[0],)
+                continue
+
+            if change.action != "insert":
+                if old_key is None:
+                    self.pages.clear()
+                    self.anchors.clear()
+                else:
+                    self.invalidate_from(old_key)
+            if change.action != "delete":
+                self.invalidate_from(new_key)
+
+            if self.total is not None:
+                if change.action == "insert":
+                    self.total += 1
+                elif change.action == "delete":
+                    self.total -= 1
+
+        self.render()
+
+    def scroll(self, rows):
+        first = max(0, min(self.first + rows, self.count() - self.visible))
+        if first != self.first:
+            self.first = first
+            self.render()
+        return "break"
+
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.first = int(float(args[0]) * self.count())
+            self.render()
+        elif action == "scroll":
+            amount, unit = int(args[0]), args[1]
+            self.scroll(amount * self.visible if unit == "pages" else amount)
+
+    def on_mousewheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        visible = max(1, event.height // row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def on_key_up(self, event):
+        children = self.tree.get_children()
+        if children and self.tree.focus() == children[0] and self.first > 0:
+            self.scroll(-1)
+            self.focus_row(0)
+            return "break"
+
+    def on_key_down(self, event):
+        children = self.tree.get_children()
+        if children and self.tree.focus() == children[-1]:
+            self.scroll(1)
+            self.focus_row(-1)
+            return "break"
+
+    def focus_row(self, index):
+        children = self.tree.get_children()
+        if children:
+            self.tree.selection_set(children[index])
+            self.tree.focus(children[index])
 
 class AsiaStoreApp:
     def __init__(self, root):
@@ -120,14 +4002,9 @@ class AsiaStoreApp:
         self.root.title("Asia Store Management System")
         self.root.geometry("1200x800")
         
-        # Database setup
-        self.engine = create_engine("sqlite:///asia_store.db")
-        self.Session = sessionmaker(bind=self.engine)
-        self.session = self.Session()
-        
-        # SQLite database
-        self.db = sqlite3.connect("asia_store.db")
-        self.cursor = self.db.cursor()
+        # Database setup (ein Pool für alle Zugriffe)
+        self.db = db
+        self.Session = db.Session
         
         # User session (no login)
         self.current_user = {"username": "open", "role": "admin"}
@@ -144,28 +4021,55 @@ class AsiaStoreApp:
         self.price_var = tk.StringVar()
         self.stock_var = tk.StringVar()
         self.status_var = tk.StringVar()
+        self.loaded_product = None  # (barcode, stock, version) des Produkts im Formular
+        
+        # Barcode-Abfragen im Hintergrund
+        self.lookup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="barcode-lookup")
+        self.lookup_seq = 0
+        self.lookups_in_flight = 0
+        self.ui_queue = queue.Queue()
+        
+        # Alle Änderungen am Katalog laufen über einen Schreib-Thread (Group Commit)
+        self.writer = WriteQueue(self.Session)
+        
+        # Export-Aufträge laufen in eigenen Prozessen
+        self.export_jobs = ExportJobQueue()
+        self.export_polling = False
+        self.export_jobs_window = None
         
         # Setup language
         self.setup_language()
         
+        # Backups
+        self.setup_backup()
+        self.setup_offline_mode()
+        
         # Show main window
         self.show_main_window()
+        self.process_ui_queue()
         
     def __del__(self):
         """Cleanup when the application is closed"""
         try:
-            if hasattr(self, 'session'):
-                self.session.close()
-            if hasattr(self, 'offline_db'):
-                self.offline_db.close()
+            if hasattr(self, 'lookup_executor'):
+                self.lookup_executor.shutdown(wait=False)
+            if hasattr(self, 'export_jobs'):
+                self.export_jobs.shutdown()
+            if hasattr(self, 'scheduler'):
+                self.scheduler.stop()
+            if hasattr(self, 'writer'):
+                self.writer.stop()
+            if hasattr(self, 'offline_replica'):
+                self.offline_replica.close()
+            if hasattr(self, 'db'):
+                self.db.dispose()
         except Exception as e:
             print(f"Error during cleanup: {str(e)}")
     
     def init_db(self):
         """Initialisiert die Datenbank"""
         try:
-            Base.metadata.create_all(self.engine)
-            self.session.commit()
+            Base.metadata.create_all(self.db.engine)
         except Exception as e:
             messagebox.showerror(
                 self.translations[self.current_language]["error"],
@@ -178,56 +4082,33 @@ class AsiaStoreApp:
             return session.query(Product).all()
             
     def get_product_by_barcode(self, barcode):
-        """Gibt ein Produkt anhand des Barcodes zurück"""
-        with self.Session() as session:
-            return session.query(Product).filter_by(barcode=barcode).first()
-            
-    def delete_product(self):
-        """Löscht ein Produkt"""
-        if not self.check_permission("delete"):
-            messagebox.showerror("Fehler", "Keine Berechtigung zum Löschen")
-            return
-            
-        selection = self.tree.selection()
-        if not selection:
-            self.warning_var.set("Bitte Produkt auswählen")
-            return
+        """Gibt ein Produkt (ProductRecord) anhand des Barcodes zurück"""
+        return barcode_index.get(barcode)
             
-        if not messagebox.askyesno("Löschen", "Produkt wirklich löschen?"):
-            return
-            
-        item = self.tree.item(selection[0])
-        barcode = item["values"][0]
-        
-        with self.Session() as session:
-            product = self.get_product_by_barcode(barcode)
-            if product:
-                session.delete(product)
-                session.commit()
-                self.status_var.set("Produkt gelöscht")
-                self.update_product_list()
-                self.update_charts()
-                
     def update_product_list(self):
         """Updates the product list with current data"""
         try:
+            if getattr(self, "product_list", None) is not None:
+                self.product_list.refresh()
+                return
+                
             # Clear existing items
             for item in self.product_tree.get_children():
                 self.product_tree.delete(item)
                 
             # Get products from database
             session = self.Session()
-            products = session.query(Product).all()
+            rows = catalog_query(session).all()
             
             # Add products to treeview
-            for product in products:
+            for barcode, name, description, category, price, stock in rows:
                 self.product_tree.insert("", "end", values=(
-                    product.barcode,
-                    product.name,
-                    product.description or "",
-                    product.category.name if product.category else "",
-                    f"{product.price:.2f}",
-                    product.stock
+                    barcode,
+                    name,
+                    description or "",
+                    category or "",
+                    f"{price:.2f}",
+                    stock
                 ))
                 
             session.close()
@@ -238,133 +4119,271 @@ class AsiaStoreApp:
                 f"Error updating product list: {str(e)}"
             )
             
-    def export_data(self):
-        """Exportiert die Daten"""
-        if not self.check_permission("export"):
-            messagebox.showerror("Fehler", "Keine Berechtigung zum Exportieren")
-            return
+    def import_data(self):
+        """Importiert Produkte aus einer CSV- oder Excel-Datei"""
+        if not self.check_permission("write"):
+            messagebox.showerror("Fehler", "Keine Berechtigung zum Importieren")
+            return
+            
+        file_path = filedialog.askopenfilename(
+            filetypes=[
+                ("CSV / Excel", "*.csv *.xlsx"),
+                ("CSV", "*.csv"),
+                ("Excel", "*.xlsx")
+            ]
+        )
+        if not file_path:
+            return
+            
+        def progress(rows, seconds):
+            self.call_in_ui(self.status_var.set, f"Import: {rows} Zeilen ({rows / seconds:.0f}/s)")
+            
+        def run():
+            try:
+                result = import_products(file_path, self.Session, progress=progress)
+                self.call_in_ui(self.on_import_done, result)
+            except Exception as e:
+                self.call_in_ui(self.status_var.set, f"Import-Fehler: {str(e)}")
+                
+        self.status_var.set("Import läuft...")
+        threading.Thread(target=run, daemon=True).start()
+        
+    def on_import_done(self, result):
+        """Zeigt das Ergebnis eines Imports an"""
+        self.status_var.set(
+            f"Import: {result['inserted']} neu, {result['updated']} aktualisiert, "
+            f"{result['invalid']} ungültig ({result['rows_per_second']:.0f} Zeilen/s)"
+        )
+        if result["errors"]:
+            messagebox.showwarning(
+                self.translations[self.current_language]["warning"],
+                "\n".join(f"Zeile {line}: {message}" for line, message in result["errors"][:20])
+            )
+        
+    def export_data(self):
+        """Exportiert die Daten"""
+        if not self.check_permission("export"):
+            messagebox.showerror("Fehler", "Keine Berechtigung zum Exportieren")
+            return
+            
+        self.show_column_selection(self.export_selected_columns, formats=EXPORT_WRITERS)
+        
+    def show_column_selection(self, callback, formats=None):
+        """Zeigt einen Dialog zur Auswahl der Export-Spalten
+
+        With formats (file extensions) the dialog also offers one checkbox per
+        format and calls callback(selected_columns, selected_formats).
+        """
+        dialog = tk.Toplevel(self.root)
+        dialog.title(self.translations[self.current_language]["export"])
+        dialog.geometry("300x400" if formats else "300x320")
+        
+        main_frame = ttk.Frame(dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        column_vars = OrderedDict()
+        for label in EXPORT_COLUMNS:
+            column_vars[label] = tk.BooleanVar(value=True)
+            ttk.Checkbutton(
+                main_frame,
+                text=label,
+                variable=column_vars[label]
+            ).pack(anchor=tk.W, pady=2)
+            
+        format_vars = OrderedDict()
+        if formats:
+            format_frame = ttk.Frame(main_frame)
+            format_frame.pack(fill=tk.X, pady=(10, 0))
+            for index, extension in enumerate(formats):
+                format_vars[extension] = tk.BooleanVar(value=index == 0)
+                ttk.Checkbutton(
+                    format_frame,
+                    text=extension[1:].upper(),
+                    variable=format_vars[extension]
+                ).pack(side=tk.LEFT, padx=(0, 10))
+            
+        def confirm():
+            selected = [label for label, var in column_vars.items() if var.get()]
+            dialog.destroy()
+            if formats:
+                callback(selected, [ext for ext, var in format_vars.items() if var.get()])
+            else:
+                callback(selected)
             
-        self.show_column_selection(self.export_selected_columns)
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ttk.Button(
+            button_frame,
+            text=self.translations[self.current_language]["ok"],
+            command=confirm
+        ).pack(side=tk.LEFT, padx=5)
         
-    def export_selected_columns(self, selected_columns):
-        """Exportiert die ausgewählten Spalten"""
+        ttk.Button(
+            button_frame,
+            text=self.translations[self.current_language]["cancel"],
+            command=dialog.destroy
+        ).pack(side=tk.LEFT, padx=5)
+        
+    def export_selected_columns(self, selected_columns, formats=(".xlsx",)):
+        """Exportiert die ausgewählten Spalten
+
+        One export job per selected format is queued; all of them read the
+        same database snapshot and run in the background (see ExportJobQueue).
+        """
         if not selected_columns:
             self.warning_var.set("Bitte mindestens eine Spalte auswählen")
             return
+        if not formats:
+            self.status_var.set("Bitte mindestens ein Format auswählen")
+            return
             
         # Dateinamen abfragen
+        file_types = {".xlsx": ("Excel", "*.xlsx"), ".pdf": ("PDF", "*.pdf"), ".csv": ("CSV", "*.csv")}
         file_path = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[
-                ("Excel", "*.xlsx"),
-                ("PDF", "*.pdf"),
-                ("CSV", "*.csv")
-            ]
+            defaultextension=formats[0],
+            filetypes=[file_types[ext] for ext in formats]
         )
         
         if not file_path:
             return
             
         try:
-            # Daten vorbereiten
-            data = []
-            for product in self.get_all_products():
-                row = {}
-                if "Barcode" in selected_columns:
-                    row["Barcode"] = product.barcode
-                if "Produktname" in selected_columns:
-                    row["Produktname"] = product.name
-                if "Kategorie" in selected_columns:
-                    row["Kategorie"] = product.category
-                if "Beschreibung" in selected_columns:
-                    row["Beschreibung"] = product.description
-                if "Preis" in selected_columns:
-                    row["Preis"] = product.price
-                if "Lagerbestand" in selected_columns:
-                    row["Lagerbestand"] = product.stock
-                if "Mindestbestand" in selected_columns:
-                    row["Mindestbestand"] = product.min_stock
-                data.append(row)
-                
-            # Export basierend auf Dateityp
-            if file_path.endswith(".xlsx"):
-                self.export_excel(data, file_path)
-            elif file_path.endswith(".pdf"):
-                self.export_pdf(data, file_path)
-            elif file_path.endswith(".csv"):
-                self.export_csv(data, file_path)
+            # Nur die gewählten Spalten werden abgefragt
+            labels = [c for c in EXPORT_COLUMNS if c in selected_columns]
+            base = os.path.splitext(file_path)[0]
+            
+            exports = []
+            for extension in formats:
+                options = {}
+                if extension == ".xlsx":
+                    options["sheet_per_category"] = messagebox.askyesno(
+                        self.translations[self.current_language]["export"],
+                        "Ein Tabellenblatt pro Kategorie anlegen?"
+                    )
+                elif extension == ".pdf":
+                    options["group_by_category"] = messagebox.askyesno(
+                        self.translations[self.current_language]["export"],
+                        "Nach Kategorie gruppieren (mit Zwischensummen)?"
+                    )
+                exports.append((base + extension, labels, options))
                 
-            self.status_var.set("Export erfolgreich")
+            jobs = self.export_jobs.submit(exports)
+            self.status_var.set(f"Export gestartet: {len(jobs)} Auftrag/Aufträge")
+            self.poll_export_jobs()
             
         except Exception as e:
             self.warning_var.set(f"Export-Fehler: {str(e)}")
             
-    def export_excel(self, data, file_path):
-        """Exportiert die Daten als Excel-Datei"""
-        df = pd.DataFrame(data)
-        writer = pd.ExcelWriter(file_path, engine="openpyxl")
-        df.to_excel(writer, index=False, sheet_name="Produkte")
-        
-        # Formatierung
-        worksheet = writer.sheets["Produkte"]
-        for idx, col in enumerate(df.columns):
-            max_length = max(
-                df[col].astype(str).apply(len).max(),
-                len(col)
+    def poll_export_jobs(self):
+        """Shows the progress of the export jobs (re-schedules itself via after)"""
+        for job in self.export_jobs.poll():
+            if job.state == "done":
+                message = f"Export erfolgreich: {os.path.basename(job.file_path)}"
+                if "pages_per_second" in job.result:
+                    message += f" ({job.result['pages']} Seiten, {job.result['pages_per_second']:.1f} Seiten/s)"
+                self.status_var.set(message)
+            elif job.state == "failed":
+                self.status_var.set(f"Export-Fehler: {os.path.basename(job.file_path)}")
+                messagebox.showerror(
+                    self.translations[self.current_language]["error"],
+                    f"Export-Fehler: {job.error}"
+                )
+            elif job.state == "cancelled":
+                self.status_var.set(f"Export abgebrochen: {os.path.basename(job.file_path)}")
+                
+        active = self.export_jobs.active_jobs()
+        if active:
+            running = [job for job in active if job.state == "running"]
+            self.export_progress["value"] = 100 * sum(job.fraction for job in active) / len(active)
+            if running:
+                self.status_var.set(
+                    f"Export: {len(running)} laufend, {len(active) - len(running)} wartend - "
+                    + ", ".join(job.describe() for job in running)
+                )
+            if not self.export_progress.winfo_ismapped():
+                self.export_cancel_button.pack(side=tk.RIGHT, padx=5)
+                self.export_progress.pack(side=tk.RIGHT, padx=5)
+        elif self.export_progress.winfo_ismapped():
+            self.export_progress.pack_forget()
+            self.export_cancel_button.pack_forget()
+            
+        if self.export_jobs_window is not None:
+            self.refresh_export_jobs_window()
+            
+        if active and not self.export_polling:
+            self.export_polling = True
+            self.root.after(200, self.poll_export_jobs_later)
+            
+    def poll_export_jobs_later(self):
+        """after-callback for poll_export_jobs; keeps a single poll loop"""
+        self.export_polling = False
+        self.poll_export_jobs()
+            
+    def show_export_jobs(self):
+        """Zeigt die Export-Aufträge mit Fortschritt an"""
+        t = self.translations[self.current_language]
+        if self.export_jobs_window is not None:
+            self.export_jobs_window.lift()
+            return
+        window = tk.Toplevel(self.root)
+        window.title(t["export_jobs"])
+        window.geometry("600x300")
+        
+        tree = ttk.Treeview(window, columns=("file", "state", "progress"), show="headings")
+        tree.heading("file", text="Datei")
+        tree.heading("state", text="Status")
+        tree.heading("progress", text="Fortschritt")
+        tree.column("state", width=100)
+        tree.column("progress", width=140)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        def cancel_selected():
+            for iid in tree.selection():
+                job = self.export_jobs.jobs.get(int(iid))
+                if job is not None:
+                    self.export_jobs.cancel(job)
+            self.poll_export_jobs()
+            
+        def close():
+            self.export_jobs_window = None
+            window.destroy()
+            
+        button_frame = ttk.Frame(window)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text=t["cancel"], command=cancel_selected).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(button_frame, text="OK", command=close).pack(side=tk.RIGHT, padx=5, pady=5)
+        window.protocol("WM_DELETE_WINDOW", close)
+        
+        self.export_jobs_window = window
+        self.export_jobs_tree = tree
+        self.refresh_export_jobs_window()
+        
+    def refresh_export_jobs_window(self):
+        """Aktualisiert die Liste im Fenster der Export-Aufträge"""
+        tree = self.export_jobs_tree
+        for job in self.export_jobs.jobs.values():
+            values = (
+                job.file_path,
+                ExportJob.STATES[job.state],
+                f"{job.fraction:.0%} ({job.rows} / {job.total})"
             )
-            worksheet.column_dimensions[chr(65 + idx)].width = max_length + 2
-            
-        writer.close()
-        
-    def export_pdf(self, data, file_path):
-        """Exportiert die Daten als PDF-Datei"""
-        doc = SimpleDocTemplate(
-            file_path,
-            pagesize=landscape(A4),
-            rightMargin=30,
-            leftMargin=30,
-            topMargin=30,
-            bottomMargin=30
-        )
+            if tree.exists(str(job.id)):
+                tree.item(str(job.id), values=values)
+            else:
+                tree.insert("", tk.END, iid=str(job.id), values=values)
+            
+    def export_excel(self, labels, file_path, sheet_per_category=False):
+        """Exportiert die gewählten Spalten als Excel-Datei (streamend)"""
+        return export_catalog_excel(file_path, labels, self.Session, sheet_per_category)
         
-        # Titel
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            "CustomTitle",
-            parent=styles["Heading1"],
-            fontSize=24,
-            spaceAfter=30
-        )
-        title = Paragraph("Produktliste", title_style)
-        
-        # Tabelle
-        table_data = [list(data[0].keys())]  # Header
-        for row in data:
-            table_data.append(list(row.values()))
-            
-        table = Table(table_data)
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("FONTSIZE", (0, 0), (-1, 0), 14),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-            ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-            ("TEXTCOLOR", (0, 1), (-1, -1), colors.black),
-            ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
-            ("FONTSIZE", (0, 1), (-1, -1), 12),
-            ("GRID", (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        # Dokument zusammenstellen
-        elements = [title, table]
-        doc.build(elements)
-        
-    def export_csv(self, data, file_path):
-        """Exportiert die Daten als CSV-Datei"""
-        df = pd.DataFrame(data)
-        df.to_csv(file_path, index=False, encoding="utf-8-sig")
+    def export_pdf(self, labels, file_path, group_by_category=False):
+        """Exportiert die gewählten Spalten als PDF-Datei (seitenweise)"""
+        return export_catalog_pdf(file_path, labels, self.Session, group_by_category)
+        
+    def export_csv(self, labels, file_path):
+        """Exportiert die gewählten Spalten als CSV-Datei (streamend)"""
+        return export_catalog_csv(file_path, labels, self.Session)
 
     def setup_language(self):
         """Initialisiert das Übersetzungssystem"""
@@ -438,7 +4457,11 @@ class AsiaStoreApp:
                 "ok": "OK",
                 "cancel": "Abbrechen",
                 "status": "Status",
-                "view": "Ansicht"
+                "view": "Ansicht",
+                "diagnostics": "Diagnose",
+                "import": "Importieren",
+                "export_jobs": "Export-Aufträge",
+                "offline_mode": "Offline-Modus"
             },
             "en": {
                 "app_title": "Asia Store Management System",
@@ -506,7 +4529,11 @@ class AsiaStoreApp:
                 "ok": "OK",
                 "cancel": "Cancel",
                 "status": "Status",
-                "view": "View"
+                "view": "View",
+                "diagnostics": "Diagnostics",
+                "import": "Import",
+                "export_jobs": "Export jobs",
+                "offline_mode": "Offline mode"
             },
             "zh": {
                 "app_title": "亚洲商店管理系统",
@@ -574,7 +4601,11 @@ class AsiaStoreApp:
                 "ok": "确定",
                 "cancel": "取消",
                 "status": "状态",
-                "view": "视图"
+                "view": "视图",
+                "diagnostics": "诊断",
+                "import": "导入",
+                "export_jobs": "导出任务",
+                "offline_mode": "离线模式"
             }
         }
         
@@ -654,129 +4685,73 @@ class AsiaStoreApp:
 
     def setup_offline_mode(self):
         """Richtet den Offline-Modus ein"""
-        # Offline-Datenbank
-        self.offline_db = sqlite3.connect("offline.db")
-        self.offline_cursor = self.offline_db.cursor()
-        
-        # Tabelle erstellen
-        self.offline_cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                category TEXT NOT NULL,
-                price REAL NOT NULL,
-                stock INTEGER NOT NULL,
-                min_stock INTEGER NOT NULL
-            )
-        """)
-        
-        # Synchronisierungs-Warteschlange
-        self.sync_queue = []
+        # Offline-Replikat mit Outbox (offline.db)
+        self.offline_replica = OfflineReplica("offline.db", self.db)
         
         # Offline-Status
         self.is_offline = False
         
     def toggle_offline_mode(self):
         """Schaltet den Offline-Modus um"""
-        self.is_offline = not self.is_offline
+        going_offline = not self.is_offline
         
-        if self.is_offline:
-            # Daten in Offline-DB synchronisieren
-            self.sync_to_offline()
+        if going_offline:
+            # Replikat auf den aktuellen Stand bringen
+            if not self.sync_to_offline():
+                self.offline_var.set(False)
+                return
+            self.is_offline = True
         else:
-            # Daten in Online-DB synchronisieren
-            self.sync_to_online()
+            # Outbox senden; schlägt das fehl, bleibt die App offline
+            if not self.sync_to_online():
+                self.offline_var.set(True)
+                return
+            self.is_offline = False
             
-        # UI aktualisieren
-        self.update_ui()
+        # Produktliste liest aus dem Replikat bzw. wieder aus der Hauptdatenbank
+        if getattr(self, "product_list", None) is not None:
+            self.product_list.Session = (
+                self.offline_replica.ReplicaSession if self.is_offline else self.Session
+            )
+        self.update_product_list()
         
     def sync_to_offline(self):
         """Synchronisiert Daten in die Offline-DB"""
         try:
-            # Produkte laden
-            self.cursor.execute("SELECT * FROM products")
-            products = self.cursor.fetchall()
-            
-            # Offline-DB leeren
-            self.offline_cursor.execute("DELETE FROM products")
-            
-            # Produkte einfügen
-            for product in products:
-                self.offline_cursor.execute("""
-                    INSERT INTO products (id, name, category, price, stock, min_stock)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, product)
-                
-            self.offline_db.commit()
+            stats = self.offline_replica.pull()
+            self.status_var.set(
+                f"Offline: {stats['pulled']} Produkte übernommen ({stats['seconds']:.1f}s)"
+            )
+            return True
             
         except Exception as e:
             messagebox.showerror(
                 self.translations[self.current_language]["error"],
                 str(e)
             )
+            return False
             
     def sync_to_online(self):
         """Synchronisiert Daten in die Online-DB"""
         try:
-            # Warteschlange verarbeiten
-            self.process_sync_queue()
-            
-            # Produkte laden
-            self.offline_cursor.execute("SELECT * FROM products")
-            products = self.offline_cursor.fetchall()
-            
-            # Online-DB leeren
-            self.cursor.execute("DELETE FROM products")
-            
-            # Produkte einfügen
-            for product in products:
-                self.cursor.execute("""
-                    INSERT INTO products (id, name, category, price, stock, min_stock)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, product)
-                
-            self.db.commit()
+            stats = self.offline_replica.sync()
+            message = (f"Synchronisiert: {stats['pushed']} gesendet, "
+                       f"{stats['pulled']} übernommen ({stats['seconds']:.1f}s)")
+            if stats["conflicts"]:
+                message += f", {stats['conflicts']} Konflikte (Online-Änderung behalten)"
+            self.status_var.set(message)
+            return True
             
         except Exception as e:
             messagebox.showerror(
                 self.translations[self.current_language]["error"],
-                str(e)
+                f"{str(e)}\n{self.offline_replica.pending()} Änderungen bleiben in der Warteschlange"
             )
+            return False
             
-    def queue_change(self, action, data):
-        """Fügt eine Änderung zur Warteschlange hinzu"""
-        self.sync_queue.append({
-            "action": action,
-            "data": data,
-            "timestamp": datetime.now()
-        })
-        
-    def process_sync_queue(self):
-        """Verarbeitet die Synchronisierungs-Warteschlange"""
-        for change in self.sync_queue:
-            try:
-                if change["action"] == "insert":
-                    self.cursor.execute("""
-                        INSERT INTO products (name, category, price, stock, min_stock)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, change["data"])
-                elif change["action"] == "update":
-                    self.cursor.execute("""
-                        UPDATE products
-                        SET name = ?, category = ?, price = ?, stock = ?, min_stock = ?
-                        WHERE id = ?
-                    """, change["data"])
-                elif change["action"] == "delete":
-                    self.cursor.execute("DELETE FROM products WHERE id = ?", (change["data"],))
-                    
-            except Exception as e:
-                messagebox.showerror(
-                    self.translations[self.current_language]["error"],
-                    str(e)
-                )
-                
-        # Warteschlange leeren
-        self.sync_queue = []
+    def queue_change(self, action, barcode, values=None):
+        """Speichert eine Offline-Änderung im Replikat und in der Outbox"""
+        self.offline_replica.record(action, barcode, values)
         
     def save_product(self):
         """Saves a product to the database"""
@@ -807,55 +4782,38 @@ class AsiaStoreApp:
                 )
                 return
                 
-            # Get or create category
-            session = self.Session()
-            category = session.query(Category).filter_by(name=category_name).first()
-            if not category:
-                category = Category(name=category_name)
-                session.add(category)
-                session.commit()
+            if getattr(self, "is_offline", False):
+                # Offline: nur bestehende Kategorien, Änderung geht in die Outbox
+                category_id = self.offline_replica.category_id(category_name)
+                if category_id is None:
+                    messagebox.showerror(
+                        self.translations[self.current_language]["error"],
+                        f"Unknown category in offline mode: {category_name}"
+                    )
+                    return
+                self.queue_change("upsert", barcode, {
+                    "name": name,
+                    "description": description,
+                    "price": price,
+                    "stock": stock,
+                    "category_id": category_id
+                })
+                self.update_product_list()
+                self.clear_fields()
+                self.status_var.set("Product saved offline")
+                return
                 
-            # Check if product exists
-            product = session.query(Product).filter_by(barcode=barcode).first()
-            old_stock = product.stock if product else 0
-            
-            if product:
-                # Update existing product
-                product.name = name
-                product.description = description
-                product.category = category
-                product.price = price
-                product.stock = stock
-                product.updated_at = datetime.now()
-            else:
-                # Create new product
-                product = Product(
-                    barcode=barcode,
-                    name=name,
-                    description=description,
-                    category=category,
-                    price=price,
-                    stock=stock
-                )
-                session.add(product)
-            
-            # Record stock change if there's a difference
-            if old_stock != stock:
-                stock_history = StockHistory(
-                    product=product,
-                    stock_level=stock,
-                    change_type='manual',
-                    notes=f'Stock changed from {old_stock} to {stock}'
-                )
-                session.add(stock_history)
-            
-            session.commit()
-            session.close()
-            
-            # Update UI
-            self.update_product_list()
+            # Kategorie und Produkt in einem Befehl der Schreib-Warteschlange; bei einem
+            # geladenen Produkt mit Versionsprüfung und Bestand als Differenz
+            loaded = self.loaded_product if self.loaded_product and self.loaded_product[0] == barcode else None
+            future = self.writer.submit(
+                save_product_record, barcode, name, description, category_name, price, stock,
+                version=loaded[2] if loaded else None,
+                loaded_stock=loaded[1] if loaded else None
+            )
+            future.add_done_callback(lambda f: self.call_in_ui(self.on_product_saved, f))
             self.clear_fields()
-            self.status_var.set("Product saved successfully")
+            self.status_var.set("Saving product...")
             
         except Exception as e:
             messagebox.showerror(
@@ -863,6 +4821,28 @@ class AsiaStoreApp:
                 f"Error saving product: {str(e)}"
             )
             
+    def on_product_saved(self, future):
+        """Reports the result of a queued save (Tk thread)"""
+        error = future.exception()
+        if isinstance(error, ProductConflict):
+            messagebox.showwarning(
+                self.translations[self.current_language]["warning"],
+                f"{str(error)}. Bitte Produkt neu laden; der Bestand wurde nicht geändert."
+            )
+            self.status_var.set("")
+            return
+        if error is not None:
+            messagebox.showerror(
+                self.translations[self.current_language]["error"],
+                f"Error saving product: {str(error)}"
+            )
+            self.status_var.set("")
+            return
+        # Liste und Charts folgen über product_events
+        if getattr(self, "product_list", None) is None:
+            self.update_product_list()
+        self.status_var.set("Product saved successfully")
+            
     def delete_product(self):
         """Löscht ein Produkt"""
         try:
@@ -875,23 +4855,21 @@ class AsiaStoreApp:
                 )
                 return
                 
-            # ID holen
+            # ID holen (im virtuellen Modus ist die Item-ID der Barcode)
             product_id = self.product_tree.item(selection[0])["values"][0]
+            if getattr(self, "product_list", None) is not None:
+                product_id = selection[0]
             
-            if self.is_offline:
-                # Aus Offline-DB löschen
-                self.offline_cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-                self.offline_db.commit()
-                
-                # Änderung in Warteschlange
-                self.queue_change("delete", product_id)
+            if getattr(self, "is_offline", False):
+                # Aus dem Replikat löschen und in die Outbox stellen
+                self.queue_change("delete", str(product_id))
+                self.update_product_list()
             else:
-                # Aus Online-DB löschen
-                self.cursor.execute("DELETE FROM products WHERE id = ?", (product_id,))
-                self.db.commit()
+                # Aus Online-DB löschen (Liste und Charts folgen über product_events)
+                future = self.writer.submit(delete_product_record, str(product_id))
+                future.add_done_callback(lambda f: self.call_in_ui(self.on_product_deleted, f))
                 
             # UI aktualisieren
-            self.update_product_list()
             self.clear_fields()
             
         except Exception as e:
@@ -900,70 +4878,126 @@ class AsiaStoreApp:
                 str(e)
             )
             
+    def on_product_deleted(self, future):
+        """Reports the result of a queued delete (Tk thread)"""
+        error = future.exception()
+        if error is not None:
+            messagebox.showerror(self.translations[self.current_language]["error"], str(error))
+            return
+        if getattr(self, "product_list", None) is None:
+            self.update_product_list()
+            
     def search_product(self):
-        """Searches for a product by barcode using the API"""
+        """Searches for a product by barcode (database, lookup cache, APIs)
+
+        The lookup runs on a worker thread; the result is applied in
+        on_lookup_done unless a newer scan has been started meanwhile.
+        """
         barcode = self.barcode_var.get()
         if not barcode:
             return
             
-        try:
-            # Try UPCitemdb API first
-            response = requests.get(
-                UPCITEMDB_ENDPOINT.format(barcode=barcode),
-                headers={"Authorization": UPCITEMDB_API_KEY}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("items"):
-                    item = data["items"][0]
-                    self.name_var.set(item.get("title", ""))
-                    self.desc_var.set(item.get("description", ""))
-                    self.price_var.set(str(item.get("price", "")))
-                    self.status_var.set(f"Product found: {item.get('title', '')}")
-                    return
-                    
-            # If UPCitemdb fails, try OpenFoodFacts
-            response = requests.get(
-                OPENFOODFACTS_ENDPOINT.format(barcode=barcode)
-            )
+        self.lookup_seq += 1
+        seq = self.lookup_seq
+        self.lookups_in_flight += 1
+        self.show_lookup_progress(barcode)
+        
+        future = self.lookup_executor.submit(resolve_barcode, barcode)
+        future.add_done_callback(
+            lambda f: self.call_in_ui(self.on_lookup_done, seq, barcode, f)
+        )
+        
+    def on_lookup_done(self, seq, barcode, future):
+        """Applies the result of an online lookup (runs on the Tk thread)"""
+        self.lookups_in_flight -= 1
+        
+        # Ergebnisse älterer Scans verwerfen
+        if seq != self.lookup_seq or self.barcode_var.get() != barcode:
+            self.show_lookup_progress()
+            return
+        self.show_lookup_progress()
             
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == 1:
-                    product = data.get("product", {})
-                    self.name_var.set(product.get("product_name", ""))
-                    self.desc_var.set(product.get("generic_name", ""))
-                    self.price_var.set("")  # OpenFoodFacts doesn't provide prices
-                    self.status_var.set(f"Product found: {product.get('product_name', '')}")
-                    return
-                    
-            # If both APIs fail, check local database
-            session = self.Session()
-            product = session.query(Product).filter_by(barcode=barcode).first()
-            if product:
-                self.name_var.set(product.name)
-                self.desc_var.set(product.description or "")
-                self.category_var.set(product.category.name if product.category else "")
-                self.price_var.set(str(product.price))
-                self.stock_var.set(str(product.stock))
-                self.status_var.set(f"Product found in database: {product.name}")
+        try:
+            result = future.result()
+            if result and result["source"] == "local":
+                self.name_var.set(result["name"])
+                self.desc_var.set(result["description"])
+                self.category_var.set(result["category"])
+                self.price_var.set(str(result["price"]))
+                self.stock_var.set(str(result["stock"]))
+                self.remember_loaded_product(barcode)
+                self.status_var.set(f"Product found in database: {result['name']}")
+            elif result:
+                self.name_var.set(result["name"])
+                self.desc_var.set(result["description"])
+                self.price_var.set(str(result["price"]))
+                self.status_var.set(f"Product found: {result['name']}")
             else:
-                self.status_var.set("Product not found. Please enter product details.")
                 self.clear_fields()
                 self.barcode_var.set(barcode)  # Keep the barcode
+                self.status_var.set("Product not found. Please enter product details.")
                 self.name_entry.focus_set()  # Focus on name field for manual entry
                 
-            session.close()
-            
         except Exception as e:
             self.status_var.set(f"Error searching product: {str(e)}")
             messagebox.showerror(
                 self.translations[self.current_language]["error"],
                 f"Error searching product: {str(e)}"
             )
+            
+    def show_lookup_progress(self, barcode=None):
+        """Shows or hides the lookup indicator in the status bar"""
+        if self.lookups_in_flight > 0:
+            if barcode:
+                self.status_var.set(f"Searching {barcode}...")
+            if not self.lookup_progress.winfo_ismapped():
+                self.lookup_progress.pack(side=tk.RIGHT, padx=5)
+                self.lookup_progress.start(10)
+        elif self.lookup_progress.winfo_ismapped():
+            self.lookup_progress.stop()
+            self.lookup_progress.pack_forget()
+            
+    def call_in_ui(self, callback, *args):
+        """Schedules callback(*args) on the Tk thread; callable from any thread"""
+        self.ui_queue.put((callback, args))
+        
+    def process_ui_queue(self):
+        """Runs callbacks queued by worker threads"""
+        try:
+            while True:
+                callback, args = self.ui_queue.get_nowait()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"Error in UI callback: {str(e)}")
+        except queue.Empty:
+            pass
+        self.root.after(50, self.process_ui_queue)
     
+    def remember_loaded_product(self, barcode):
+        """Fills the form from the stored product and notes its stock and version (see save_product)
+
+        All fields come from the same row as the version: values from the
+        barcode index or the list may be older, and saving them with a
+        newer version would silently undo another register's edit.
+        """
+        self.loaded_product = None
+        if getattr(self, "is_offline", False):
+            return
+        with self.Session() as session:
+            row = catalog_query(session, DISPLAY_COLUMNS, Product.version.label("version")).filter(
+                Product.barcode == str(barcode)
+            ).first()
+        if row:
+            self.loaded_product = (str(barcode), row.stock or 0, row.version)
+            self.name_var.set(row.name or "")
+            self.desc_var.set(row.description or "")
+            self.category_var.set(row.category or "")
+            self.price_var.set(str(row.price))
+            self.stock_var.set(str(row.stock or 0))
+            
     def clear_fields(self):
+        self.loaded_product = None
         self.barcode_var.set('')
         self.name_var.set('')
         self.desc_var.set('')
@@ -974,7 +5008,7 @@ class AsiaStoreApp:
 
     def check_permission(self, permission):
         """Überprüft die Berechtigung des Benutzers"""
-        return permission in self.user_permissions.get(self.current_user.role, [])
+        return permission in self.user_permissions.get(self.current_user["role"], [])
 
     def logout(self):
         """Führt den Logout durch"""
@@ -1080,17 +5114,14 @@ class AsiaStoreApp:
                 self.user_tree.delete(item)
                 
             # Benutzer laden
-            self.cursor.execute("SELECT * FROM users")
-            users = self.cursor.fetchall()
+            with self.db.unit_of_work() as session:
+                users = session.query(
+                    User.username, User.role, User.last_login, User.is_active
+                ).order_by(User.username).all()
             
             # Benutzer anzeigen
             for user in users:
-                self.user_tree.insert("", tk.END, values=(
-                    user[0],  # username
-                    user[2],  # role
-                    user[3],  # last_login
-                    user[4]   # active
-                ))
+                self.user_tree.insert("", tk.END, values=tuple(user))
                 
         except Exception as e:
             messagebox.showerror(
@@ -1198,34 +5229,24 @@ class AsiaStoreApp:
                     self.translations[self.current_language]["error_password_mismatch"]
                 )
                 
-            # Benutzername prüfen
-            self.cursor.execute(
-                "SELECT * FROM users WHERE username = ?",
-                (username,)
-            )
-            if self.cursor.fetchone():
-                raise ValueError(
-                    self.translations[self.current_language]["error_username_exists"]
-                )
+            with self.db.unit_of_work() as session:
+                # Benutzername prüfen
+                if session.get(User, username):
+                    raise ValueError(
+                        self.translations[self.current_language]["error_username_exists"]
+                    )
+                    
+                # Passwort hashen
+                password_hash = hashlib.sha256(password.encode()).hexdigest()
                 
-            # Passwort hashen
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
-            
-            # Benutzer speichern
-            self.cursor.execute("""
-                INSERT INTO users (
-                    username, password_hash, role, last_login, active
-                ) VALUES (?, ?, ?, ?, ?)
-            """, (
-                username,
-                password_hash,
-                role,
-                datetime.now(),
-                True
-            ))
-            
-            # Änderungen speichern
-            self.db.commit()
+                # Benutzer speichern
+                session.add(User(
+                    username=username,
+                    password_hash=password_hash,
+                    role=role,
+                    last_login=datetime.now(),
+                    is_active=True
+                ))
             
             # Dialog schließen
             dialog.destroy()
@@ -1254,11 +5275,10 @@ class AsiaStoreApp:
         item = self.user_tree.item(selected[0])
         username = item["values"][0]
         
-        self.cursor.execute(
-            "SELECT * FROM users WHERE username = ?",
-            (username,)
-        )
-        user = self.cursor.fetchone()
+        with self.db.unit_of_work() as session:
+            user = session.query(
+                User.username, User.password_hash, User.role, User.last_login, User.is_active
+            ).filter_by(username=username).first()
         
         if not user:
             return
@@ -1334,14 +5354,10 @@ class AsiaStoreApp:
         """Aktualisiert einen Benutzer"""
         try:
             # Benutzer aktualisieren
-            self.cursor.execute("""
-                UPDATE users
-                SET role = ?, active = ?
-                WHERE username = ?
-            """, (role, active, username))
-            
-            # Änderungen speichern
-            self.db.commit()
+            with self.db.unit_of_work() as session:
+                session.query(User).filter_by(username=username).update(
+                    {"role": role, "is_active": active}
+                )
             
             # Dialog schließen
             dialog.destroy()
@@ -1371,7 +5387,7 @@ class AsiaStoreApp:
         username = item["values"][0]
         
         # Eigenen Account prüfen
-        if username == self.current_user:
+        if username == self.current_user["username"]:
             messagebox.showerror(
                 self.translations[self.current_language]["error"],
                 self.translations[self.current_language]["error_cannot_delete_self"]
@@ -1387,13 +5403,8 @@ class AsiaStoreApp:
             
         try:
             # Benutzer löschen
-            self.cursor.execute(
-                "DELETE FROM users WHERE username = ?",
-                (username,)
-            )
-            
-            # Änderungen speichern
-            self.db.commit()
+            with self.db.unit_of_work() as session:
+                session.query(User).filter_by(username=username).delete()
             
             # Liste aktualisieren
             self.update_user_list()
@@ -1492,14 +5503,10 @@ class AsiaStoreApp:
             password_hash = hashlib.sha256(password.encode()).hexdigest()
             
             # Benutzer aktualisieren
-            self.cursor.execute("""
-                UPDATE users
-                SET password_hash = ?
-                WHERE username = ?
-            """, (password_hash, username))
-            
-            # Änderungen speichern
-            self.db.commit()
+            with self.db.unit_of_work() as session:
+                session.query(User).filter_by(username=username).update(
+                    {"password_hash": password_hash}
+                )
             
             # Dialog schließen
             dialog.destroy()
@@ -1515,65 +5522,75 @@ class AsiaStoreApp:
             
     def setup_backup(self):
         """Initialisiert das Backup-System"""
-        # Standardeinstellungen
-        self.backup_settings = {
-            "auto_backup": True,
-            "backup_time": "23:00",
-            "backup_dir": "backups"
-        }
-        
-        # Einstellungen laden
+        # Standardeinstellungen und settings.json
         try:
-            if os.path.exists("settings.json"):
-                with open("settings.json", "r") as f:
-                    self.backup_settings.update(json.load(f))
-                    
+            self.backup_settings = load_backup_settings()
         except Exception as e:
+            self.backup_settings = dict(BACKUP_SETTINGS)
             print(f"Fehler beim Laden der Einstellungen: {str(e)}")
             
         # Backup-Verzeichnis erstellen
         backup_dir = self.backup_settings.get("backup_dir", "backups")
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
+        self.backup_store = IncrementalBackupStore(backup_dir)
             
-        # Automatisches Backup starten
+        # Backup und weitere Aufgaben planen
+        self.scheduler = Scheduler(self.Session)
+        self.setup_scheduler()
+            
+    def start_auto_backup(self):
+        """Registriert das automatische Backup beim Zeitplaner"""
+        spec = self.backup_settings["schedules"].get("backup")
+        if not spec:
+            hour, minute = self.backup_settings.get("backup_time", "23:00").split(":")
+            spec = f"{int(minute)} {int(hour)} * * *"
+        self.scheduler.register(
+            "backup",
+            spec,
+            lambda: self.backup_store.create(retention=self.backup_settings.get("retention")),
+            jitter=60
+        )
+        
+    def setup_scheduler(self):
+        """Registriert die Hintergrundaufgaben und startet den Zeitplaner"""
+        schedules = self.backup_settings["schedules"]
         if self.backup_settings.get("auto_backup", True):
             self.start_auto_backup()
+        self.scheduler.register("maintenance", schedules["maintenance"], run_maintenance, jitter=300)
+        self.scheduler.register(
+            "low_stock_report",
+            schedules["low_stock_report"],
+            lambda: write_low_stock_report(session_factory=self.Session)
+        )
+        if pa is not None:
+            self.scheduler.register(
+                "analytics_export",
+                schedules["analytics_export"],
+                lambda: export_analytics_snapshot("analytics")["tables"]["stock_history"]["rows"],
+                jitter=300
+            )
+        self.scheduler.start()
+        
+    def create_backup(self):
+        """Erstellt ein Backup im Hintergrund"""
+        if not self.check_permission("backup"):
+            messagebox.showerror("Fehler", "Keine Berechtigung für Backups")
+            return
             
-    def start_auto_backup(self):
-        """Startet das automatische Backup"""
-        def backup_job():
-            while True:
-                try:
-                    # Backup-Zeit prüfen
-                    now = datetime.now()
-                    backup_time = datetime.strptime(
-                        self.backup_settings.get("backup_time", "23:00"),
-                        "%H:%M"
-                    ).time()
-                    
-                    if now.time() >= backup_time:
-                        # Backup erstellen
-                        backup_dir = self.backup_settings.get("backup_dir", "backups")
-                        if not os.path.exists(backup_dir):
-                            os.makedirs(backup_dir)
-                            
-                        timestamp = now.strftime("%Y%m%d_%H%M%S")
-                        backup_file = os.path.join(backup_dir, f"backup_{timestamp}.db")
-                        
-                        shutil.copy2("asia_store.db", backup_file)
-                        print(f"Automatisches Backup erstellt: {backup_file}")
-                        
-                    # Eine Stunde warten
-                    time.sleep(3600)
-                    
-                except Exception as e:
-                    print(f"Fehler beim automatischen Backup: {str(e)}")
-                    time.sleep(3600)
-                    
-        # Backup-Thread starten
-        backup_thread = threading.Thread(target=backup_job, daemon=True)
-        backup_thread.start()
+        def run():
+            try:
+                stats = self.backup_store.create(retention=self.backup_settings.get("retention"))
+                self.call_in_ui(
+                    self.status_var.set,
+                    f"Backup erstellt: Snapshot {stats['snapshot']} "
+                    f"({stats['new_chunks']} von {stats['chunks']} Blöcken neu)"
+                )
+            except Exception as e:
+                self.call_in_ui(self.status_var.set, f"Backup-Fehler: {str(e)}")
+                
+        self.status_var.set("Backup läuft...")
+        threading.Thread(target=run, daemon=True).start()
 
     def create_charts(self, parent=None):
         """Erstellt die Charts"""
@@ -1633,18 +5650,52 @@ class AsiaStoreApp:
 
     def update_charts(self):
         """Updates the charts with current data"""
-        try:
-            # Get data from database
-            products = self.session.query(Product).all()
+        self.chart_data = None
+        self.draw_charts()
+        
+    def load_chart_data(self):
+        """Loads the chart data (barcode -> name, category, price, stock)"""
+        self.chart_data = OrderedDict()
+        columns = ("barcode", "name", "category", "price", "stock")
+        with self.Session() as session:
+            for barcode, name, category, price, stock in catalog_query(session, columns):
+                self.chart_data[barcode] = (name, category or "Uncategorized", price, stock)
+            
+    def apply_chart_changes(self, changes):
+        """Applies product changes to the chart data and schedules a redraw"""
+        if getattr(self, "chart_data", None) is None:
+            return
+        for change in changes:
+            if change.action == "reload":
+                self.chart_data = None
+                break
+            if change.action == "delete":
+                self.chart_data.pop(change.barcode, None)
+            else:
+                barcode, name, description, category, price, stock = change.values
+                self.chart_data[barcode] = (name, category or "Uncategorized", price, stock)
+                
+        # Mehrere Änderungen in einem Zeichenvorgang zusammenfassen
+        if not getattr(self, "charts_redraw_pending", False):
+            self.charts_redraw_pending = True
+            self.root.after_idle(self.draw_charts)
             
-            if not products:
+    def draw_charts(self):
+        """Draws the charts from the cached chart data"""
+        self.charts_redraw_pending = False
+        try:
+            if getattr(self, "chart_data", None) is None:
+                self.load_chart_data()
+                
+            if not self.chart_data:
                 return
             
             # Prepare data
-            names = [p.name for p in products]
-            categories = [p.category.name if p.category else "Uncategorized" for p in products]
-            prices = [p.price for p in products]
-            stocks = [p.stock for p in products]
+            rows = list(self.chart_data.values())
+            names = [r[0] for r in rows]
+            categories = [r[1] for r in rows]
+            prices = [r[2] for r in rows]
+            stocks = [r[3] for r in rows]
             
             # Stock levels
             self.stock_plot.clear()
@@ -1712,9 +5763,242 @@ class AsiaStoreApp:
         # Create status bar
         self.create_status_bar()
         
+        # Create menu
+        self.create_menu()
+        
         # Initial update
         self.update_product_list()
         
+        # Einzelne Zeilen bei Änderungen aktualisieren statt alles neu zu laden
+        product_events.subscribe(self.on_product_changes)
+        
+    def create_menu(self):
+        """Creates the menu bar"""
+        t = self.translations[self.current_language]
+        menubar = tk.Menu(self.root)
+        
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label=t["import"], command=self.import_data)
+        file_menu.add_command(label=t["export"], command=self.export_data)
+        file_menu.add_command(label=t["backup"], command=self.create_backup)
+        file_menu.add_separator()
+        file_menu.add_command(label=t["exit"], command=self.root.quit)
+        menubar.add_cascade(label=t["file"], menu=file_menu)
+        
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label=t["diagnostics"], command=self.show_diagnostics, accelerator="F12")
+        tools_menu.add_command(label=t["export_jobs"], command=self.show_export_jobs)
+        tools_menu.add_command(label=t["settings"], command=self.show_settings)
+        tools_menu.add_separator()
+        self.offline_var = tk.BooleanVar(value=getattr(self, "is_offline", False))
+        tools_menu.add_checkbutton(label=t["offline_mode"], variable=self.offline_var,
+                                   command=self.toggle_offline_mode)
+        menubar.add_cascade(label=t["tools"], menu=tools_menu)
+        
+        self.root.config(menu=menubar)
+        self.root.bind("<F12>", lambda e: self.show_diagnostics())
+        
+    def collect_diagnostics(self):
+        """Returns the diagnostics report as text"""
+        lines = []
+        
+        index = barcode_index.stats()
+        lines.append("Barcode-Index")
+        lines.append(f"  Einträge: {index['size']} / {index['max_entries']}")
+        lines.append(f"  Treffer: {index['hits']}  Fehlversuche: {index['misses']}  "
+                     f"Verdrängt: {index['evictions']}  Trefferquote: {index['hit_rate']:.1%}")
+        
+        cache = lookup_cache.stats()
+        lines.append("")
+        lines.append("Lookup-Cache")
+        lines.append(f"  Treffer: {cache['hits']}  Negativ-Treffer: {cache['negative_hits']}  "
+                     f"Fehlversuche: {cache['misses']}  Trefferquote: {cache['hit_rate']:.1%}")
+        lines.append(f"  Eingesparte Wartezeit: {cache['saved_seconds']:.1f} s")
+        
+        pool = self.db.stats()
+        lines.append("")
+        lines.append("Datenbank-Pool")
+        lines.append(f"  Verbindungen geöffnet: {pool['connections']}  Ausleihen: {pool['checkouts']}  "
+                     f"Belegt: {pool['in_use']} (max. {pool['peak_in_use']})")
+        lines.append(f"  Pool: {pool['pooled']} frei / {pool['pool_size']}  Überlauf: {pool['overflow']}  "
+                     f"Profil: {pool['profile']} ({pool['profile_switches']} Wechsel)")
+        lines.append(f"  Sperrfehler: {pool['lock_errors']}  Neuversuche: {pool['lock_retries']}")
+        
+        writer = self.writer.stats()
+        lines.append("")
+        lines.append("Schreib-Warteschlange")
+        lines.append(f"  Befehle: {writer['commands']}  Fehlgeschlagen: {writer['failed']}  "
+                     f"Wartend: {writer['pending']}")
+        lines.append(f"  Commits: {writer['batches']}  Zurückgerollt: {writer['failed_batches']}  "
+                     f"Mittlere Batchgröße: {writer['mean_batch']:.1f}  Größter Batch: {writer['largest_batch']}")
+        lines.append(f"  Commit-Zeit gesamt: {writer['commit_seconds']:.2f} s  "
+                     f"Max. Wartezeit: {writer['max_latency'] * 1000:.0f} ms")
+        
+        offline = offline_barcodes.stats()
+        lines.append("")
+        lines.append("Offline-Index (OpenFoodFacts)")
+        lines.append(f"  Verfügbar: {'ja' if offline['available'] else 'nein'}  "
+                     f"Treffer: {offline['hits']}  Fehlversuche: {offline['misses']}")
+        
+        for name, provider in lookup_engine.stats().items():
+            health = provider["health"]
+            latency = provider["latency"]
+            lines.append("")
+            lines.append(f"Anbieter {name}")
+            lines.append(f"  Circuit Breaker: {health['state']}  Auslösungen: {health['trips']}  "
+                         f"Fehler in Folge: {health['consecutive_failures']}")
+            if health["state"] == "open":
+                lines.append(f"  Gesperrt für weitere {health['open_remaining']:.0f} s")
+            lines.append(f"  Timeout: {health['timeout'][0]:.2f} s / {health['timeout'][1]:.2f} s")
+            lines.append(f"  Gefunden: {provider['found']}  Nicht gefunden: {provider['not_found']}  "
+                         f"Fehler: {provider['errors']}  Abgebrochen: {provider['cancelled']}")
+            lines.append(f"  Latenz: n={latency['count']}  Mittel={latency['mean']:.3f} s  "
+                         f"p50<={latency['p50']} s  p95<={latency['p95']} s")
+        return "\n".join(lines)
+        
+    def show_diagnostics(self):
+        """Zeigt Cache- und Verbindungsstatistiken an"""
+        t = self.translations[self.current_language]
+        window = tk.Toplevel(self.root)
+        window.title(t["diagnostics"])
+        window.geometry("600x500")
+        
+        text = tk.Text(window, wrap=tk.NONE, font=("Courier", 10))
+        text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        def refresh():
+            text.configure(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, self.collect_diagnostics())
+            text.configure(state=tk.DISABLED)
+            
+        button_frame = ttk.Frame(window)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text=t["refresh"], command=refresh).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(button_frame, text="OK", command=window.destroy).pack(side=tk.RIGHT, padx=5, pady=5)
+        
+        refresh()
+        
+    def show_settings(self):
+        """Zeigt die Zeitpläne der Hintergrundaufgaben und ihren Verlauf"""
+        if not self.check_permission("settings"):
+            messagebox.showerror("Fehler", "Keine Berechtigung für Einstellungen")
+            return
+        t = self.translations[self.current_language]
+        window = tk.Toplevel(self.root)
+        window.title(t["settings"])
+        window.geometry("800x550")
+        
+        jobs_frame = ttk.LabelFrame(window, text="Zeitplan", padding=5)
+        jobs_frame.pack(fill=tk.X, padx=5, pady=5)
+        jobs_tree = ttk.Treeview(
+            jobs_frame,
+            columns=("job", "spec", "next", "last", "status", "duration"),
+            show="headings",
+            height=5
+        )
+        for column, text, width in (
+            ("job", "Aufgabe", 140), ("spec", "Zeitplan", 110), ("next", "Nächster Lauf", 140),
+            ("last", "Letzter Lauf", 140), ("status", "Status", 80), ("duration", "Dauer", 80)
+        ):
+            jobs_tree.heading(column, text=text)
+            jobs_tree.column(column, width=width)
+        jobs_tree.pack(fill=tk.X)
+        
+        spec_var = tk.StringVar()
+        edit_frame = ttk.Frame(jobs_frame)
+        edit_frame.pack(fill=tk.X, pady=(5, 0))
+        ttk.Label(edit_frame, text="Zeitplan (Minute Stunde Tag Monat Wochentag):").pack(side=tk.LEFT)
+        ttk.Entry(edit_frame, textvariable=spec_var, width=20).pack(side=tk.LEFT, padx=5)
+        
+        history_frame = ttk.LabelFrame(window, text="Verlauf", padding=5)
+        history_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        history_tree = ttk.Treeview(
+            history_frame,
+            columns=("job", "started", "status", "duration", "message"),
+            show="headings"
+        )
+        for column, text, width in (
+            ("job", "Aufgabe", 120), ("started", "Start", 140), ("status", "Status", 70),
+            ("duration", "Dauer", 70), ("message", "Meldung", 360)
+        ):
+            history_tree.heading(column, text=text)
+            history_tree.column(column, width=width)
+        history_tree.pack(fill=tk.BOTH, expand=True)
+        
+        def refresh():
+            history = self.scheduler.history()
+            last_runs = {}
+            for run in reversed(history):
+                last_runs[run.job] = run
+            jobs_tree.delete(*jobs_tree.get_children())
+            for name, job in self.scheduler.jobs.items():
+                run = last_runs.get(name)
+                jobs_tree.insert("", tk.END, iid=name, values=(
+                    name,
+                    job.spec.spec,
+                    f"{job.next_run:%Y-%m-%d %H:%M}" if job.next_run else "",
+                    f"{run.started_at:%Y-%m-%d %H:%M}" if run else "",
+                    run.status if run else "",
+                    f"{run.duration:.1f} s" if run and run.duration is not None else ""
+                ))
+            history_tree.delete(*history_tree.get_children())
+            for run in history:
+                history_tree.insert("", tk.END, values=(
+                    run.job,
+                    f"{run.started_at:%Y-%m-%d %H:%M:%S}",
+                    run.status,
+                    f"{run.duration:.1f} s" if run.duration is not None else "",
+                    run.message or ""
+                ))
+                
+        def selected_job():
+            selection = jobs_tree.selection()
+            return selection[0] if selection else None
+            
+        def on_select(event):
+            name = selected_job()
+            if name:
+                spec_var.set(self.scheduler.jobs[name].spec.spec)
+                
+        def save_spec():
+            name = selected_job()
+            if not name:
+                return
+            try:
+                self.scheduler.reschedule(name, spec_var.get().strip())
+                self.backup_settings["schedules"][name] = spec_var.get().strip()
+                save_settings(self.backup_settings)
+                refresh()
+            except Exception as e:
+                messagebox.showerror(t["error"], str(e))
+                
+        def run_now():
+            name = selected_job()
+            if name:
+                self.scheduler.run_now(name).add_done_callback(lambda f: self.call_in_ui(refresh))
+                
+        jobs_tree.bind("<<TreeviewSelect>>", on_select)
+        ttk.Button(edit_frame, text=t["save"], command=save_spec).pack(side=tk.LEFT, padx=5)
+        ttk.Button(edit_frame, text="Jetzt ausführen", command=run_now).pack(side=tk.LEFT, padx=5)
+        
+        button_frame = ttk.Frame(window)
+        button_frame.pack(fill=tk.X)
+        ttk.Button(button_frame, text=t["refresh"], command=refresh).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Button(button_frame, text="OK", command=window.destroy).pack(side=tk.RIGHT, padx=5, pady=5)
+        
+        refresh()
+        
+    def on_product_changes(self, changes):
+        """Applies committed product changes to the list and the charts"""
+        if threading.current_thread() is not threading.main_thread():
+            self.call_in_ui(self.on_product_changes, changes)
+            return
+        if getattr(self, "product_list", None) is not None:
+            self.product_list.apply_changes(changes)
+        if hasattr(self, "stock_plot"):
+            self.apply_chart_changes(changes)
+        
     def create_product_details(self, parent):
         """Creates a modern product details section focused on barcode scanning"""
         # Main frame with modern styling
@@ -1757,12 +6041,12 @@ class AsiaStoreApp:
         ).pack(anchor=tk.W)
         
         self.name_var = tk.StringVar()
-        name_entry = ttk.Entry(
+        self.name_entry = ttk.Entry(
             info_frame,
             textvariable=self.name_var,
             font=("Helvetica", 12)
         )
-        name_entry.pack(fill=tk.X, pady=(5, 10))
+        self.name_entry.pack(fill=tk.X, pady=(5, 10))
         
         # Description
         ttk.Label(
@@ -1851,8 +6135,12 @@ class AsiaStoreApp:
         # Set focus to barcode entry
         barcode_entry.focus_set()
         
-    def create_product_list(self, parent):
-        """Creates a modern product list section"""
+    def create_product_list(self, parent, virtual=True):
+        """Creates a modern product list section
+
+        In virtual mode only the visible rows are loaded from the database,
+        see VirtualProductList.
+        """
         # Frame with modern styling
         list_frame = ttk.LabelFrame(
             parent,
@@ -1897,6 +6185,16 @@ class AsiaStoreApp:
         self.product_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
+        # Virtual list mode: rows are loaded page by page while scrolling
+        self.product_list = None
+        if virtual:
+            self.product_list = VirtualProductList(self.product_tree, scrollbar, self.Session)
+            for column in columns:
+                self.product_tree.heading(
+                    column,
+                    command=lambda c=column: self.product_list.sort_by(c)
+                )
+        
         # Bind double-click event
         self.product_tree.bind('<Double-1>', self.on_product_select)
         
@@ -1912,15 +6210,30 @@ class AsiaStoreApp:
             self.category_var.set(values[3])
             self.price_var.set(values[4])
             self.stock_var.set(values[5])
+            self.remember_loaded_product(values[0])
             
             # Show stock history diagram
             self.show_stock_history(values[0])
 
     def create_status_bar(self):
         """Creates a status bar at the bottom of the main window."""
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        
         self.status_var = tk.StringVar(value=self.translations[self.current_language]["status"])
-        self.status_label = ttk.Label(self.root, textvariable=self.status_var, anchor="w")
-        self.status_label.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_label = ttk.Label(status_frame, textvariable=self.status_var, anchor="w")
+        self.status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # Anzeige für laufende Barcode-Abfragen
+        self.lookup_progress = ttk.Progressbar(status_frame, mode="indeterminate", length=100)
+        
+        # Fortschritt und Abbruch der Export-Aufträge
+        self.export_progress = ttk.Progressbar(status_frame, mode="determinate", length=150, maximum=100)
+        self.export_cancel_button = ttk.Button(
+            status_frame,
+            text=self.translations[self.current_language]["cancel"],
+            command=lambda: (self.export_jobs.cancel_all(), self.poll_export_jobs())
+        )
 
     def get_categories(self):
         """Returns a list of category names from the database"""
@@ -2013,6 +6326,163 @@ class AsiaStoreApp:
                 session.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asia Store Management System")
+    parser.add_argument(
+        "--import-off",
+        metavar="FILE",
+        help="OpenFoodFacts-Export (CSV/JSONL, optional .gz) in den Offline-Index importieren"
+    )
+    parser.add_argument(
+        "--export-analytics",
+        metavar="DIR",
+        help="Arrow-Snapshot von Produkten, Kategorien und Bestandshistorie schreiben"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="mit --export-analytics: Bestandshistorie komplett neu schreiben"
+    )
+    parser.add_argument(
+        "--backup",
+        metavar="FILE",
+        help="Konsistentes Backup der Datenbank erstellen"
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="Inkrementellen Snapshot im Backup-Verzeichnis erstellen"
+    )
+    parser.add_argument(
+        "--list-snapshots",
+        action="store_true",
+        help="Snapshots im Backup-Verzeichnis auflisten"
+    )
+    parser.add_argument(
+        "--restore",
+        metavar="SNAPSHOT",
+        help="Snapshot (ID oder 'latest') nach asia_store.db wiederherstellen"
+    )
+    parser.add_argument(
+        "--restore-at",
+        metavar="ZEIT",
+        help="Stand zu einem Zeitpunkt wiederherstellen, z.B. '2024-05-15 14:30'"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="mit --restore-at: nur die Unterschiede zum aktuellen Stand anzeigen"
+    )
+    parser.add_argument(
+        "--restore-to",
+        metavar="FILE",
+        default="asia_store.db",
+        help="mit --restore/--restore-at: Zieldatei (Standard: asia_store.db)"
+    )
+    parser.add_argument(
+        "--import-products",
+        metavar="FILE",
+        help="Produkte aus einer CSV- oder XLSX-Datei importieren"
+    )
+    parser.add_argument(
+        "--schema-version",
+        action="store_true",
+        help="Angewendete Schema-Migrationen anzeigen"
+    )
+    args = parser.parse_args()
+    
+    # Erstelle die Datenbank-Tabellen und ziehe das Schema nach
+    for migration, seconds in setup_store_database():
+        print(f"Migration {migration.version} ({migration.name}): {seconds:.2f} s")
+        
+    if args.schema_version:
+        with db.connect() as conn:
+            done = applied_migrations(conn)
+        for migration in MIGRATIONS:
+            if migration.version in done:
+                name, applied_at, seconds = done[migration.version]
+                print(f"{migration.version:3}  {applied_at}  {seconds:6.2f} s  {name}")
+            else:
+                print(f"{migration.version:3}  ausstehend  {migration.name}")
+        sys.exit(0)
+    
+    if args.import_products:
+        result = import_products(
+            args.import_products,
+            progress=lambda rows, seconds: print(f"{rows} Zeilen verarbeitet ({rows / seconds:.0f}/s)")
+        )
+        print(
+            f"{result['inserted']} neu, {result['updated']} aktualisiert, "
+            f"{result['invalid']} ungültig in {result['seconds']:.1f} s "
+            f"({result['rows_per_second']:.0f} Zeilen/s)"
+        )
+        for line, message in result["errors"]:
+            print(f"  Zeile {line}: {message}")
+        sys.exit(0)
+    
+    if args.backup:
+        backup_database(args.backup)
+        sys.exit(0)
+    
+    if args.restore_at:
+        settings = load_backup_settings()
+        store = IncrementalBackupStore(settings["backup_dir"])
+        engine.dispose()  # Datei freigeben, bevor sie ersetzt wird
+        result = restore_point_in_time(
+            datetime.fromisoformat(args.restore_at), store, args.restore_to, dry_run=args.dry_run
+        )
+        print(
+            f"Snapshot {result['snapshot']} + {result['replayed_products']} Produktänderungen, "
+            f"{result['replayed_history']} Bestandseinträge in {result['seconds']:.2f} s "
+            f"(Nachspielen {result['replay_seconds']:.2f} s)"
+        )
+        diff = result["diff"]
+        if diff:
+            print(f"Würde wiederherstellen: {len(diff['added'])}, entfernen: {len(diff['removed'])}, "
+                  f"ändern: {len(diff['changed'])} Produkte; {diff['history_dropped']} "
+                  f"spätere Bestandseinträge entfallen")
+            for barcode in diff["added"][:20]:
+                print(f"  + {barcode}")
+            for barcode in diff["removed"][:20]:
+                print(f"  - {barcode}")
+            for barcode, changes in diff["changed"][:20]:
+                print(f"  ~ {barcode}: " + ", ".join(f"{c}: {a} -> {b}" for c, (a, b) in changes.items()))
+        sys.exit(0)
+    
+    if args.snapshot or args.list_snapshots or args.restore:
+        settings = load_backup_settings()
+        store = IncrementalBackupStore(settings["backup_dir"])
+        if args.snapshot:
+            store.create(retention=settings["retention"])
+        elif args.list_snapshots:
+            for manifest in store.snapshots():
+                print(f"{manifest['id']}  {manifest['created_at']}  {manifest['size'] / 1024 / 1024:.1f} MB")
+        else:
+            engine.dispose()  # Datei freigeben, bevor sie ersetzt wird
+            manifest = store.restore(args.restore, args.restore_to)
+            print(f"Snapshot {manifest['id']} nach {args.restore_to} wiederhergestellt")
+        sys.exit(0)
+    
+    if args.export_analytics:
+        result = export_analytics_snapshot(args.export_analytics, full=args.full)
+        tables = result["tables"]
+        print(
+            f"{tables['products']['rows']} Produkte, {tables['categories']['rows']} Kategorien, "
+            f"{result['appended_history_rows']} neue Historienzeilen "
+            f"({tables['stock_history']['rows']} gesamt) in {result['seconds']:.1f} s"
+        )
+        sys.exit(0)
+    
+    if args.import_off:
+        result = import_openfoodfacts_dump(
+            args.import_off,
+            progress=lambda rows, seconds: print(f"{rows} Zeilen importiert ({rows / seconds:.0f}/s)")
+        )
+        print(
+            f"{result['imported']} von {result['read']} Zeilen importiert in "
+            f"{result['seconds']:.1f} s ({result['rows_per_second']:.0f} Zeilen/s)"
+        )
+        sys.exit(0)
+    
     root = tb.Window(themename="flatly")
     app = AsiaStoreApp(root)
     root.mainloop() 
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""CSV export at catalog scale: streaming exporter vs. the old list+pandas path.
+
+Fills a scratch catalog (1M products by default), then runs each export
+in its own process so that peak RSS is measured per exporter, and checks
+that both files are byte-identical.
+
+    python benchmarks/bench_csv_export.py --products 1000000
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import time
+
+from common import argument_parser, fill_catalog, peak_rss_mb, print_table, scratch_app
+
+def export_pandas(app, file_path, labels):
+    """The previous export path: every catalog row as a dict in one list, then DataFrame.to_csv"""
+    import pandas as pd
+    columns = [app.EXPORT_COLUMNS[label] for label in labels]
+    with app.Session() as session:
+        data = [dict(zip(labels, row)) for row in app.iter_catalog(session, columns)]
+    pd.DataFrame(data).to_csv(file_path, index=False, encoding="utf-8-sig")
+    return len(data)
+
+def run_export(app, workdir, mode):
+    labels = list(app.EXPORT_COLUMNS)
+    file_path = os.path.join(workdir, f"export_{mode}.csv")
+    started = time.perf_counter()
+    if mode == "pandas":
+        rows = export_pandas(app, file_path, labels)
+    else:
+        rows = app.export_catalog_csv(file_path, labels)
+    seconds = time.perf_counter() - started
+    with open(file_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    print(f"RESULT {mode} {rows} {seconds:.2f} {peak_rss_mb() or 0:.0f} {digest}")
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--mode", choices=["pandas", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    with scratch_app(args.workdir) as (app, workdir):
+        if args.mode:
+            run_export(app, workdir, args.mode)
+            return
+            
+        app.setup_store_database()
+        started = time.perf_counter()
+        fill_catalog(app.db, args.products)
+        print(f"{args.products} Produkte angelegt ({time.perf_counter() - started:.1f} s)")
+        app.db.dispose()
+        
+        results = []
+        for mode in ("pandas", "stream"):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--workdir", workdir, "--mode", mode],
+                capture_output=True, text=True, check=True
+            ).stdout
+            line = next(line for line in output.splitlines() if line.startswith("RESULT "))
+            results.append(line.split()[1:])
+        print_table(["Exporter", "Zeilen", "Sekunden", "Spitzen-RSS MB", "SHA-256"],
+                    [[mode, rows, seconds, rss, digest[:16]] for mode, rows, seconds, rss, digest in results])
+        print("Dateien identisch" if results[0][4] == results[1][4] else "DATEIEN UNTERSCHIEDLICH")
+
+if __name__ == "__main__":
+    main()
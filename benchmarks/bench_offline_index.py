@@ -0,0 +1,60 @@
+"""Import and lookup benchmark for the offline OpenFoodFacts index.
+
+Writes a synthetic gzipped tab-separated dump, imports it with
+import_openfoodfacts_dump and then times random OfflineBarcodeIndex.get
+calls, half of them for barcodes the dump does not contain.
+
+    python benchmarks/bench_offline_index.py --rows 2000000 --lookups 100000
+"""
+import gzip
+import os
+import random
+import time
+
+from common import argument_parser, peak_rss_mb, percentile, print_table, scratch_app
+
+def write_dump(path, rows):
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as f:
+        f.write("code\turl\tproduct_name\tgeneric_name\tbrands\n")
+        for i in range(rows):
+            f.write(f"{4000000000000 + i * 7}\thttps://example.org/{i}\tProdukt {i}\tWare {i % 97}\tMarke {i % 13}\n")
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+    
+    with scratch_app(args.workdir) as (app, workdir):
+        dump = os.path.join(workdir, "off_dump.csv.gz")
+        started = time.perf_counter()
+        write_dump(dump, args.rows)
+        print(f"Dump mit {args.rows} Zeilen erzeugt ({os.path.getsize(dump) / 1e6:.0f} MB, "
+              f"{time.perf_counter() - started:.1f} s)")
+        rss_before = peak_rss_mb()
+        
+        db_path = os.path.join(workdir, "openfoodfacts.db")
+        result = app.import_openfoodfacts_dump(dump, db_path=db_path)
+        print(f"Import: {result['imported']} Zeilen in {result['seconds']:.1f} s "
+              f"({result['rows_per_second']:.0f} Zeilen/s)")
+        if rss_before is not None:
+            print(f"Spitzen-RSS: {rss_before:.0f} MB vor dem Import, {peak_rss_mb():.0f} MB danach")
+            
+        index = app.OfflineBarcodeIndex(db_path)
+        rng = random.Random(42)
+        codes = [str(4000000000000 + rng.randrange(args.rows) * 7 + rng.randrange(2))
+                 for _ in range(args.lookups)]
+        samples = []
+        for code in codes:
+            started = time.perf_counter()
+            index.get(code)
+            samples.append((time.perf_counter() - started) * 1e6)
+        stats = index.stats()
+        print_table(
+            ["Lookups", "Treffer", "mean µs", "p50 µs", "p99 µs"],
+            [[len(samples), stats["hits"], f"{sum(samples) / len(samples):.1f}",
+              f"{percentile(samples, 50):.1f}", f"{percentile(samples, 99):.1f}"]]
+        )
+
+if __name__ == "__main__":
+    main()
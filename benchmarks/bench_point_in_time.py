@@ -0,0 +1,94 @@
+"""Point-in-time restore on a synthetic history.
+
+Fills a scratch catalog, takes an incremental snapshot, then writes a
+synthetic product_changes log (updates, some deletes and new products) and
+stock_history rows dated after the snapshot. restore_point_in_time is run
+for several target times, so each run replays a growing part of the log.
+Rebuilding the snapshot costs about the same every time; the replay is the
+part that should grow with the number of changes.
+
+    python benchmarks/bench_point_in_time.py --products 1000000 --changes 110000 --history 1100000
+"""
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import argument_parser, fill_catalog, open_database, print_table, scratch_app
+
+def write_log(conn, products, changes, history, start, span):
+    """Spreads changes and history rows evenly over [start, start + span)"""
+    rng = random.Random(7)
+    fmt = "%Y-%m-%d %H:%M:%S.%f"
+    
+    def log_rows():
+        for i in range(changes):
+            moment = (start + span * i / changes).strftime(fmt)
+            roll = rng.random()
+            if roll < 0.01:
+                yield (f"P{rng.randrange(products):07d}", "delete", moment, None, None, None, None, None)
+            elif roll < 0.02:
+                yield (f"N{i:07d}", "insert", moment, f"Neu {i}", "", 2.5, 10, 1)
+            else:
+                barcode = f"P{rng.randrange(products):07d}"
+                yield (barcode, "update", moment, f"Geändert {i}", "", 1.0 + i % 90, rng.randrange(200), 1)
+                
+    conn.executemany(
+        "INSERT INTO product_changes (barcode, action, changed_at, name, description, price, stock, "
+        "category_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (row + (row[2], row[2]) for row in log_rows())
+    )
+    conn.executemany(
+        "INSERT INTO stock_history (product_barcode, stock_level, timestamp, change_type) VALUES (?, ?, ?, 'sale')",
+        (
+            (f"P{rng.randrange(products):07d}", rng.randrange(200), (start + span * i / history).strftime(fmt))
+            for i in range(history)
+        )
+    )
+    conn.commit()
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--changes", type=int, default=110000)
+    parser.add_argument("--history", type=int, default=1100000)
+    parser.add_argument("--points", default="0.01,0.1,1.0",
+                        help="Anteile des Protokolls, bis zu denen wiederhergestellt wird")
+    args = parser.parse_args()
+    
+    with scratch_app(args.workdir) as (app, workdir):
+        db_path = os.path.join(workdir, "store.db")
+        database = open_database(app, db_path)
+        started = time.perf_counter()
+        fill_catalog(database, args.products)
+        database.dispose()
+        print(f"{args.products} Produkte angelegt ({os.path.getsize(db_path) / 1e6:.0f} MB, "
+              f"{time.perf_counter() - started:.1f} s)")
+        
+        store = app.IncrementalBackupStore(os.path.join(workdir, "backups"))
+        snapshot = store.create(db_path)
+        print(f"Snapshot in {snapshot['seconds']:.1f} s")
+        
+        start = datetime.now() + timedelta(minutes=1)
+        span = timedelta(hours=1)
+        database = open_database(app, db_path)
+        with database.connect() as conn:
+            started = time.perf_counter()
+            write_log(conn, args.products, args.changes, args.history, start, span)
+        database.dispose()
+        print(f"{args.changes} Änderungen und {args.history} Bestandseinträge protokolliert "
+              f"({time.perf_counter() - started:.1f} s)")
+        
+        target = os.path.join(workdir, "restored.db")
+        rows = []
+        for point in (float(p) for p in args.points.split(",")):
+            for path in (target, target + ".vor_restore"):
+                if os.path.exists(path):
+                    os.remove(path)
+            result = app.restore_point_in_time(start + span * point, store, target, log_db=db_path)
+            rows.append([f"{point:g}", result["replayed_products"], result["replayed_history"],
+                         f"{result['snapshot_seconds']:.2f}", f"{result['replay_seconds']:.2f}"])
+        print_table(["Anteil", "Produkte", "Historie", "Snapshot s", "Nachspielen s"], rows)
+
+if __name__ == "__main__":
+    main()
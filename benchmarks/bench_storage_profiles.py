@@ -0,0 +1,136 @@
+"""Per-profile benchmark of the SQLite storage profiles.
+
+Runs the same workloads against a fresh copy of a scratch catalog for
+SQLite's defaults (rollback journal, synchronous=FULL, 5 s timeout) and
+for every entry of STORAGE_PROFILES:
+
+- many small commits (one UPDATE per transaction, like the register)
+- one large insert transaction (like an import batch)
+- random primary key lookups
+- small write commits while three readers scan the catalog
+
+    python benchmarks/bench_storage_profiles.py --products 220000
+"""
+import os
+import random
+import shutil
+import sqlite3
+import threading
+import time
+
+from common import argument_parser, fill_catalog, open_database, print_table, scratch_app
+
+def connect(app, path, profile):
+    if profile == "default":
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = DELETE")
+    else:
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        app.apply_storage_profile(conn, profile)
+    return conn
+
+def small_commits(conn, products, count):
+    started = time.perf_counter()
+    for i in range(count):
+        conn.execute("BEGIN")
+        conn.execute("UPDATE products SET stock = stock - 1 WHERE barcode = ?", (f"P{i * 7 % products:07d}",))
+        conn.execute("COMMIT")
+    return time.perf_counter() - started
+
+def bulk_insert(conn, count):
+    started = time.perf_counter()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO stock_history (product_barcode, stock_level, timestamp, change_type) "
+        "VALUES (?, ?, '2024-05-15 10:00:00.000000', 'import')",
+        ((f"P{i:07d}", i % 100) for i in range(count))
+    )
+    conn.execute("COMMIT")
+    return time.perf_counter() - started
+
+def lookups(conn, products, count):
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(count):
+        conn.execute("SELECT name, price, stock FROM products WHERE barcode = ?",
+                     (f"P{rng.randrange(products):07d}",)).fetchone()
+    return time.perf_counter() - started
+
+def writes_with_readers(app, path, profile, products, writes, readers=3):
+    """Returns (seconds, worst write latency, lock errors)"""
+    stop = threading.Event()
+    errors = [0]
+    lock = threading.Lock()
+    
+    def read():
+        conn = connect(app, path, profile)
+        while not stop.is_set():
+            try:
+                conn.execute("SELECT COUNT(*), SUM(price), MAX(stock) FROM products").fetchone()
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+        conn.close()
+        
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    conn = connect(app, path, profile)
+    worst = 0.0
+    started = time.perf_counter()
+    for i in range(writes):
+        began = time.perf_counter()
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("UPDATE products SET stock = stock + 1 WHERE barcode = ?", (f"P{i % products:07d}",))
+                conn.execute("COMMIT")
+                break
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+        worst = max(worst, time.perf_counter() - began)
+    seconds = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    conn.close()
+    return seconds, worst, errors[0]
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=220000)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--inserts", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--writes", type=int, default=300)
+    args = parser.parse_args()
+    
+    with scratch_app(args.workdir) as (app, workdir):
+        base = os.path.join(workdir, "base.db")
+        database = open_database(app, base)
+        fill_catalog(database, args.products)
+        database.dispose()
+        
+        rows = []
+        for profile in ["default"] + list(app.STORAGE_PROFILES):
+            path = os.path.join(workdir, f"{profile}.db")
+            shutil.copyfile(base, path)
+            conn = connect(app, path, profile)
+            commits = small_commits(conn, args.products, args.commits)
+            inserts = bulk_insert(conn, args.inserts)
+            reads = lookups(conn, args.products, args.lookups)
+            conn.close()
+            seconds, worst, errors = writes_with_readers(app, path, profile, args.products, args.writes)
+            rows.append([profile, f"{commits:.2f}", f"{inserts:.2f}", f"{reads:.2f}",
+                         f"{seconds:.2f}", f"{worst * 1000:.0f}", errors])
+        print_table([
+            "Profil", f"{args.commits} Commits s", f"{args.inserts} Inserts s", f"{args.lookups} Lookups s",
+            f"{args.writes} Writes s", "schlechtester ms", "Sperrfehler"
+        ], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Throughput of the group-commit WriteQueue against its batch size.
+
+Every run saves products with save_product_record on a fresh copy of a
+scratch catalog:
+
+- directly, one session and commit per save (the path before WriteQueue)
+- through WriteQueue with max_batch 1, 2, 4, ... 256, all saves submitted
+  at once (a burst, e.g. an import or a fast scanner)
+- through WriteQueue with 1, 4 and 16 clients that each wait for their
+  save before submitting the next one (several registers)
+
+    python benchmarks/bench_write_queue.py --products 220000 --saves 3000
+"""
+import os
+import shutil
+import threading
+import time
+
+from common import argument_parser, fill_catalog, open_database, percentile, print_table, scratch_app
+
+def save_args(i, products):
+    return (f"P{i * 7 % products:07d}", f"Produkt {i}", "", "Nudeln", 1.0 + i % 100, 100 + i % 7)
+
+def direct(app, database, saves, products):
+    latencies = []
+    started = time.perf_counter()
+    for i in range(saves):
+        began = time.perf_counter()
+        with database.Session() as session:
+            app.save_product_record(session, *save_args(i, products))
+            session.commit()
+        latencies.append(time.perf_counter() - began)
+    return time.perf_counter() - started, latencies, None
+
+def burst(app, database, saves, products, max_batch, window):
+    writer = app.WriteQueue(database.Session, window=window, max_batch=max_batch)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(saves):
+        submitted = time.perf_counter()
+        future = writer.submit(app.save_product_record, *save_args(i, products))
+        future.add_done_callback(lambda f, submitted=submitted: latencies.append(time.perf_counter() - submitted))
+    writer.stop(timeout=None)
+    seconds = time.perf_counter() - started
+    return seconds, latencies, writer.stats()
+
+def clients(app, database, saves, products, count, window):
+    writer = app.WriteQueue(database.Session, window=window)
+    latencies = []
+    lock = threading.Lock()
+    
+    def client(offset):
+        for i in range(offset, saves, count):
+            submitted = time.perf_counter()
+            writer.submit(app.save_product_record, *save_args(i, products)).result()
+            with lock:
+                latencies.append(time.perf_counter() - submitted)
+                
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+    writer.stop()
+    return seconds, latencies, writer.stats()
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=220000)
+    parser.add_argument("--saves", type=int, default=3000)
+    parser.add_argument("--window", type=float, default=0.005, help="Sammelfenster in Sekunden")
+    parser.add_argument("--profile", default="register", help="Speicherprofil der Datenbank")
+    args = parser.parse_args()
+    
+    with scratch_app(args.workdir) as (app, workdir):
+        base = os.path.join(workdir, "base.db")
+        database = open_database(app, base)
+        fill_catalog(database, args.products)
+        database.dispose()
+        
+        runs = [("direkt", lambda db: direct(app, db, args.saves, args.products))]
+        size = 1
+        while size <= 256:
+            runs.append((f"Burst, max_batch {size}",
+                         lambda db, size=size: burst(app, db, args.saves, args.products, size, args.window)))
+            size *= 2
+        for count in (1, 4, 16):
+            runs.append((f"{count} wartende Clients",
+                         lambda db, count=count: clients(app, db, args.saves, args.products, count, args.window)))
+            
+        rows = []
+        for label, run in runs:
+            path = os.path.join(workdir, "run.db")
+            shutil.copyfile(base, path)
+            database = open_database(app, path, profile=args.profile)
+            seconds, latencies, stats = run(database)
+            database.dispose()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            rows.append([
+                label, f"{args.saves / seconds:.0f}",
+                f"{percentile(latencies, 50) * 1000:.1f}", f"{percentile(latencies, 99) * 1000:.1f}",
+                stats["batches"] if stats else args.saves,
+                f"{stats['mean_batch']:.1f}" if stats else "1.0",
+                stats["failed"] if stats else 0,
+            ])
+        print_table(["Lauf", "Saves/s", "p50 ms", "p99 ms", "Commits", "Mittlere Batchgröße", "Fehler"], rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Shared setup for the benchmark scripts.
+
+Every benchmark imports the app inside a scratch directory (see
+tests/helpers.py), so it never touches the asia_store.db next to the app.
+Pass --workdir to keep the generated files for inspection.
+"""
+import argparse
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+from helpers import fill_catalog, load_app, open_database  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def argument_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--workdir", help="Arbeitsverzeichnis behalten statt eines temporären")
+    return parser
+
+@contextmanager
+def scratch_app(workdir=None):
+    """Yields (app, workdir) with the app imported inside workdir"""
+    previous = os.getcwd()
+    if workdir:
+        os.makedirs(workdir, exist_ok=True)
+        yield load_app(os.path.abspath(workdir)), os.path.abspath(workdir)
+        os.chdir(previous)
+        return
+    with tempfile.TemporaryDirectory(prefix="asia_store_bench_") as path:
+        try:
+            app = load_app(path)
+            yield app, path
+        finally:
+            if "asia_store" in sys.modules:
+                sys.modules["asia_store"].db.dispose()
+            os.chdir(previous)
+
+def percentile(samples, p):
+    """p-th percentile of a list of numbers (nearest rank)"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * p / 100.0)) - 1))]
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def print_table(headers, rows):
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max(len(str(h)), *(len(row[i]) for row in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(cell.rjust(w) for cell, w in zip(row, widths)))
+
+__all__ = ["argument_parser", "scratch_app", "percentile", "peak_rss_mb", "print_table",
+           "fill_catalog", "open_database"]
@@ -0,0 +1,127 @@
+"""EXPLAIN QUERY PLAN and timings of the catalog queries, before and after the indexes of migrations 1-3.
+
+Builds a scratch catalog with stock history, copies it, and drops the
+three indexes in the copy ("before"). The app's own queries are captured
+as SQL through SQLAlchemy and then explained and timed on both files.
+Finally migrations 1-3 are applied to the copy again to time the index builds.
+
+    python benchmarks/explain_catalog_queries.py --products 1000000 --history 1100000
+"""
+import os
+import shutil
+import sqlite3
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, event, func, or_
+
+from common import argument_parser, fill_catalog, open_database, scratch_app
+
+INDEXES = ("ix_stock_history_product_timestamp", "ix_products_category_id", "ix_products_name")
+
+def fill_history(database, products, rows):
+    start = datetime.now() - timedelta(days=30)
+    with database.connect() as conn:
+        conn.executemany(
+            "INSERT INTO stock_history (product_barcode, stock_level, timestamp, change_type) VALUES (?, ?, ?, 'sale')",
+            (
+                (f"P{i * 7919 % products:07d}", i % 100,
+                 (start + timedelta(seconds=i * 30 * 86400 // rows)).strftime("%Y-%m-%d %H:%M:%S.%f"))
+                for i in range(rows)
+            )
+        )
+        conn.commit()
+
+def capture_queries(app, database, products):
+    """Runs the app's queries once and returns [(label, sql, parameters)]"""
+    Product, StockHistory = app.Product, app.StockHistory
+    captured = []
+    
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+        
+    barcode = f"P{products // 2:07d}"
+    queries = [
+        ("stock history", lambda s: s.query(StockHistory).filter(
+            StockHistory.product_barcode == barcode,
+            StockHistory.timestamp >= datetime.now() - timedelta(days=7)
+        ).order_by(StockHistory.timestamp).all()),
+        ("category count", lambda s: s.query(func.count(Product.barcode)).filter(
+            Product.category_id == 2).scalar()),
+        ("category page", lambda s: app.catalog_query(s).filter(
+            Product.category_id == 2, Product.barcode > barcode
+        ).order_by(Product.barcode).limit(200).all()),
+        ("list page by name", lambda s: app.catalog_query(s, app.DISPLAY_COLUMNS, app.PRODUCT_NAME_KEY).filter(
+            app.PRODUCT_NAME_KEY >= f"Produkt {products // 2}",
+            or_(app.PRODUCT_NAME_KEY > f"Produkt {products // 2}",
+                and_(app.PRODUCT_NAME_KEY == f"Produkt {products // 2}", Product.barcode > barcode))
+        ).order_by(app.PRODUCT_NAME_KEY, Product.barcode).limit(200).all()),
+    ]
+    result = []
+    event.listen(database.engine, "before_cursor_execute", before_execute)
+    try:
+        for label, run in queries:
+            with database.Session() as session:
+                captured.clear()
+                run(session)
+                result.append((label,) + captured[-1])
+    finally:
+        event.remove(database.engine, "before_cursor_execute", before_execute)
+    return result
+
+def explain(path, sql, parameters, repeat=5):
+    conn = sqlite3.connect(path)
+    try:
+        plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, parameters)]
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, parameters).fetchall()
+            times.append((time.perf_counter() - started) * 1000)
+    finally:
+        conn.close()
+    return plan, statistics.median(times)
+
+def main():
+    parser = argument_parser(__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--history", type=int, default=1100000)
+    args = parser.parse_args()
+    
+    with scratch_app(args.workdir) as (app, workdir):
+        after = os.path.join(workdir, "after.db")
+        before = os.path.join(workdir, "before.db")
+        database = open_database(app, after)
+        fill_catalog(database, args.products, categories=[f"Kategorie {i}" for i in range(1, 21)])
+        fill_history(database, args.products, args.history)
+        with database.connect() as conn:
+            conn.execute("ANALYZE")
+            conn.commit()
+        queries = capture_queries(app, database, args.products)
+        database.dispose()
+        
+        shutil.copyfile(after, before)
+        conn = sqlite3.connect(before)
+        for name in INDEXES:
+            conn.execute(f"DROP INDEX {name}")
+        conn.execute("DELETE FROM schema_version WHERE version IN (1, 2, 3)")
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+        
+        for label, sql, parameters in queries:
+            print(f"== {label}")
+            print("   " + " ".join(sql.split()))
+            for name, path in (("vorher", before), ("nachher", after)):
+                plan, ms = explain(path, sql, parameters)
+                print(f"   {name:8} {ms:9.2f} ms  " + " | ".join(plan))
+                
+        print("== Migrationen 1-3 auf der Kopie")
+        database = app.Database(f"sqlite:///{before}")
+        for migration, seconds in app.migrate(database):
+            print(f"   {migration.version}  {seconds:7.2f} s  {migration.name}")
+        database.dispose()
+
+if __name__ == "__main__":
+    main()
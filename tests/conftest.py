@@ -0,0 +1,15 @@
+import pytest
+
+from helpers import load_app, open_database
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """The app module, imported inside a scratch directory"""
+    return load_app(tmp_path_factory.mktemp("store"))
+
+@pytest.fixture
+def database(app, tmp_path):
+    """A fresh, migrated store database for one test"""
+    database = open_database(app, tmp_path / "store.db")
+    yield database
+    database.dispose()
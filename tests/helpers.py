@@ -0,0 +1,73 @@
+"""Helpers shared by the tests and the benchmark scripts.
+
+asia_store_v1.0.py is a script, not a package, and its module-level
+database is asia_store.db relative to the working directory (opened on
+first use). load_app() therefore switches into a scratch directory first
+and imports the file under the module name "asia_store".
+"""
+import importlib.util
+import os
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "asia_store_v1.0.py")
+
+def load_app(workdir):
+    """Imports the app with workdir as working directory (once per process)"""
+    if "asia_store" in sys.modules:
+        return sys.modules["asia_store"]
+    os.chdir(workdir)
+    spec = importlib.util.spec_from_file_location("asia_store", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["asia_store"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def open_database(app, path, **kwargs):
+    """Opens (and migrates) a separate store database at path"""
+    database = app.Database(f"sqlite:///{path}", **kwargs)
+    app.migrate(database)
+    return database
+
+CATEGORIES = ("Nudeln", "Saucen", "Snacks", "Getränke")
+
+def fill_catalog(database, count, start=0, stock=100, categories=CATEGORIES):
+    """Inserts count synthetic products (barcodes P0000000...) with raw SQL"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+    with database.connect() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO categories (name, description, min_stock) VALUES (?, '', 5)",
+            [(name,) for name in categories]
+        )
+        ids = [row[0] for row in conn.execute("SELECT id FROM categories ORDER BY id")]
+        conn.executemany(
+            "INSERT INTO products (barcode, name, description, price, stock, category_id, "
+            "created_at, updated_at, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)",
+            (
+                (f"P{i:07d}", f"Produkt {i}", f"Beschreibung {i}", round(1 + i % 500 * 0.1, 2),
+                 stock, ids[i % len(ids)], now, now)
+                for i in range(start, start + count)
+            )
+        )
+        conn.commit()
+
+def sell_one_by_one(workdir, path, barcode, count, start, results):
+    """Process target: count separate adjust_stock(-1) commits on barcode.
+
+    Waits for start (a multiprocessing Event) so all processes write at
+    the same time, then puts (errors, last error) on results.
+    """
+    app = load_app(workdir)
+    database = app.Database(f"sqlite:///{path}")
+    errors, last_error = 0, None
+    start.wait()
+    for _ in range(count):
+        try:
+            with database.Session() as session:
+                app.adjust_stock(session, barcode, -1, "sale")
+                session.commit()
+        except Exception as e:
+            errors, last_error = errors + 1, repr(e)
+    database.dispose()
+    results.put((errors, last_error))
@@ -0,0 +1,64 @@
+"""Incremental stock_history export of the Arrow analytics snapshot."""
+import sqlite3
+
+import pytest
+
+from helpers import fill_catalog
+
+pytest.importorskip("pyarrow")
+
+def add_history(conn, barcode, levels):
+    conn.executemany(
+        "INSERT INTO stock_history (product_barcode, stock_level, timestamp, change_type) "
+        "VALUES (?, ?, '2024-05-15 10:00:00.000000', 'manual')",
+        [(barcode, level) for level in levels]
+    )
+    conn.commit()
+
+def test_history_ids_are_not_reused(database, tmp_path):
+    fill_catalog(database, 2)
+    conn = sqlite3.connect(tmp_path / "store.db")
+    add_history(conn, "P0000000", [1, 2, 3])
+    conn.execute("DELETE FROM stock_history WHERE id = 3")
+    conn.commit()
+    add_history(conn, "P0000000", [4])
+    assert conn.execute("SELECT MAX(id) FROM stock_history").fetchone()[0] == 4
+    conn.close()
+
+def test_incremental_export_keeps_rows_after_deleting_the_newest(app, database, tmp_path):
+    fill_catalog(database, 2)
+    db_path = str(tmp_path / "store.db")
+    target = str(tmp_path / "analytics")
+    conn = sqlite3.connect(db_path)
+    add_history(conn, "P0000000", [10, 9, 8])
+    add_history(conn, "P0000001", [5, 4])
+    app.export_analytics_snapshot(target, db_path=db_path)
+    
+    # Die neuesten Zeilen verschwinden (z. B. Produkt gelöscht), dann kommen neue hinzu
+    conn.execute("DELETE FROM stock_history WHERE product_barcode = 'P0000001'")
+    conn.commit()
+    add_history(conn, "P0000000", [7, 6])
+    conn.close()
+    
+    manifest = app.export_analytics_snapshot(target, db_path=db_path)
+    assert manifest["appended_history_rows"] == 2
+    levels = app.read_analytics_table(target, "stock_history").column("stock_level").to_pylist()
+    assert levels == [10, 9, 8, 5, 4, 7, 6]
+
+def test_migration_adds_autoincrement_to_existing_table(app, tmp_path):
+    conn = sqlite3.connect(tmp_path / "legacy.db")
+    conn.execute(
+        "CREATE TABLE stock_history (id INTEGER NOT NULL, product_barcode VARCHAR(50), "
+        "stock_level INTEGER, timestamp DATETIME, change_type VARCHAR(20), notes VARCHAR(200), "
+        "PRIMARY KEY (id))"
+    )
+    conn.executemany("INSERT INTO stock_history (id, stock_level) VALUES (?, ?)", [(1, 1), (2, 2), (3, 3)])
+    conn.commit()
+    app.add_autoincrement(conn, "stock_history")
+    conn.commit()
+    conn.execute("DELETE FROM stock_history WHERE id = 3")
+    conn.execute("INSERT INTO stock_history (stock_level) VALUES (4)")
+    assert conn.execute("SELECT id, stock_level FROM stock_history ORDER BY id").fetchall() == [(1, 1), (2, 2), (4, 4)]
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(stock_history)")}
+    assert "ix_stock_history_product_timestamp" in indexes
+    conn.close()
@@ -0,0 +1,86 @@
+"""Online backups: checksum file, integrity check, and the single-step fallback after restarts."""
+import os
+import sqlite3
+
+import pytest
+
+from helpers import fill_catalog
+
+@pytest.fixture
+def source(database, tmp_path):
+    fill_catalog(database, 3000)
+    database.dispose()
+    return str(tmp_path / "store.db")
+
+def barcodes(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {b for (b,) in conn.execute("SELECT barcode FROM products")}
+    finally:
+        conn.close()
+
+def test_backup_writes_checksum_and_verifies(app, source, tmp_path):
+    target = str(tmp_path / "backup.db")
+    stats = app.backup_database(target, source, log=False)
+    assert (stats["integrity"], stats["restarts"]) == ("ok", 0)
+    assert not os.path.exists(target + ".tmp")
+    with open(target + ".sha256", encoding="utf-8") as f:
+        assert f.read() == f"{stats['sha256']}  backup.db\n"
+    assert stats["sha256"] == app.file_sha256(target)
+    assert len(barcodes(target)) == 3000
+    assert app.verify_backup(target) == (True, "ok")
+
+def test_backup_log(app, source, tmp_path):
+    backups = tmp_path / "backups"
+    backups.mkdir()
+    app.backup_database(str(backups / "a.db"), source, pause=0)
+    app.backup_database(str(backups / "b.db"), source, pause=0)
+    with open(backups / app.BACKUP_LOG, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+def test_verify_detects_changed_and_missing_checksum(app, source, tmp_path):
+    target = str(tmp_path / "backup.db")
+    app.backup_database(target, source, log=False)
+    with open(target, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\x01")
+    assert app.verify_backup(target) == (False, "Prüfsumme stimmt nicht überein")
+    os.remove(target + ".sha256")
+    assert app.verify_backup(target) == (False, "Prüfsumme fehlt")
+
+def test_verify_runs_integrity_check(app, source, tmp_path):
+    target = str(tmp_path / "backup.db")
+    app.backup_database(target, source, log=False)
+    conn = sqlite3.connect(target)
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    root = conn.execute("SELECT rootpage FROM sqlite_master WHERE name = 'ix_products_name'").fetchone()[0]
+    conn.close()
+    with open(target, "r+b") as f:  # Indexseite zerstören, Prüfsumme passend neu schreiben
+        f.seek((root - 1) * page_size + 8)
+        f.write(b"\x7f" * (page_size // 2))
+    with open(target + ".sha256", "w", encoding="utf-8") as f:
+        f.write(f"{app.file_sha256(target)}  backup.db\n")
+    ok, message = app.verify_backup(target)
+    assert not ok and message != "ok"
+
+def test_backup_copies_the_rest_in_one_step_after_restarts(app, source, tmp_path):
+    writer = sqlite3.connect(source, isolation_level=None)
+    written = []
+    
+    def progress(done, total):
+        # Jede Änderung zwischen zwei Schritten lässt SQLite die Kopie neu beginnen
+        written.append(f"W{len(written):07d}")
+        writer.execute(
+            "INSERT INTO products (barcode, name, stock, version) VALUES (?, 'Während des Backups', 1, 1)",
+            (written[-1],)
+        )
+        
+    target = str(tmp_path / "backup.db")
+    try:
+        stats = app.backup_database(target, source, pages=1, pause=0, max_restarts=3, progress=progress, log=False)
+    finally:
+        writer.close()
+    assert stats["restarts"] == 3
+    assert barcodes(target) == barcodes(source)
+    assert set(written) <= barcodes(target)
+    assert app.verify_backup(target) == (True, "ok")
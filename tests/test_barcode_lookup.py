@@ -0,0 +1,272 @@
+"""Barcode lookups, the lookup cache and the provider circuit breakers (HTTP stand-in, fake clock)."""
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeProvider:
+    """Provider for BarcodeLookupEngine that answers from a dict or raises"""
+
+    def __init__(self, app, name, answers=None, error=None, clock=None):
+        self.name = name
+        self.answers = answers or {}
+        self.error = error
+        self.health = app.ProviderHealth(clock=clock or FakeClock())
+        self.calls = 0
+
+    def lookup(self, barcode, timeout, cancelled):
+        self.calls += 1
+        if self.error:
+            self.health.record_failure()
+            raise self.error
+        self.health.record_success(0.1)
+        return self.answers.get(barcode)
+
+class ProviderStandIn(BaseHTTPRequestHandler):
+    """Answers like UPCitemdb (/upc?upc=...) and OpenFoodFacts (/off/<code>.json)"""
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        if url.path == "/upc":
+            provider, barcode = "upcitemdb", parse_qs(url.query)["upc"][0]
+        else:
+            provider, barcode = "openfoodfacts", url.path.rsplit("/", 1)[-1][:-len(".json")]
+        with server.lock:
+            server.requests.append((provider, barcode))
+        status = server.status.get(provider, 200)
+        product = server.products.get(provider, {}).get(barcode)
+        if provider == "upcitemdb":
+            body = {"items": [product] if product else []}
+        else:
+            body = {"status": 1, "product": product} if product else {"status": 0}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def providers(app, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProviderStandIn)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.status = {}
+    server.products = {
+        "upcitemdb": {"4006381333931": {"title": "Mie Nudeln", "description": "Weizennudeln", "price": 1.29}},
+        "openfoodfacts": {"8852018101017": {"product_name": "Sojasauce", "generic_name": "Sauce"}},
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(app, "UPCITEMDB_ENDPOINT", base + "/upc?upc={barcode}")
+    monkeypatch.setattr(app, "OPENFOODFACTS_ENDPOINT", base + "/off/{barcode}.json")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def resolver(app, database, providers, monkeypatch, tmp_path):
+    """resolve_barcode wired to the stand-in, a fresh cache and an empty catalog"""
+    engine = app.BarcodeLookupEngine([app.UPCitemdbProvider(), app.OpenFoodFactsProvider()])
+    cache = app.BarcodeLookupCache(database.Session)
+    monkeypatch.setattr(app, "lookup_engine", engine)
+    monkeypatch.setattr(app, "lookup_cache", cache)
+    monkeypatch.setattr(app, "barcode_index", app.BarcodeIndex(database.Session))
+    monkeypatch.setattr(app, "offline_barcodes", app.OfflineBarcodeIndex(str(tmp_path / "missing.db")))
+    yield cache
+    engine.executor.shutdown(wait=True)
+
+def test_providers_parse_stand_in_answers(app, providers):
+    engine = app.BarcodeLookupEngine([app.UPCitemdbProvider(), app.OpenFoodFactsProvider()])
+    try:
+        result = engine.lookup("4006381333931")
+        assert result == {"name": "Mie Nudeln", "description": "Weizennudeln", "price": 1.29,
+                          "source": "upcitemdb"}
+        result = engine.lookup("8852018101017")
+        assert result == {"name": "Sojasauce", "description": "Sauce", "price": "",
+                          "source": "openfoodfacts"}
+        assert engine.resolve("0000000000000") == (None, True)
+    finally:
+        engine.executor.shutdown(wait=True)
+
+def test_found_answers_are_served_from_cache(app, providers, resolver):
+    for _ in range(5):
+        assert app.resolve_barcode("4006381333931")["name"] == "Mie Nudeln"
+    network = {barcode for provider, barcode in providers.requests}
+    assert network == {"4006381333931"}
+    assert len(providers.requests) <= 2  # ein Aufruf je Anbieter, danach nur Cache
+    stats = resolver.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 4
+    assert stats["hit_rate"] == pytest.approx(0.8)
+    assert stats["avg_network_seconds"] > 0
+
+def test_not_found_is_cached_negatively(app, providers, resolver):
+    assert app.resolve_barcode("0000000000000") is None
+    assert app.resolve_barcode("0000000000000") is None
+    assert len(providers.requests) == 2  # beide Anbieter einmal gefragt
+    assert resolver.stats()["negative_hits"] == 1
+    with resolver.Session() as session:
+        entry = session.get(app.BarcodeLookup, "0000000000000")
+        assert not entry.found
+        assert entry.expires_at <= datetime.now() + app.LOOKUP_CACHE_NEGATIVE_TTL
+
+def test_provider_errors_are_not_cached(app, providers, resolver):
+    providers.status["upcitemdb"] = 500
+    assert app.resolve_barcode("0000000000000") is None
+    with resolver.Session() as session:
+        assert session.get(app.BarcodeLookup, "0000000000000") is None
+    providers.status.clear()
+    assert app.resolve_barcode("0000000000000") is None
+    assert len(providers.requests) == 4  # kein Cache-Treffer nach dem Fehler
+
+def test_expired_entries_go_back_to_the_network(app, providers, resolver):
+    app.resolve_barcode("8852018101017")
+    with resolver.Session() as session:
+        entry = session.get(app.BarcodeLookup, "8852018101017")
+        entry.expires_at = datetime.now() - timedelta(seconds=1)
+        session.commit()
+    before = len(providers.requests)
+    assert app.resolve_barcode("8852018101017")["name"] == "Sojasauce"
+    assert len(providers.requests) > before
+    assert resolver.purge_expired() == 0
+
+def trip(health, failures=3):
+    for _ in range(failures):
+        assert health.allow()
+        health.record_failure()
+
+def test_breaker_opens_after_three_failures_and_probes_once(app):
+    clock = FakeClock()
+    health = app.ProviderHealth(clock=clock)
+    trip(health, 2)
+    assert health.state == "closed"
+    health.record_failure()
+    assert (health.state, health.trips) == ("open", 1)
+    assert not health.allow()
+    clock.now += 29.9
+    assert not health.allow()
+    assert health.stats()["open_remaining"] == pytest.approx(0.1)
+    clock.now += 0.1
+    assert health.allow()      # eine Probe im Zustand half-open
+    assert health.state == "half-open"
+    assert not health.allow()  # keine zweite, solange die Probe läuft
+    health.record_success(0.2)
+    assert (health.state, health.cooldown, health.failures) == ("closed", 30.0, 0)
+    assert health.allow()
+
+def test_success_resets_the_failure_count(app):
+    health = app.ProviderHealth(clock=FakeClock())
+    trip(health, 2)
+    health.record_success(0.1)
+    trip(health, 2)
+    assert health.state == "closed"
+
+def test_failed_probe_doubles_the_cooldown_up_to_the_maximum(app):
+    clock = FakeClock()
+    health = app.ProviderHealth(clock=clock)
+    trip(health)
+    cooldowns = []
+    for _ in range(6):
+        clock.now += health.cooldown
+        assert health.allow()
+        health.record_failure()
+        assert health.state == "open"
+        cooldowns.append(health.cooldown)
+    assert cooldowns == [60.0, 120.0, 240.0, 480.0, 600.0, 600.0]
+    assert health.trips == 7
+
+def test_release_frees_the_probe_slot(app):
+    clock = FakeClock()
+    health = app.ProviderHealth(clock=clock)
+    trip(health)
+    clock.now += 30
+    assert health.allow()
+    health.release()  # Anfrage wurde abgebrochen, bevor sie lief
+    assert health.allow()
+
+def test_timeout_follows_p95_of_recent_calls(app):
+    health = app.ProviderHealth(clock=FakeClock())
+    assert health.timeout() == app.LOOKUP_TIMEOUT  # zu wenige Messwerte
+    for i in range(20):
+        health.record_success(0.1 + i * 0.05)  # 0.10 ... 1.05 s, p95 = 1.0 s
+    assert health.timeout() == (app.LOOKUP_TIMEOUT[0], pytest.approx(2.0))
+    fast = app.ProviderHealth(clock=FakeClock())
+    for _ in range(20):
+        fast.record_success(0.05)
+    assert fast.timeout()[1] == 1.0  # min_timeout
+    slow = app.ProviderHealth(clock=FakeClock())
+    for _ in range(20):
+        slow.record_success(10.0)
+    assert slow.timeout()[1] == app.LOOKUP_TIMEOUT[1]
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_rate_limit_and_server_errors_count_as_failures(app, providers, status):
+    providers.status["upcitemdb"] = status
+    provider = app.UPCitemdbProvider()
+    provider.health = app.ProviderHealth(clock=FakeClock())
+    for _ in range(3):
+        with pytest.raises(requests.HTTPError):
+            provider.lookup("4006381333931", None, threading.Event())
+    assert provider.health.state == "open"
+    assert provider.errors == 3
+
+def test_other_statuses_are_answers_not_failures(app, providers):
+    providers.status["upcitemdb"] = 404
+    provider = app.UPCitemdbProvider()
+    for _ in range(3):
+        assert provider.lookup("4006381333931", None, threading.Event()) is None
+    assert provider.health.state == "closed"
+    assert provider.not_found == 3
+
+def test_resolve_reports_incomplete_answers(app):
+    known = FakeProvider(app, "a", {"1": {"name": "Eins"}})
+    failing = FakeProvider(app, "b", error=RuntimeError("down"))
+    engine = app.BarcodeLookupEngine([known, failing])
+    try:
+        assert engine.resolve("2") == (None, False)  # ein Anbieter ist ausgefallen
+        trip(failing.health, 2)  # zweiter und dritter Fehler: Breaker offen
+        assert failing.health.state == "open"
+        calls = failing.calls
+        assert engine.resolve("1") == ({"name": "Eins"}, True)
+        assert engine.resolve("2") == (None, False)  # übersprungen
+        assert failing.calls == calls
+        trip(known.health)
+        with pytest.raises(app.ProviderUnavailableError):
+            engine.resolve("1")
+    finally:
+        engine.executor.shutdown(wait=True)
+
+def test_resolve_raises_when_every_provider_fails(app):
+    engine = app.BarcodeLookupEngine([
+        FakeProvider(app, "a", error=RuntimeError("a down")),
+        FakeProvider(app, "b", error=RuntimeError("b down")),
+    ])
+    try:
+        with pytest.raises(RuntimeError, match="down"):
+            engine.resolve("1")
+    finally:
+        engine.executor.shutdown(wait=True)
+
+def test_not_found_is_not_cached_while_a_provider_is_skipped(app, providers, resolver):
+    trip(app.lookup_engine.providers[0].health)
+    assert app.resolve_barcode("0000000000000") is None
+    assert {provider for provider, _ in providers.requests} == {"openfoodfacts"}
+    with resolver.Session() as session:
+        assert session.get(app.BarcodeLookup, "0000000000000") is None
@@ -0,0 +1,94 @@
+"""Catalog exports read back: every row once, on the pages the exporter reports."""
+import base64
+import re
+import zlib
+
+import openpyxl
+import pytest
+
+from helpers import CATEGORIES, fill_catalog
+
+def pdf_pages(path):
+    """Decoded content stream of every page (reportlab writes one stream per page)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    pages = []
+    for stream in re.findall(rb"stream\r?\n(.*?)endstream", data, re.S):
+        stream = stream.strip()
+        if stream.endswith(b"~>"):
+            stream = base64.a85decode(stream[:-2])
+        text = zlib.decompress(stream).decode("latin-1")
+        pages.append(re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), text))
+    assert len(pages) == len(re.findall(rb"/Type /Page\b(?!s)", data))
+    return pages
+
+@pytest.fixture
+def catalog(database):
+    fill_catalog(database, 600)
+    return database
+
+def test_pdf_has_every_row_once(app, catalog, tmp_path):
+    path = str(tmp_path / "katalog.pdf")
+    result = app.export_catalog_pdf(path, ["Barcode", "Produktname", "Preis"], catalog.Session)
+    pages = pdf_pages(path)
+    assert result["rows"] == 600
+    assert result["pages"] == len(pages) > 1
+    barcodes = re.findall(r"\((P\d{7})\) Tj", "".join(pages))
+    assert barcodes == [f"P{i:07d}" for i in range(600)]
+    for number, page in enumerate(pages, 1):
+        assert f"(Seite {number}) Tj" in page
+        assert "(Barcode) Tj" in page  # Kopfzeile auf jeder Seite
+
+def test_pdf_grouped_by_category_has_subtotals(app, catalog, tmp_path):
+    path = str(tmp_path / "katalog.pdf")
+    result = app.export_catalog_pdf(path, ["Barcode", "Kategorie"], catalog.Session, group_by_category=True)
+    text = "".join(pdf_pages(path))
+    assert result["rows"] == 600
+    assert sorted(re.findall(r"\((P\d{7})\) Tj", text)) == [f"P{i:07d}" for i in range(600)]
+    subtotals = re.findall(r"\(Zwischensumme (.+?): (\d+) Produkte", text)
+    assert subtotals == [(name, "150") for name in sorted(CATEGORIES)]
+    assert "(Gesamt: 600 Produkte, Bestand 60000" in text
+
+def test_excel_single_sheet(app, catalog, tmp_path):
+    path = str(tmp_path / "katalog.xlsx")
+    labels = ["Barcode", "Produktname", "Kategorie", "Preis", "Lagerbestand"]
+    assert app.export_catalog_excel(path, labels, catalog.Session) == 600
+    workbook = openpyxl.load_workbook(path)
+    assert workbook.sheetnames == ["Produkte"]
+    sheet = workbook["Produkte"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert rows[0] == tuple(labels)
+    assert all(cell.font.b for cell in sheet[1])
+    assert len(rows) == 601
+    assert rows[1] == ("P0000000", "Produkt 0", CATEGORIES[0], 1.0, 100)
+    assert [row[0] for row in rows[1:]] == [f"P{i:07d}" for i in range(600)]
+
+def test_excel_sheet_per_category_sanitises_titles(app, database, tmp_path):
+    names = ("Tiefkühl/Eis", "[Neu]: *?", "A" * 40, "a" * 40 + "b")
+    fill_catalog(database, 40, categories=names)
+    with database.connect() as conn:
+        conn.execute("UPDATE products SET category_id = NULL WHERE barcode = 'P0000000'")
+        conn.commit()
+    path = str(tmp_path / "katalog.xlsx")
+    assert app.export_catalog_excel(path, ["Barcode", "Kategorie"], database.Session, sheet_per_category=True) == 40
+    workbook = openpyxl.load_workbook(path)
+    # Sortiert nach Kategoriename; Titel ohne []:*?/\, höchstens 31 Zeichen, eindeutig ohne Groß/klein
+    assert workbook.sheetnames == [
+        "Ohne Kategorie", "A" * 31, "Tiefkühl_Eis", "_Neu__ __", "a" * 27 + " (2)"
+    ]
+    counts = {sheet.title: sheet.max_row - 1 for sheet in workbook}
+    assert counts == {"Ohne Kategorie": 1, "A" * 31: 10, "Tiefkühl_Eis": 9, "_Neu__ __": 10, "a" * 27 + " (2)": 10}
+    for sheet in workbook:
+        categories = {row[1] for row in sheet.iter_rows(min_row=2, values_only=True)}
+        assert len(categories) == 1
+
+def test_excel_more_than_26_columns(app, catalog, tmp_path):
+    path = str(tmp_path / "katalog.xlsx")
+    labels = list(app.EXPORT_COLUMNS) * 5  # 35 Spalten, bis AI
+    assert app.export_catalog_excel(path, labels, catalog.Session) == 600
+    sheet = openpyxl.load_workbook(path)["Produkte"]
+    assert sheet.max_column == 35
+    assert [cell.value for cell in sheet[1]] == labels
+    assert sheet["AI1"].value == labels[-1]
+    assert sheet.column_dimensions["AI"].width == len(labels[-1]) + 2
+    assert sheet["AC2"].value == sheet["A2"].value == "P0000000"  # Spalte 29 = Barcode
@@ -0,0 +1,60 @@
+"""The catalog read API must cost a constant number of queries, whatever the catalog size."""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from helpers import fill_catalog
+
+@contextmanager
+def count_queries(engine):
+    statements = []
+    
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        
+    event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_execute)
+
+def catalog_query_counts(app, database, sizes, read):
+    counts = []
+    filled = 0
+    for size in sizes:
+        fill_catalog(database, size - filled, start=filled)
+        filled = size
+        with database.Session() as session, count_queries(database.engine) as statements:
+            rows = read(session)
+        assert rows == size
+        counts.append(len(statements))
+    return counts
+
+SIZES = (100, 1000, 10000)
+
+@pytest.mark.parametrize("columns", [
+    ("barcode", "name", "price"),
+    ("barcode", "name", "description", "category", "price", "stock"),
+    ("barcode", "category", "min_stock"),
+])
+def test_iter_catalog_query_count_is_constant(app, database, columns):
+    counts = catalog_query_counts(
+        app, database, SIZES, lambda session: sum(1 for _ in app.iter_catalog(session, columns, chunk_size=500))
+    )
+    assert counts == [1] * len(SIZES)
+
+def test_catalog_query_all_query_count_is_constant(app, database):
+    counts = catalog_query_counts(
+        app, database, SIZES, lambda session: len(app.catalog_query(session).all())
+    )
+    assert counts == [1] * len(SIZES)
+
+def test_csv_export_query_count_is_constant(app, database, tmp_path):
+    labels = list(app.EXPORT_COLUMNS)
+    
+    def export(session):
+        return app.export_catalog_csv(str(tmp_path / "export.csv"), labels, session_factory=lambda: session)
+        
+    counts = catalog_query_counts(app, database, SIZES, export)
+    assert len(set(counts)) == 1
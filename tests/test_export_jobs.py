@@ -0,0 +1,64 @@
+"""Export jobs run in spawned workers that read only their snapshot; extra jobs wait, cancel works."""
+import os
+import shutil
+import time
+
+import pytest
+
+from helpers import APP_PATH, fill_catalog
+
+def poll_until(queue, condition, timeout=60):
+    """Polls like the Tk thread until condition(seen) holds; seen collects the states per poll"""
+    seen = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        queue.poll()
+        seen.append({job.id: job.state for job in queue.jobs.values()})
+        if condition(seen):
+            return seen
+        time.sleep(0.01)
+    raise AssertionError(f"Zeitüberschreitung, zuletzt {seen[-1] if seen else None}")
+
+@pytest.fixture
+def jobs(app, database, tmp_path, monkeypatch):
+    fill_catalog(database, 100000)
+    database.dispose()
+    # Die Worker starten in diesem Verzeichnis: ein Import dort darf keine asia_store.db anlegen
+    workers = tmp_path / "workers"
+    workers.mkdir()
+    monkeypatch.chdir(workers)
+    # Im Programm ist das Skript __main__; hier müssen die Worker es als asia_store importieren können
+    modules = tmp_path / "modules"
+    modules.mkdir()
+    shutil.copyfile(APP_PATH, modules / "asia_store.py")
+    monkeypatch.syspath_prepend(str(modules))
+    queue = app.ExportJobQueue(str(tmp_path / "store.db"), max_workers=1)
+    yield queue
+    queue.shutdown()
+
+def test_jobs_beyond_max_workers_wait(app, jobs, tmp_path):
+    files = [str(tmp_path / f"export{i}.csv") for i in range(3)]
+    submitted = jobs.submit([(path, ["Barcode", "Preis"], {}) for path in files])
+    seen = poll_until(jobs, lambda seen: not jobs.active_jobs())
+    assert [job.state for job in submitted] == ["done"] * 3
+    assert [job.rows for job in submitted] == [100000] * 3
+    assert all(list(states.values()).count("running") <= 1 for states in seen)
+    for path in files:
+        with open(path, encoding="utf-8-sig") as f:
+            assert sum(1 for _ in f) == 100001
+    assert jobs.snapshots == {}
+    assert not os.path.exists(tmp_path / "workers" / "asia_store.db")
+
+def test_cancel_before_snapshot_and_while_running(app, jobs, tmp_path):
+    files = [str(tmp_path / f"export{i}.csv") for i in range(3)]
+    first, second, third = jobs.submit([(path, ["Barcode", "Preis"], {"chunk_size": 1000}) for path in files])
+    jobs.cancel(third)  # Snapshot noch nicht fertig
+    assert third.state == "cancelled"
+    poll_until(jobs, lambda seen: first.state == "running")
+    jobs.cancel(second)  # wartet im Pool
+    jobs.cancel(first)   # läuft: Abbruch über das Flag
+    poll_until(jobs, lambda seen: not jobs.active_jobs())
+    assert [job.state for job in (first, second, third)] == ["cancelled"] * 3
+    assert not any(os.path.exists(path) for path in files)
+    snapshot = first.snapshot
+    assert snapshot is not None and not os.path.exists(snapshot)
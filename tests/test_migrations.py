@@ -0,0 +1,16 @@
+"""migrate() applies pending migrations once and reports their timings instead of printing them."""
+
+def test_migrate_returns_timings_silently(app, tmp_path, capsys):
+    database = app.Database(f"sqlite:///{tmp_path / 'neu.db'}")
+    try:
+        applied = app.migrate(database)
+        assert [migration.version for migration, _ in applied] == [m.version for m in app.MIGRATIONS]
+        assert all(seconds >= 0 for _, seconds in applied)
+        assert app.migrate(database) == []
+        with database.connect() as conn:
+            assert set(app.applied_migrations(conn)) == {m.version for m in app.MIGRATIONS}
+            indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"ix_stock_history_product_timestamp", "ix_products_category_id", "ix_products_name"} <= indexes
+    finally:
+        database.dispose()
+    assert capsys.readouterr().out == ""
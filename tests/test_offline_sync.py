@@ -0,0 +1,123 @@
+"""Offline edits pushed through the outbox must not overwrite concurrent online changes."""
+import pytest
+from sqlalchemy import event
+
+from helpers import fill_catalog
+
+@pytest.fixture
+def replica(app, database, tmp_path):
+    fill_catalog(database, 3, stock=50)
+    replica = app.OfflineReplica(str(tmp_path / "offline.db"), database)
+    replica.pull()
+    yield replica
+    replica.close()
+
+def product(database, barcode):
+    with database.connect() as conn:
+        return conn.execute(
+            "SELECT name, price, stock, version FROM products WHERE barcode = ?", (barcode,)
+        ).fetchone()
+
+def sell(app, database, barcode, quantity):
+    with database.Session() as session:
+        app.adjust_stock(session, barcode, -quantity, "sale")
+        session.commit()
+
+def edit_offline(replica, barcode, **changes):
+    row = replica.conn.execute(
+        "SELECT name, description, price, stock, category_id FROM products WHERE barcode = ?", (barcode,)
+    ).fetchone()
+    values = dict(zip(("name", "description", "price", "stock", "category_id"), row), **changes)
+    replica.record("upsert", barcode, values)
+
+def test_offline_rename_keeps_online_sale(app, database, replica):
+    edit_offline(replica, "P0000000", name="Umbenannt")
+    sell(app, database, "P0000000", 10)
+    stats = replica.sync()
+    assert stats["conflicts"] == 0
+    name, _, stock, _ = product(database, "P0000000")
+    assert (name, stock) == ("Umbenannt", 40)
+
+def test_offline_stock_change_is_added_as_delta(app, database, replica):
+    edit_offline(replica, "P0000001", stock=55)  # Wareneingang +5 an der Offline-Kasse
+    edit_offline(replica, "P0000001", stock=57)  # und noch +2
+    sell(app, database, "P0000001", 10)
+    replica.sync()
+    assert product(database, "P0000001")[2] == 47
+    with database.connect() as conn:
+        notes = [n for (n,) in conn.execute(
+            "SELECT notes FROM stock_history WHERE product_barcode = 'P0000001' AND change_type = 'offline'"
+        )]
+    assert notes == ["Stock changed from 40 to 47"]
+    # Nach dem Pull kennt das Replikat den Online-Stand
+    assert replica.conn.execute("SELECT stock FROM products WHERE barcode = 'P0000001'").fetchone()[0] == 47
+
+def test_online_edit_wins_over_stale_offline_edit(app, database, replica):
+    with database.Session() as session:
+        app.save_product_record(session, "P0000002", "Online", "", "Nudeln", 9.99, 50)
+        session.commit()
+    edit_offline(replica, "P0000002", name="Offline", stock=60)
+    stats = replica.sync()
+    assert stats["conflicts"] == 1
+    name, price, stock, _ = product(database, "P0000002")
+    assert (name, price, stock) == ("Online", 9.99, 60)
+    assert replica.pending() == 0
+    assert replica.conn.execute("SELECT name FROM products WHERE barcode = 'P0000002'").fetchone()[0] == "Online"
+
+def test_new_offline_product_is_inserted(app, database, replica):
+    category_id = replica.category_id("Nudeln")
+    replica.record("upsert", "N0000001", {"name": "Neu", "description": "", "price": 1.5,
+                                          "stock": 12, "category_id": category_id})
+    replica.sync()
+    assert product(database, "N0000001") == ("Neu", 1.5, 12, 1)
+
+def test_push_is_idempotent_after_interruption(app, database, replica, monkeypatch):
+    edit_offline(replica, "P0000000", stock=45)
+    original = replica.conn
+    
+    class DropOutboxDelete:
+        """Simulates a crash after the main commit, before the outbox is cleared"""
+        def __init__(self, conn):
+            self.conn = conn
+        def __getattr__(self, name):
+            return getattr(self.conn, name)
+        def __enter__(self):
+            return self.conn.__enter__()
+        def __exit__(self, *exc):
+            return self.conn.__exit__(*exc)
+        def executemany(self, sql, rows):
+            if sql.startswith("DELETE FROM outbox"):
+                raise RuntimeError("abgebrochen")
+            return self.conn.executemany(sql, rows)
+        
+    replica.conn = DropOutboxDelete(original)
+    with pytest.raises(RuntimeError):
+        replica.push()
+    replica.conn = original
+    stats = replica.push()
+    assert stats["duplicates"] == 1
+    assert product(database, "P0000000")[2] == 45
+
+def test_online_edit_between_read_and_write_is_a_conflict(app, database, replica):
+    edited = []
+    
+    def online_edit(conn, cursor, statement, parameters, context, executemany):
+        # Eine andere Kasse ändert den Namen, nachdem push() die Version gelesen hat
+        if not edited and statement.startswith("UPDATE products") and "products.version = ?" in statement:
+            edited.append(True)
+            cursor.execute("UPDATE products SET name = 'Online', version = version + 1 WHERE barcode = 'P0000000'")
+            
+    edit_offline(replica, "P0000000", name="Offline", stock=55)
+    event.listen(database.engine, "before_cursor_execute", online_edit)
+    try:
+        stats = replica.push()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", online_edit)
+    assert stats["conflicts"] == 1
+    name, _, stock, version = product(database, "P0000000")
+    assert (name, stock, version) == ("Online", 55, 2)
+    with database.connect() as conn:
+        logged = conn.execute(
+            "SELECT action, name FROM product_changes WHERE barcode = 'P0000000' ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+    assert logged == ("update", "Online")
@@ -0,0 +1,120 @@
+"""Bulk import: German/English headers, delimiter sniffing, upserts with history, per-line errors."""
+import sqlite3
+
+import openpyxl
+import pytest
+
+def write_csv(path, lines):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        f.write("\r\n".join(lines) + "\r\n")
+    return str(path)
+
+def run_import(app, database, path, **kwargs):
+    return app.ProductImporter(database.Session, **kwargs).run(path)
+
+def query(database, sql, *params):
+    with database.connect() as conn:
+        return conn.execute(sql, params).fetchall()
+
+def products(database):
+    return {
+        barcode: rest for barcode, *rest in query(database, """
+            SELECT p.barcode, p.name, p.description, c.name, p.price, p.stock, p.version
+            FROM products p LEFT JOIN categories c ON c.id = p.category_id
+        """)
+    }
+
+def test_csv_round_trip_with_reimport_and_bad_rows(app, database, tmp_path):
+    first = write_csv(tmp_path / "erstimport.csv", [
+        "Barcode,Name,Description,Category,Price,Stock",
+        "4006381333931,Mie Nudeln,Weizennudeln,Nudeln,1.29,40",
+        "8852018101017,Sojasauce,,Saucen,2.49,0",
+        "4901990331456,Pocky,Schoko,Süßigkeiten,1.99,12",
+    ])
+    stats = run_import(app, database, first)
+    assert (stats["rows"], stats["inserted"], stats["updated"], stats["invalid"]) == (3, 3, 0, 0)
+    assert products(database) == {
+        "4006381333931": ["Mie Nudeln", "Weizennudeln", "Nudeln", 1.29, 40, 1],
+        "8852018101017": ["Sojasauce", "", "Saucen", 2.49, 0, 1],
+        "4901990331456": ["Pocky", "Schoko", "Süßigkeiten", 1.99, 12, 1],
+    }
+    assert query(database, "SELECT COUNT(*) FROM categories WHERE name = 'Süßigkeiten'") == [(1,)]
+    
+    # Deutsche Überschriften, Semikolon, Dezimalkomma; Zeilen 3 und 5 sind ungültig
+    second = write_csv(tmp_path / "nachimport.csv", [
+        "EAN;Produktname;Beschreibung;Kategorie;Preis;Lagerbestand",
+        "4006381333931;Mie Nudeln Huhn;Weizennudeln;Nudeln;1,39;35",
+        ";Ohne Barcode;;Nudeln;1,00;1",
+        "8852018101017;Sojasauce;;Saucen;2,49;0",
+        "4901990331458;Pocky Erdbeer;;Süßigkeiten;teuer;5",
+        "7613035974685;Maggi;Würze;Würzmittel;3;8",
+    ])
+    stats = run_import(app, database, second)
+    assert (stats["rows"], stats["inserted"], stats["updated"], stats["invalid"]) == (5, 1, 2, 2)
+    assert stats["errors"] == [
+        (3, "Barcode and name are required"),
+        (5, "Price must be a number and Stock must be an integer"),
+    ]
+    rows = products(database)
+    assert rows["4006381333931"] == ["Mie Nudeln Huhn", "Weizennudeln", "Nudeln", 1.39, 35, 2]
+    assert rows["8852018101017"] == ["Sojasauce", "", "Saucen", 2.49, 0, 2]
+    assert rows["7613035974685"] == ["Maggi", "Würze", "Würzmittel", 3.0, 8, 1]
+    assert "4901990331458" not in rows
+    
+    # StockHistory "import" nur bei geändertem Bestand
+    history = query(database, """
+        SELECT product_barcode, stock_level, notes FROM stock_history
+        WHERE change_type = 'import' ORDER BY id
+    """)
+    assert history == [
+        ("4006381333931", 40, "Stock changed from 0 to 40"),
+        ("4901990331456", 12, "Stock changed from 0 to 12"),
+        ("4006381333931", 35, "Stock changed from 40 to 35"),
+        ("7613035974685", 8, "Stock changed from 0 to 8"),
+    ]
+    changes = query(database, "SELECT action, barcode FROM product_changes ORDER BY id")
+    assert changes[-3:] == [("insert", "7613035974685"), ("update", "4006381333931"), ("update", "8852018101017")]
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_delimiter_is_sniffed(app, database, tmp_path, delimiter):
+    path = write_csv(tmp_path / "import.csv", [
+        delimiter.join(["barcode", "name", "price", "stock"]),
+        delimiter.join(["A1", "Erstes", "1.5", "3"]),
+        delimiter.join(["A2", "Zweites", "2", "4"]),
+    ])
+    stats = run_import(app, database, path)
+    assert (stats["inserted"], stats["invalid"]) == (2, 0)
+    assert products(database)["A2"] == ["Zweites", "", None, 2.0, 4, 1]
+
+def test_duplicate_barcodes_last_row_wins_across_batches(app, database, tmp_path):
+    path = write_csv(tmp_path / "import.csv", ["Barcode,Name,Stock"] + [f"D{i % 3},Name {i},{i}" for i in range(10)])
+    stats = run_import(app, database, path, batch_size=4)
+    assert stats["rows"] == 10
+    assert {barcode: row[4] for barcode, row in products(database).items()} == {"D0": 9, "D1": 7, "D2": 8}
+
+def test_xlsx_import(app, database, tmp_path):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["EAN", "Produktname", "Kategorie", "Preis", "Bestand"])
+    sheet.append([4006381333931, "Mie Nudeln", "Nudeln", 1.29, 40])
+    sheet.append([None, "Ohne Barcode", None, None, None])
+    path = str(tmp_path / "import.xlsx")
+    workbook.save(path)
+    stats = run_import(app, database, path)
+    assert (stats["inserted"], stats["invalid"], stats["errors"]) == (1, 1, [(3, "Barcode and name are required")])
+    assert products(database)["4006381333931"] == ["Mie Nudeln", "", "Nudeln", 1.29, 40, 1]
+
+def test_failed_batch_rolls_back_new_categories(app, database, tmp_path, monkeypatch):
+    path = write_csv(tmp_path / "import.csv", ["Barcode,Name,Category", "C1,Eins,Neue Kategorie"])
+    importer = app.ProductImporter(database.Session)
+    
+    def fail(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+        
+    monkeypatch.setattr(app, "log_product_changes", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        importer.run(path)
+    monkeypatch.undo()
+    assert query(database, "SELECT COUNT(*) FROM categories WHERE name = 'Neue Kategorie'") == [(0,)]
+    assert importer.run(path)["inserted"] == 1
+    assert products(database)["C1"][2] == "Neue Kategorie"
@@ -0,0 +1,60 @@
+"""Saving a loaded product must neither lose concurrent stock changes nor overwrite newer edits."""
+import multiprocessing
+
+import pytest
+
+from helpers import fill_catalog, sell_one_by_one
+
+def product(database, barcode):
+    with database.connect() as conn:
+        return conn.execute(
+            "SELECT name, price, stock, version FROM products WHERE barcode = ?", (barcode,)
+        ).fetchone()
+
+def save(app, database, barcode, name, price, stock, **loaded):
+    with database.Session() as session:
+        app.save_product_record(session, barcode, name, "Beschreibung 0", "Nudeln", price, stock, **loaded)
+        session.commit()
+
+@pytest.fixture
+def catalog(database):
+    fill_catalog(database, 1, stock=50)  # P0000000: "Produkt 0", Nudeln, 1.0, Version 1
+    return database
+
+def test_stale_version_raises_conflict(app, catalog):
+    save(app, catalog, "P0000000", "Kasse 1", 1.0, 50, version=1, loaded_stock=50)
+    with pytest.raises(app.ProductConflict):
+        save(app, catalog, "P0000000", "Kasse 2", 1.0, 50, version=1, loaded_stock=50)
+    assert product(catalog, "P0000000")[0] == "Kasse 1"
+
+def test_stock_only_change_with_stale_version_is_a_delta(app, catalog):
+    save(app, catalog, "P0000000", "Kasse 1", 1.0, 50, version=1, loaded_stock=50)
+    with catalog.Session() as session:
+        app.adjust_stock(session, "P0000000", -3, "sale")
+        session.commit()
+    # Kasse 2 hat Version 1 und Bestand 50 geladen und bucht nur Wareneingang +10
+    save(app, catalog, "P0000000", "Kasse 1", 1.0, 60, version=1, loaded_stock=50)
+    assert product(catalog, "P0000000") == ("Kasse 1", 1.0, 57, 2)
+
+def test_concurrent_sales_from_several_processes(app, catalog, tmp_path):
+    processes, sales, start = 4, 100, 10000
+    with catalog.connect() as conn:
+        conn.execute("UPDATE products SET stock = ? WHERE barcode = 'P0000000'", (start,))
+        conn.commit()
+    context = multiprocessing.get_context("spawn")
+    go, results = context.Event(), context.Queue()
+    workers = []
+    for i in range(processes):
+        workdir = tmp_path / f"worker{i}"
+        workdir.mkdir()
+        workers.append(context.Process(target=sell_one_by_one, args=(
+            str(workdir), str(tmp_path / "store.db"), "P0000000", sales, go, results
+        )))
+    for worker in workers:
+        worker.start()
+    go.set()
+    outcomes = [results.get(timeout=300) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert outcomes == [(0, None)] * processes
+    assert product(catalog, "P0000000")[2] == start - processes * sales
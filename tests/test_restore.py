@@ -0,0 +1,55 @@
+"""Restoring a snapshot over a WAL-mode database."""
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from helpers import fill_catalog
+
+@pytest.fixture
+def store(app, database, tmp_path):
+    """A catalog with one snapshot, and row H1 written after it"""
+    fill_catalog(database, 100)
+    store = app.IncrementalBackupStore(str(tmp_path / "backups"))
+    store.create(str(tmp_path / "store.db"))
+    with database.Session() as session:  # H1, nach dem Snapshot und im Änderungsprotokoll
+        app.save_product_record(session, "H1", "Nach dem Snapshot", "", "Nudeln", 1.0, 5)
+        session.commit()
+    database.dispose()
+    return store
+
+def barcodes(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {b for (b,) in conn.execute("SELECT barcode FROM products")}
+    finally:
+        conn.close()
+
+def test_restore_refuses_while_the_database_is_open(app, store, tmp_path):
+    target = str(tmp_path / "store.db")
+    other = sqlite3.connect(target)  # andere Instanz
+    other.execute("SELECT COUNT(*) FROM products").fetchone()
+    try:
+        with pytest.raises(RuntimeError, match="geöffnet"):
+            store.restore("latest", target)
+    finally:
+        other.close()
+    assert "H1" in barcodes(target)
+    assert not os.path.exists(target + ".restore")
+
+def test_restore_replaces_wal_database_and_keeps_a_usable_copy(app, store, tmp_path):
+    target = str(tmp_path / "store.db")
+    store.restore("latest", target)
+    assert not os.path.exists(target + "-wal")
+    restored = barcodes(target)
+    assert len(restored) == 100 and "H1" not in restored
+    assert "H1" in barcodes(target + ".vor_restore")
+
+def test_point_in_time_restore_keeps_a_usable_copy(app, store, tmp_path):
+    target = str(tmp_path / "store.db")
+    result = app.restore_point_in_time(datetime.now(), store, target, log_db=target)
+    assert result["replayed_products"] == 1
+    assert "H1" in barcodes(target)
+    assert len(barcodes(target + ".vor_restore")) == 101
+    assert not os.path.exists(target + ".pitr")
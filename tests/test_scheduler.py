@@ -0,0 +1,30 @@
+"""Day matching of CronSpec follows cron: OR only when both day fields are restricted."""
+from datetime import datetime
+
+import pytest
+
+@pytest.mark.parametrize("spec, moment, expected", [
+    # Tag und Wochentag eingeschränkt: einer von beiden genügt
+    ("0 3 1,15 * 1", datetime(2024, 5, 15), True),   # Mittwoch, der 15.
+    ("0 3 1,15 * 1", datetime(2024, 5, 20), True),   # Montag
+    ("0 3 1,15 * 1", datetime(2024, 5, 14), False),
+    # Ein Feld mit * (auch mit Schritt) gilt als uneingeschränkt: beide müssen passen
+    ("0 3 */2 * 1", datetime(2024, 5, 13), True),    # Montag, ungerader Tag
+    ("0 3 */2 * 1", datetime(2024, 5, 20), False),   # Montag, gerader Tag
+    ("0 3 */2 * 1", datetime(2024, 5, 15), False),   # ungerader Tag, Mittwoch
+    ("0 3 1 * */2", datetime(2024, 6, 1), True),     # der 1., Samstag (6)
+    ("0 3 1 * */2", datetime(2024, 5, 1), False),    # der 1., Mittwoch (3)
+    ("0 3 * * 0", datetime(2024, 5, 19), True),
+    ("0 3 * * 7", datetime(2024, 5, 19), True),
+])
+def test_matches_day(app, spec, moment, expected):
+    assert app.CronSpec(spec).matches_day(moment) is expected
+
+def test_next_after_with_stepped_day(app):
+    spec = app.CronSpec("30 2 */2 * 1")
+    assert spec.next_after(datetime(2024, 5, 14, 12, 0)) == datetime(2024, 5, 27, 2, 30)
+
+@pytest.mark.parametrize("spec", ["* * *", "60 * * * *", "* * 0 * *", "* 5-3 * * *"])
+def test_invalid_specs(app, spec):
+    with pytest.raises(ValueError):
+        app.CronSpec(spec)
@@ -0,0 +1,98 @@
+"""VirtualProductList paging: keyset pages with barcode tie-break, OFFSET fallback, LRU page cache."""
+import pytest
+from sqlalchemy import event
+
+from helpers import fill_catalog
+
+class Widget:
+    """Stands in for the Treeview and scrollbar; paging itself never touches them"""
+
+    def configure(self, **options):
+        pass
+
+    def bind(self, sequence, callback):
+        pass
+
+@pytest.fixture
+def catalog(database):
+    fill_catalog(database, 500)
+    with database.connect() as conn:
+        # Viele gleiche Namen und ein paar NULL-Namen: die Reihenfolge hängt am Barcode
+        conn.execute("UPDATE products SET name = 'Gleich' WHERE CAST(substr(barcode, 2) AS INTEGER) % 3 = 0")
+        conn.execute("UPDATE products SET name = NULL WHERE barcode IN ('P0000007', 'P0000100')")
+        conn.commit()
+    return database
+
+@pytest.fixture
+def offsets(catalog):
+    """OFFSET of every page query (the last bound parameter)"""
+    seen = []
+    
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if "LIMIT ? OFFSET ?" in statement:
+            seen.append(parameters[-1])
+            
+    event.listen(catalog.engine, "before_cursor_execute", before_execute)
+    yield seen
+    event.remove(catalog.engine, "before_cursor_execute", before_execute)
+
+def product_list(app, database, **kwargs):
+    return app.VirtualProductList(Widget(), Widget(), database.Session, **kwargs)
+
+def expected(database, order):
+    with database.connect() as conn:
+        return [b for (b,) in conn.execute(f"""
+            SELECT p.barcode FROM products p LEFT JOIN categories c ON c.id = p.category_id ORDER BY {order}
+        """)]
+
+def walk(products):
+    barcodes, page = [], 0
+    while True:
+        rows = products.get_page(page)
+        barcodes.extend(row[0] for row in rows)
+        if len(rows) < products.page_size:
+            return barcodes
+        page += 1
+
+@pytest.mark.parametrize("column, descending, order", [
+    ("name", False, "coalesce(p.name, ''), p.barcode"),
+    ("name", True, "coalesce(p.name, '') DESC, p.barcode DESC"),
+    ("category", False, "coalesce(c.name, ''), p.barcode"),
+    ("price", True, "coalesce(p.price, 0) DESC, p.barcode DESC"),
+])
+def test_keyset_pages_follow_sort_with_barcode_tie_break(app, catalog, offsets, column, descending, order):
+    products = product_list(app, catalog, page_size=40)
+    products.sort_column, products.descending = column, descending
+    assert walk(products) == expected(catalog, order)
+    assert offsets == [0] * len(offsets)  # nur Seite 0 ohne Anker, danach Keyset
+    assert len(offsets) == 500 // 40 + 1
+
+def test_offset_fallback_without_anchor(app, catalog, offsets):
+    products = product_list(app, catalog, page_size=40)
+    products.sort_column = "name"
+    order = expected(catalog, "coalesce(p.name, ''), p.barcode")
+    assert [row[0] for row in products.get_page(7)] == order[280:320]
+    assert [row[0] for row in products.get_page(8)] == order[320:360]
+    assert offsets == [280, 0]  # Seite 8 über den Anker, den Seite 7 hinterlassen hat
+
+def test_window_rows_span_page_boundaries(app, catalog):
+    products = product_list(app, catalog, page_size=40)
+    products.first, products.visible = 35, 10
+    rows = products.window_rows()
+    assert [row[0] for row in rows] == [f"P{i:07d}" for i in range(35, 45)]
+    assert all(len(row) == len(app.DISPLAY_COLUMNS) for row in rows)  # ohne Sortierwert
+    products.first = 495
+    assert len(products.window_rows()) == 5
+    assert products.count() == 500
+
+def test_least_recently_used_pages_are_evicted(app, catalog, offsets):
+    products = product_list(app, catalog, page_size=40, max_pages=3)
+    for page in (0, 1, 2, 0, 3):
+        products.get_page(page)
+    assert list(products.pages) == [2, 0, 3]
+    fetched = len(offsets)
+    products.get_page(0)  # noch im Cache, jetzt zuletzt benutzt
+    assert len(offsets) == fetched
+    products.get_page(1)  # verdrängt, neu über den Anker geladen
+    assert offsets[fetched:] == [0]
+    assert list(products.pages) == [3, 0, 1]
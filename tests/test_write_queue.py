@@ -0,0 +1,42 @@
+"""WriteQueue statistics count every command of a batch, whether it succeeded or failed."""
+import pytest
+
+def ok(session, value):
+    return value
+
+def fail(session, value):
+    raise ValueError(value)
+
+@pytest.fixture
+def writer(app, database):
+    # Großes Fenster: alle Befehle eines Tests landen in einem Batch
+    writer = app.WriteQueue(database.Session, window=0.5, max_batch=5)
+    yield writer
+    writer.stop()
+
+def test_failed_commands_count_towards_the_batch(writer):
+    futures = [writer.submit(command, i) for i, command in enumerate([ok, fail, ok, fail, ok])]
+    assert [f.result(5) for f in futures if f.exception(5) is None] == [0, 2, 4]
+    stats = writer.stats()
+    assert (stats["commands"], stats["failed"], stats["batches"], stats["failed_batches"]) == (3, 2, 1, 0)
+    assert stats["mean_batch"] == 5.0
+    assert stats["largest_batch"] == 5
+
+def test_rolled_back_batch_is_counted_separately(app, database):
+    def broken_session():
+        def commit():
+            raise RuntimeError("disk I/O error")
+        session = database.Session()
+        session.commit = commit
+        return session
+        
+    writer = app.WriteQueue(broken_session, window=0.5, max_batch=3)
+    try:
+        futures = [writer.submit(command, i) for i, command in enumerate([ok, fail, ok])]
+        for future in futures:
+            assert future.exception(5) is not None
+    finally:
+        writer.stop()
+    stats = writer.stats()
+    assert (stats["commands"], stats["failed"], stats["batches"], stats["failed_batches"]) == (0, 3, 0, 1)
+    assert stats["mean_batch"] == 0.0